@@ -9,14 +9,14 @@ schemas_folder = QAJson.schemas_folder()
 logger.debug("QA schemas folder: %s" % schemas_folder)
 
 # validate json schema
-schema_path = QAJson.schema_paths()[-1]
+schema_path = QAJson.catalog().schema_path()  # latest
 logger.debug("QA schema path: %s" % schema_path)
 valid = QAJson.validate_schema(path=schema_path)
 # logger.debug(schema)
 logger.debug("valid QA schema: %s" % valid)
 
 # validate QA json
-qa_path = QAJson.example_paths()[-1]
+qa_path = QAJson.catalog().example_paths(QAJson.catalog().latest_version)[-1]
 logger.debug("QA json path: %s" % qa_path)
 valid = QAJson.validate_qa_json(path=qa_path, schema_path=schema_path)
 logger.debug("valid QA json: %s" % valid)
@@ -4,14 +4,39 @@ import os
 from pathlib import Path
 from PySide2 import QtCore, QtGui, QtWidgets
 from hyo2.abc.lib.helper import Helper
+from hyo2.qax.app.widgets.qax.execution import ExecutionWorker
 
 logger = logging.getLogger(__name__)
 
 
+class NumericItem(QtWidgets.QTableWidgetItem):
+    """Table item showing a formatted number, but sorted by its value (the missing values first)"""
+
+    def __init__(self, value, fmt: str = "%s"):
+        QtWidgets.QTableWidgetItem.__init__(self, str() if value is None else fmt % value)
+        self.setData(QtCore.Qt.UserRole, -1.0 if value is None else float(value))
+        self.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+
+    def __lt__(self, other):
+        if isinstance(other, NumericItem):
+            return self.data(QtCore.Qt.UserRole) < other.data(QtCore.Qt.UserRole)
+        return QtWidgets.QTableWidgetItem.__lt__(self, other)
+
+
 class ChecksTab(QtWidgets.QMainWindow):
 
     here = os.path.abspath(os.path.dirname(__file__))
 
+    # metric, header, scale, format of the score board columns with the execution metrics
+    metric_columns = [
+        ("wall_time", "Wall [s]", 1.0, "%.2f"),
+        ("cpu_time", "CPU [s]", 1.0, "%.2f"),
+        ("peak_rss", "Peak RSS [MB]", 1.0 / (1024 * 1024), "%.1f"),
+        ("bytes_read", "Read [MB]", 1.0 / (1024 * 1024), "%.1f"),
+        ("cells", "Cells", 1, "%d"),
+    ]
+    metrics_column = 6
+
     def __init__(self, parent_win, prj, qa_group: str = "survey_products"):
         QtWidgets.QMainWindow.__init__(self)
 
@@ -32,10 +57,14 @@ class ChecksTab(QtWidgets.QMainWindow):
         self.force_reload = None
         self.save_as = None
         self.execute_all = None
+        self.execute_changed = None
+        self.stop_execution = None
+        self.execution = None  # the running execution worker, if any
         self.json_text_group = None
         self.json_viewer = None
         self.score_board_group = None
         self.score_board = None
+        self.score_board_items = dict()  # check key -> item of the ID column (to find its row)
 
     def display_json(self):
         logger.debug("displaying js: %s" % self.prj.inputs.qa_json.js)
@@ -79,7 +108,22 @@ class ChecksTab(QtWidgets.QMainWindow):
         # noinspection PyUnresolvedReferences
         self.execute_all.clicked.connect(self.on_execute_all)
         hbox.addWidget(self.execute_all)
+        self.execute_changed = QtWidgets.QPushButton()
+        self.execute_changed.setFixedWidth(button_width)
+        self.execute_changed.setText("Run changed")
+        self.execute_changed.setToolTip("Run only the checks not completed or with changed inputs")
+        # noinspection PyUnresolvedReferences
+        self.execute_changed.clicked.connect(self.on_execute_changed)
+        hbox.addWidget(self.execute_changed)
+        self.stop_execution = QtWidgets.QPushButton()
+        self.stop_execution.setFixedWidth(button_width)
+        self.stop_execution.setText("Stop")
+        self.stop_execution.setToolTip("Abort the queued and running checks")
+        # noinspection PyUnresolvedReferences
+        self.stop_execution.clicked.connect(self.on_stop_execution)
+        hbox.addWidget(self.stop_execution)
         hbox.addStretch()
+        self._set_running(self.execution is not None)
 
         # Json Text
         self.json_text_group = QtWidgets.QGroupBox("Json Text")
@@ -111,64 +155,110 @@ class ChecksTab(QtWidgets.QMainWindow):
         self.score_board.customContextMenuRequested.connect(self.make_context_menu)
         # noinspection PyUnresolvedReferences
         self.score_board.itemDoubleClicked.connect(self.load_check)
-        self.score_board.setColumnCount(7)
-        self.score_board.setHorizontalHeaderLabels(["ID", "Check", "Group", "Input", "Output", "Status", "Action"])
-        checks = self.prj.inputs.qa_json.js['qa'][self.qa_group]['checks']
+        labels = ["ID", "Check", "Group", "Input", "Output", "Status"] + [column[1] for column in self.metric_columns]
+        self.score_board.setColumnCount(len(labels) + 1)
+        self.score_board.setHorizontalHeaderLabels(labels + ["Action"])
+        index = self.prj.inputs.qa_json.index
+        checks = index.query(qa_group=self.qa_group)
         logger.debug("checks: %s" % checks)
         nr_of_checks = len(checks)
+        # disable sorting while populating, otherwise rows are re-ordered at each new item
+        self.score_board.setSortingEnabled(False)
         self.score_board.setRowCount(nr_of_checks)
+        self.score_board_items = dict()
         for idx in range(nr_of_checks):
             item0 = QtWidgets.QTableWidgetItem(checks[idx]['info']['id'])
+            item0.setData(QtCore.Qt.UserRole, index.key(checks[idx]))
             self.score_board.setItem(idx, 0, item0)
+            self.score_board_items[index.key(checks[idx])] = item0
             item1 = QtWidgets.QTableWidgetItem("%s [v.%s]" % (checks[idx]['info']['name'], checks[idx]['info']['version']))
             self.score_board.setItem(idx, 1, item1)
             item2 = QtWidgets.QTableWidgetItem(checks[idx]['info']['group']['name'])
             self.score_board.setItem(idx, 2, item2)
             item3 = QtWidgets.QTableWidgetItem(checks[idx]['inputs']['files'][0]['path'])
             self.score_board.setItem(idx, 3, item3)
-            output_txt = str()
-            has_count = False
-            # has_percentage = False
-            try:
-                count_txt = "count: %d" % checks[idx]['outputs']['count']
-                has_count = True
-                output_txt += count_txt
-            except KeyError as e:
-                logger.debug("skipping count for #%d: %s" % (idx, e))
-            try:
-                percentage_txt = "percentage: %.2f" % checks[idx]['outputs']['percentage']
-                # has_percentage = True
-                if has_count:
-                    output_txt += ", "
-                output_txt += percentage_txt
-            except KeyError as e:
-                logger.debug("skipping grade for #%d: %s" % (idx, e))
-            item4 = QtWidgets.QTableWidgetItem(output_txt)
+            item4 = QtWidgets.QTableWidgetItem(self._output_text(checks[idx]))
             self.score_board.setItem(idx, 4, item4)
             try:
                 status = checks[idx]['outputs']['execution']['status']
-                item5 = QtWidgets.QTableWidgetItem(status)
-                if status in ["aborted", "failed"]:
-                    item5.setBackground(QtGui.QColor(200, 100, 100, 50))
-                elif status in ["draft", "queued", "running"]:
-                    item5.setBackground(QtGui.QColor(200, 200, 100, 50))
-                else:
-                    item5.setBackground(QtGui.QColor(100, 200, 100, 50))
-                self.score_board.setItem(idx, 5, item5)
+                self.score_board.setItem(idx, 5, self._status_item(status))
             except KeyError as e:
                 logger.debug("skipping grade for #%d: %s" % (idx, e))
+            self._set_metric_items(idx, checks[idx])
             try:
                 item6 = QtWidgets.QPushButton('Run')
                 # noinspection PyUnresolvedReferences
                 item6.clicked.connect(self.on_button_clicked)
-                self.score_board.setCellWidget(idx, 6, item6)
+                self.score_board.setCellWidget(idx, self.metrics_column + len(self.metric_columns), item6)
             except KeyError as e:
                 logger.debug("skipping grade for #%d: %s" % (idx, e))
 
+        self.score_board.setSortingEnabled(True)
         vbox.addWidget(self.score_board)
 
         self.on_set_view()
 
+    @classmethod
+    def _output_text(cls, check: dict) -> str:
+        output_txt = str()
+        has_count = False
+        try:
+            output_txt += "count: %d" % check['outputs']['count']
+            has_count = True
+        except KeyError as e:
+            logger.debug("skipping count: %s" % e)
+        try:
+            percentage_txt = "percentage: %.2f" % check['outputs']['percentage']
+            if has_count:
+                output_txt += ", "
+            output_txt += percentage_txt
+        except KeyError as e:
+            logger.debug("skipping percentage: %s" % e)
+        return output_txt
+
+    @classmethod
+    def _status_item(cls, status: str) -> QtWidgets.QTableWidgetItem:
+        item = QtWidgets.QTableWidgetItem(status)
+        if status in ["aborted", "failed"]:
+            item.setBackground(QtGui.QColor(200, 100, 100, 50))
+        elif status in ["draft", "queued", "running"]:
+            item.setBackground(QtGui.QColor(200, 200, 100, 50))
+        else:
+            item.setBackground(QtGui.QColor(100, 200, 100, 50))
+        return item
+
+    def _set_metric_items(self, row: int, check: dict) -> None:
+        metrics = check.get('outputs', dict()).get('execution', dict()).get('metrics', dict())
+        for i, (name, _, scale, fmt) in enumerate(self.metric_columns):
+            value = metrics.get(name)
+            item = NumericItem(None if value is None else value * scale, fmt=fmt)
+            self.score_board.setItem(row, self.metrics_column + i, item)
+
+    def _row(self, key: int) -> int:
+        """Return the score board row of the check with the passed key (-1 if not found)"""
+        item = self.score_board_items.get(key)
+        if item is None:
+            return -1
+        return item.row()
+
+    def _update_rows(self, keys: list, status: str) -> None:
+        if self.score_board is None:
+            return
+        index = self.prj.inputs.qa_json.index
+        # disable sorting while updating, otherwise the rows may move before all their items are set,
+        # and the table is sorted once for the whole batch
+        self.score_board.setSortingEnabled(False)
+        for key in keys:
+            row = self._row(key)
+            if row < 0:
+                continue
+            check = index.get(key)
+            if status not in ["queued", "running"]:
+                self.score_board.setItem(row, 4, QtWidgets.QTableWidgetItem(self._output_text(check)))
+            self._set_metric_items(row, check)
+            self.score_board.setItem(row, 5, self._status_item(status))
+        self.score_board.setSortingEnabled(True)
+
     def on_button_clicked(self):
         button = QtGui.qApp.focusWidget()
         index = self.score_board.indexAt(button.pos())
@@ -337,15 +427,14 @@ class ChecksTab(QtWidgets.QMainWindow):
     def delete_checks(self):
         logger.debug("delete checks")
         indices = self.score_board.selectionModel().selectedRows()
+        keys = list()
         for index in indices:
-            row_id = self.score_board.item(index.row(), 0).text()
-            logger.debug("row: %s" % row_id)
-            for ck in self.prj.inputs.qa_json.js['qa'][self.qa_group]['checks']:
-                if row_id == ck['info']['id']:
-                    logger.info("removing %s" % row_id)
-                    self.prj.inputs.qa_json.js['qa'][self.qa_group]['checks'].remove(ck)
-                    self.on_force_reload()
-                    break
+            item = self.score_board.item(index.row(), 0)
+            logger.debug("row: %s" % item.text())
+            keys.append(item.data(QtCore.Qt.UserRole))
+        nr_of_deleted = self.prj.inputs.qa_json.index.delete(keys)
+        logger.info("removed %d checks" % nr_of_deleted)
+        self.on_force_reload()
 
     def on_save_as(self):
         logger.debug("save as")
@@ -373,6 +462,74 @@ class ChecksTab(QtWidgets.QMainWindow):
 
     def on_execute_all(self):
         logger.debug("execute all")
+        self._start_execution(incremental=False)
+
+    def on_execute_changed(self):
+        logger.debug("execute changed")
+        self._start_execution(incremental=True)
+
+    def on_stop_execution(self):
+        logger.debug("stop execution")
+        if self.execution is None:
+            return
+        self.stop_execution.setEnabled(False)
+        self.prj.cancel_execution()
+
+    def _start_execution(self, incremental: bool) -> None:
+        """Execute the checks in a background thread, updating the score board rows as they progress"""
+        if self.execution is not None:
+            logger.warning("execution already running")
+            return
+
+        self.execution = ExecutionWorker(self.prj, qa_group=self.qa_group, incremental=incremental)
+        signals = self.execution.signals
+        # noinspection PyUnresolvedReferences
+        signals.queued.connect(self.on_checks_queued)
+        # noinspection PyUnresolvedReferences
+        signals.check_started.connect(self.on_check_started)
+        # noinspection PyUnresolvedReferences
+        signals.check_finished.connect(self.on_check_finished)
+        # noinspection PyUnresolvedReferences
+        signals.progress.connect(self.on_execution_progress)
+        # noinspection PyUnresolvedReferences
+        signals.completed.connect(self.on_execution_completed)
+        # noinspection PyUnresolvedReferences
+        signals.failed.connect(self.on_execution_failed)
+        self._set_running(True)
+        QtCore.QThreadPool.globalInstance().start(self.execution)
+
+    def _set_running(self, running: bool) -> None:
+        for button in [self.force_reload, self.save_as, self.execute_all, self.execute_changed]:
+            if button is not None:
+                button.setEnabled(not running)
+        if self.stop_execution is not None:
+            self.stop_execution.setEnabled(running)
+
+    def on_checks_queued(self, keys: list):
+        self._update_rows(keys, "queued")
+
+    def on_check_started(self, key: int):
+        self._update_rows([key], "running")
+
+    def on_check_finished(self, key: int, status: str):
+        self._update_rows([key], status)
+
+    def on_execution_progress(self, nr_of_finished: int, nr_of_checks: int):
+        self.statusBar().showMessage("Executed checks: %d/%d" % (nr_of_finished, nr_of_checks))
+
+    def on_execution_completed(self, summary: dict):
+        logger.info("execution completed: %s" % summary)
+        self.execution = None
+        self._set_running(False)
+        self.statusBar().showMessage("Execution completed: %s" % ", ".join("%s %d" % (status, nr)
+                                                                          for status, nr in sorted(summary.items())),
+                                     10000)
+        self.on_force_reload()
 
-        self.prj.execute_all(self.qa_group)
+    def on_execution_failed(self, error: str):
+        self.execution = None
+        self._set_running(False)
+        self.statusBar().showMessage("Execution failed", 10000)
+        # noinspection PyCallByClass,PyArgumentList
+        QtWidgets.QMessageBox.critical(self, "Execution", "Unable to execute the checks:\n%s" % error)
         self.on_force_reload()
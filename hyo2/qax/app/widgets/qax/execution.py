@@ -0,0 +1,58 @@
+import logging
+import traceback
+
+from PySide2 import QtCore
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionSignals(QtCore.QObject):
+    """Signals emitted by an execution worker (delivered in the GUI thread through queued connections)"""
+
+    queued = QtCore.Signal(list)  # keys of the queued checks
+    check_started = QtCore.Signal(object)  # key (an object, since it may not fit in a C int)
+    check_finished = QtCore.Signal(object, str)  # key, status
+    progress = QtCore.Signal(int, int)  # nr of finished checks, nr of queued checks
+    completed = QtCore.Signal(dict)  # nr of checks for each final status
+    failed = QtCore.Signal(str)  # error
+
+
+class ExecutionWorker(QtCore.QRunnable):
+    """Execute the checks of a project in a thread of the pool, streaming the progress of each check
+
+    The project must not be modified by the GUI until the 'completed' or 'failed' signal is received.
+    A running execution is stopped through 'QAXProject.cancel_execution'.
+    """
+
+    def __init__(self, prj, qa_group: str = "survey_products", incremental: bool = False):
+        QtCore.QRunnable.__init__(self)
+        self.prj = prj
+        self.qa_group = qa_group
+        self.incremental = incremental
+        self.signals = ExecutionSignals()
+        self._nr_of_queued = 0
+        self._nr_of_finished = 0
+
+    def _on_queued(self, keys: list) -> None:
+        self._nr_of_queued = len(keys)
+        self._nr_of_finished = 0
+        self.signals.queued.emit(keys)
+        self.signals.progress.emit(self._nr_of_finished, self._nr_of_queued)
+
+    def _on_started(self, key: int) -> None:
+        self.signals.check_started.emit(key)
+
+    def _on_finished(self, key: int, status: str) -> None:
+        self._nr_of_finished += 1
+        self.signals.check_finished.emit(key, status)
+        self.signals.progress.emit(self._nr_of_finished, self._nr_of_queued)
+
+    def run(self) -> None:
+        try:
+            summary = self.prj.execute_all(self.qa_group, incremental=self.incremental, queued=self._on_queued,
+                                           started=self._on_started, finished=self._on_finished)
+        except Exception as e:
+            logger.error("execution failed: %s" % traceback.format_exc())
+            self.signals.failed.emit(str(e))
+            return
+        self.signals.completed.emit(summary)
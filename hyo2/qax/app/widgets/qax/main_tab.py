@@ -306,6 +306,26 @@ class MainTab(QtWidgets.QMainWindow):
         self.output_subfolders.clicked.connect(self.click_output_subfolders)
         hbox.addWidget(self.output_subfolders)
 
+        text_set_json_cache = QtWidgets.QLabel("QA JSON cache: ")
+        hbox.addWidget(text_set_json_cache)
+        text_set_json_cache.setFixedHeight(GuiSettings.single_line_height())
+        self.output_json_cache = QtWidgets.QCheckBox("")
+        self.output_json_cache.setToolTip('Cache the validated QA JSON in the output folder for fast reopening')
+        self.output_json_cache.setChecked(self.prj.params.json_cache)
+        # noinspection PyUnresolvedReferences
+        self.output_json_cache.clicked.connect(self.click_output_json_cache)
+        hbox.addWidget(self.output_json_cache)
+
+        text_set_result_cache = QtWidgets.QLabel("Result cache: ")
+        hbox.addWidget(text_set_result_cache)
+        text_set_result_cache.setFixedHeight(GuiSettings.single_line_height())
+        self.output_result_cache = QtWidgets.QCheckBox("")
+        self.output_result_cache.setToolTip('Restore the outputs of the checks with unchanged inputs and parameters')
+        self.output_result_cache.setChecked(self.prj.params.result_cache)
+        # noinspection PyUnresolvedReferences
+        self.output_result_cache.clicked.connect(self.click_output_result_cache)
+        hbox.addWidget(self.output_result_cache)
+
         hbox.addStretch()
 
         # add folder
@@ -1055,6 +1075,16 @@ class MainTab(QtWidgets.QMainWindow):
         self.prj.params.subfolders = self.output_subfolders.isChecked()
         QtCore.QSettings().setValue("qax_export_subfolders", self.prj.params.subfolders)
 
+    def click_output_json_cache(self):
+        """ Set the QA JSON sidecar cache"""
+        self.prj.params.json_cache = self.output_json_cache.isChecked()
+        QtCore.QSettings().setValue("qax_json_cache", self.prj.params.json_cache)
+
+    def click_output_result_cache(self):
+        """ Set the check result cache"""
+        self.prj.params.result_cache = self.output_result_cache.isChecked()
+        QtCore.QSettings().setValue("qax_result_cache", self.prj.params.result_cache)
+
     def click_add_folder(self):
         """ Read the grids provided by the user"""
         logger.debug('set output folder ...')
@@ -1154,7 +1184,7 @@ class MainTab(QtWidgets.QMainWindow):
 
     def _add_json(self, selection):
 
-        self.prj.inputs.json_path = selection
+        self.prj.load_json(path=selection)
 
         self._update_json_list()
         self.json_loaded()
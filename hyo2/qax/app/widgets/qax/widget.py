@@ -60,6 +60,20 @@ class QAXWidget(AbstractWidget):
         else:  # exists
             self.prj.params.subfolders = (export_subfolders == "true")
 
+        # - json cache
+        json_cache = settings.value("qax_json_cache")
+        if json_cache is None:
+            settings.setValue("qax_json_cache", self.prj.params.json_cache)
+        else:  # exists
+            self.prj.params.json_cache = (json_cache == "true")
+
+        # - result cache
+        result_cache = settings.value("qax_result_cache")
+        if result_cache is None:
+            settings.setValue("qax_result_cache", self.prj.params.result_cache)
+        else:  # exists
+            self.prj.params.result_cache = (result_cache == "true")
+
         # make tabs
         self.tabs = QtWidgets.QTabWidget()
         self.setCentralWidget(self.tabs)
@@ -0,0 +1,167 @@
+import argparse
+import logging
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional, TextIO
+
+from jsonschema.exceptions import best_match
+
+from hyo2.qax.lib.json_backend import json_backend
+from hyo2.qax.lib.qa_json import QAJson
+from hyo2.qax.lib.validator_registry import validator_registry
+
+logger = logging.getLogger(__name__)
+
+
+def json_pointer(tokens) -> str:
+    """Build a JSON pointer (RFC 6901) from a sequence of keys/indices"""
+    return "".join("/" + str(token).replace("~", "~0").replace("/", "~1") for token in tokens)
+
+
+def _validate_job(job: tuple) -> dict:
+    path, schema_version = job
+    result = {"path": str(path), "status": None}
+    try:
+        js = json_backend.loads(Path(path).read_bytes())
+    except (OSError, ValueError) as e:
+        result["status"] = "unreadable"
+        result["error"] = "%s" % e
+        return result
+
+    if schema_version is not None:  # no fallback for an explicit version
+        try:
+            schema_path = QAJson.catalog().schema_path(schema_version)
+        except RuntimeError as e:
+            result["status"] = "invalid"
+            result["error"] = "%s" % e
+            return result
+    else:  # validate against the schema of the declared version
+        try:
+            schema_path = QAJson.catalog().schema_path(js['qa']['version'])
+        except (KeyError, TypeError, RuntimeError):
+            schema_path = QAJson.catalog().schema_path()
+    result["schema_version"] = validator_registry.schema_version(schema_path)
+
+    error = best_match(validator_registry.validator(schema_path).iter_errors(js))
+    if error is None:
+        result["status"] = "valid"
+    else:
+        result["status"] = "invalid"
+        result["pointer"] = json_pointer(error.absolute_path)
+        result["error"] = error.message
+    return result
+
+
+class BatchValidationReport:
+
+    def __init__(self):
+        self.valid = 0
+        self.invalid = 0
+        self.unreadable = 0
+        self.elapsed = 0.0
+
+    @property
+    def nr_of_files(self) -> int:
+        return self.valid + self.invalid + self.unreadable
+
+    @property
+    def files_per_sec(self) -> float:
+        if self.elapsed == 0.0:
+            return 0.0
+        return self.nr_of_files / self.elapsed
+
+    def add(self, result: dict) -> None:
+        setattr(self, result["status"], getattr(self, result["status"]) + 1)
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <files: %d>\n" % self.nr_of_files
+        msg += "  <valid: %d>\n" % self.valid
+        msg += "  <invalid: %d>\n" % self.invalid
+        msg += "  <unreadable: %d>\n" % self.unreadable
+        msg += "  <elapsed: %.2f sec>\n" % self.elapsed
+        msg += "  <throughput: %.1f files/sec>\n" % self.files_per_sec
+        return msg
+
+
+class QAJsonBatchValidator:
+    """Validate directory trees of QA JSON files across a pool of worker processes
+
+    By default, each file is validated against the schema of its 'qa.version' (or the latest schema,
+    if the version is missing or unknown). An explicit schema version must be a known one.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, chunk_size: int = 16,
+                 schema_version: Optional[str] = None):
+        if schema_version is not None:
+            QAJson.catalog().schema_path(schema_version)  # raise for unknown versions
+        self._max_workers = max_workers
+        self._chunk_size = chunk_size
+        self._schema_version = schema_version
+
+    @classmethod
+    def find_files(cls, folder: Path, pattern: str = "*.json") -> list:
+        return sorted(path for path in Path(folder).rglob(pattern) if not path.match('*.schema.json'))
+
+    def iter_results(self, paths: list) -> Iterator[dict]:
+        """Yield the per-file results, in the order of the passed paths, as soon as they are available"""
+        jobs = [(path, self._schema_version) for path in paths]
+        if self._max_workers == 0:  # serial, in the current process
+            yield from map(_validate_job, jobs)
+            return
+        with ProcessPoolExecutor(max_workers=self._max_workers) as executor:
+            yield from executor.map(_validate_job, jobs, chunksize=self._chunk_size)
+
+    def validate_folder(self, folder: Path, output: Optional[TextIO] = None,
+                        pattern: str = "*.json") -> BatchValidationReport:
+        """Validate all the matching files, streaming the results as JSON Lines to the output (if any)"""
+        paths = self.find_files(folder=folder, pattern=pattern)
+        logger.info("validating %d files in %s ..." % (len(paths), folder))
+
+        report = BatchValidationReport()
+        start = time.perf_counter()
+        for result in self.iter_results(paths):
+            report.add(result)
+            if output is not None:
+                output.write(json_backend.dumps(result).decode("utf-8") + "\n")
+                output.flush()
+        report.elapsed = time.perf_counter() - start
+
+        logger.info("validated %d files in %.2f sec (%.1f files/sec)"
+                    % (report.nr_of_files, report.elapsed, report.files_per_sec))
+        return report
+
+
+def main(argv: Optional[list] = None) -> int:
+    """Command line entry point: validate a folder of QA JSON files, writing JSON Lines results"""
+    parser = argparse.ArgumentParser(prog="qax_validate", description="Batch validation of QA JSON files")
+    parser.add_argument("folder", help="folder to recursively search for QA JSON files")
+    parser.add_argument("-o", "--output", help="output JSON Lines file (default: stdout)")
+    parser.add_argument("-p", "--pattern", default="*.json", help="file name pattern (default: *.json)")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of worker processes (default: all cores, 0: serial)")
+    parser.add_argument("-s", "--schema-version", default=None,
+                        help="validate against this schema version (default: the declared qa.version)")
+    args = parser.parse_args(argv)
+
+    try:
+        validator = QAJsonBatchValidator(max_workers=args.workers, schema_version=args.schema_version)
+    except RuntimeError as e:
+        sys.stderr.write("%s\n" % e)
+        return 2
+    if args.output is None:
+        report = validator.validate_folder(folder=Path(args.folder), output=sys.stdout, pattern=args.pattern)
+    else:
+        with open(args.output, "w", encoding="utf-8") as output:
+            report = validator.validate_folder(folder=Path(args.folder), output=output, pattern=args.pattern)
+
+    sys.stderr.write("%d files in %.2f sec (%.1f files/sec): %d valid, %d invalid, %d unreadable\n"
+                     % (report.nr_of_files, report.elapsed, report.files_per_sec, report.valid, report.invalid,
+                        report.unreadable))
+    return 0 if report.nr_of_files == report.valid else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import logging
+from collections import defaultdict
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CheckIndex:
+    """In-memory index over the checks of a QA JSON document
+
+    The index holds references to the check dicts stored in the document, and it keeps secondary indexes
+    on check id, check group id, check name and execution status. Each check is identified by a key that is
+    stable for the lifetime of the check (check ids are not guaranteed to be unique in a QA JSON).
+
+    The document must be mutated through the index (add, delete, update, set_status) to keep it consistent.
+    Added and updated checks are tracked as dirty until the next validation.
+    """
+
+    fields = {
+        "id": ("info", "id"),
+        "group_id": ("info", "group", "id"),
+        "name": ("info", "name"),
+        "status": ("outputs", "execution", "status"),
+    }
+
+    def __init__(self, js: Optional[dict] = None):
+        self._js = None
+        self._checks = dict()  # key -> check
+        self._qa_groups = dict()  # key -> qa group
+        self._seq = dict()  # key -> insertion order
+        self._values = dict()  # key -> indexed values
+        self._by_qa_group = defaultdict(set)
+        self._indices = dict((field, defaultdict(set)) for field in self.fields)
+        self._dirty = set()
+        self._positions = None  # key -> position in the checks list, lazily computed
+        self._next_seq = 0
+
+        if js is not None:
+            self.rebuild(js)
+
+    @classmethod
+    def key(cls, check: dict) -> int:
+        return id(check)
+
+    @classmethod
+    def value(cls, check: dict, field: str) -> Optional[str]:
+        value = check
+        for token in cls.fields[field]:
+            try:
+                value = value[token]
+            except (KeyError, TypeError):
+                return None
+        return value
+
+    def rebuild(self, js: dict) -> None:
+        self._js = js
+        self._checks.clear()
+        self._qa_groups.clear()
+        self._seq.clear()
+        self._values.clear()
+        self._by_qa_group.clear()
+        for index in self._indices.values():
+            index.clear()
+        self._dirty.clear()
+        self._positions = None
+        self._next_seq = 0
+
+        for qa_group, data_level in js['qa'].items():
+            if not isinstance(data_level, dict):
+                continue
+            for check in data_level.get('checks', list()):
+                self._insert(check=check, qa_group=qa_group)
+
+        logger.debug("indexed checks: %d" % len(self._checks))
+
+    def _insert(self, check: dict, qa_group: str) -> int:
+        key = self.key(check)
+        self._checks[key] = check
+        self._qa_groups[key] = qa_group
+        self._seq[key] = self._next_seq
+        self._next_seq += 1
+        self._by_qa_group[qa_group].add(key)
+        self._index_values(key)
+        return key
+
+    def _index_values(self, key: int) -> None:
+        values = dict((field, self.value(self._checks[key], field)) for field in self.fields)
+        self._values[key] = values
+        for field, value in values.items():
+            self._indices[field][value].add(key)
+
+    def _unindex_values(self, key: int) -> None:
+        for field, value in self._values.pop(key).items():
+            keys = self._indices[field][value]
+            keys.discard(key)
+            if len(keys) == 0:
+                del self._indices[field][value]
+
+    def reindex(self, key: int) -> None:
+        """Refresh the secondary indexes after an in-place change of a check"""
+        self._unindex_values(key)
+        self._index_values(key)
+
+    def add(self, check: dict, qa_group: str) -> int:
+        """Append a check to the passed QA group, both in the document and in the index"""
+        self._js['qa'].setdefault(qa_group, {'checks': list()})['checks'].append(check)
+        key = self._insert(check=check, qa_group=qa_group)
+        self._dirty.add(key)
+        if self._positions is not None:
+            self._positions[key] = len(self._js['qa'][qa_group]['checks']) - 1
+        return key
+
+    def get(self, key: int) -> dict:
+        return self._checks[key]
+
+    def qa_group(self, key: int) -> str:
+        return self._qa_groups[key]
+
+    def position(self, key: int) -> int:
+        """Position of the check in the checks list of its QA group"""
+        if self._positions is None:
+            self._positions = dict()
+            for qa_group in self._by_qa_group:
+                for idx, check in enumerate(self._js['qa'][qa_group]['checks']):
+                    self._positions[self.key(check)] = idx
+        return self._positions[key]
+
+    def keys(self, qa_group: Optional[str] = None, **filters) -> list:
+        """Return the keys matching all the passed filters (on qa group and indexed fields), in document order"""
+        candidates = list()
+        if qa_group is not None:
+            candidates.append(self._by_qa_group.get(qa_group, set()))
+        for field, value in filters.items():
+            if field not in self.fields:
+                raise RuntimeError("unsupported filter: %s" % field)
+            if isinstance(value, (list, tuple, set)):
+                keys = set()
+                for item in value:
+                    keys |= self._indices[field].get(item, set())
+                candidates.append(keys)
+            else:
+                candidates.append(self._indices[field].get(value, set()))
+
+        if len(candidates) == 0:
+            keys = self._checks.keys()
+        else:
+            candidates.sort(key=len)
+            keys = candidates[0].intersection(*candidates[1:])
+        return sorted(keys, key=self._seq.__getitem__)
+
+    def query(self, qa_group: Optional[str] = None, **filters) -> list:
+        return [self._checks[key] for key in self.keys(qa_group=qa_group, **filters)]
+
+    def delete(self, keys: Iterable[int]) -> int:
+        """Remove the checks with the passed keys, rewriting each affected checks list only once"""
+        doomed = defaultdict(set)
+        for key in keys:
+            if key in self._checks:
+                doomed[self._qa_groups[key]].add(key)
+
+        nr_of_deleted = 0
+        for qa_group, group_keys in doomed.items():
+            checks = self._js['qa'][qa_group]['checks']
+            checks[:] = [check for check in checks if self.key(check) not in group_keys]
+            for key in group_keys:
+                self._unindex_values(key)
+                del self._checks[key]
+                del self._qa_groups[key]
+                del self._seq[key]
+                self._dirty.discard(key)
+                self._by_qa_group[qa_group].discard(key)
+            nr_of_deleted += len(group_keys)
+        if nr_of_deleted > 0:
+            self._positions = None
+
+        logger.debug("deleted checks: %d" % nr_of_deleted)
+        return nr_of_deleted
+
+    def update(self, keys: Iterable[int], updater: Callable[[dict], None]) -> int:
+        """Apply the passed in-place updater to the checks with the passed keys"""
+        nr_of_updated = 0
+        for key in keys:
+            updater(self._checks[key])
+            self.reindex(key)
+            self._dirty.add(key)
+            nr_of_updated += 1
+        return nr_of_updated
+
+    def set_status(self, keys: Iterable[int], status: str) -> int:
+        def _set_status(check: dict) -> None:
+            check.setdefault('outputs', dict()).setdefault('execution', dict())['status'] = status
+
+        return self.update(keys=keys, updater=_set_status)
+
+    def mark_dirty(self, key: int) -> None:
+        """Flag a check changed without going through the index"""
+        self.reindex(key)
+        self._dirty.add(key)
+
+    def dirty_keys(self) -> list:
+        return sorted(self._dirty, key=self._seq.__getitem__)
+
+    def clear_dirty(self) -> None:
+        self._dirty.clear()
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._checks
+
+    def __len__(self):
+        return len(self._checks)
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <checks: %d>\n" % len(self._checks)
+        msg += "  <dirty: %d>\n" % len(self._dirty)
+        for qa_group, keys in self._by_qa_group.items():
+            msg += "  <%s: %d>\n" % (qa_group, len(keys))
+        return msg
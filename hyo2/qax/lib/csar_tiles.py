@@ -0,0 +1,349 @@
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from hyo2.qax.lib.grid_tiles import GridTile
+
+logger = logging.getLogger(__name__)
+
+
+class CsarChunk:
+    """Header of a raster chunk record in a CSAR data file (.csar0)
+
+    Each record starts on a block boundary with the 'knhc' magic, followed by the record size, the record type,
+    the bounding box of the chunk nodes, its dimensions, the data type, and the zlib-compressed node values.
+    """
+
+    magic = b'knhc'
+    header_size = 109
+    tile_record = 2
+    data_types = {0: np.dtype("<f4"), 3: np.dtype("u1"), 6: np.dtype("<i4")}
+
+    def __init__(self, offset: int, header: bytes):
+        if header[:4] != self.magic:
+            raise RuntimeError("invalid chunk record at %d" % offset)
+        record_type = struct.unpack_from("<I", header, 20)[0]
+        if record_type != self.tile_record:
+            raise RuntimeError("unsupported chunk record type at %d: %d" % (offset, record_type))
+        data_type = struct.unpack_from("<I", header, 77)[0]
+        if data_type not in self.data_types:
+            raise RuntimeError("unsupported chunk data type at %d: %d" % (offset, data_type))
+        self._offset = offset
+        self._bbox = struct.unpack_from("<4d", header, 37)
+        nr_cols, nr_rows = struct.unpack_from("<2I", header, 69)
+        self._shape = (nr_rows, nr_cols)
+        self._dtype = self.data_types[data_type]
+        self._nr_of_bytes = struct.unpack_from("<I", header, 105)[0]
+
+    @property
+    def offset(self) -> int:
+        return self._offset
+
+    @property
+    def bbox(self) -> Tuple[float, float, float, float]:
+        """Min x, min y, max x, max y of the chunk nodes"""
+        return self._bbox
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self._shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._dtype
+
+    @property
+    def nr_of_bytes(self) -> int:
+        """Size of the compressed node values"""
+        return self._nr_of_bytes
+
+    def decode(self, data: bytes) -> np.ndarray:
+        """Decompress the node values (south to north rows, as in the BAG grids)"""
+        values = zlib.decompress(data)
+        if len(values) != self._shape[0] * self._shape[1] * self._dtype.itemsize:
+            raise RuntimeError("invalid chunk size at %d: %d" % (self._offset, len(values)))
+        return np.frombuffer(values, dtype=self._dtype).reshape(self._shape)
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <offset: %d>\n" % self._offset
+        msg += "  <shape: %s>\n" % (self._shape, )
+        msg += "  <dtype: %s>\n" % self._dtype
+        return msg
+
+
+class CsarTileReader:
+    """Stream a CSAR grid (SQLite metadata and .csar0 data file) as tiles, with the interface of 'BagTileReader'
+
+    The chunks of the requested bands are located through the band chunk tables of the metadata. The tiles are
+    assembled in row-major order by a pool of 'nr_of_threads' background threads that keep up to 'read_ahead'
+    tiles ready, so that the consumer does not wait on the disk. The record reads are serialized on a single
+    file handle (so the data file is read sequentially), while the decompression runs in parallel. The decoded
+    chunks are kept in a cache of 'chunk_cache' bytes, so that the halos do not read the neighbouring chunks
+    again. The empty float cells are set to the BAG no-data value (see 'nodata').
+
+    Only the single resolution grids with zlib compression are supported.
+    """
+
+    nodata = 1000000.0
+    layers = ("elevation", "uncertainty")
+    bands = {"elevation": "Depth", "uncertainty": "Uncertainty", "density": "Density"}
+
+    def __init__(self, path: str, tile_shape: Optional[Tuple[int, int]] = None, halo: int = 0,
+                 layers: Optional[tuple] = None, read_ahead: int = 4, nr_of_threads: int = 2,
+                 chunk_cache: int = 16 * 1024 * 1024):
+        if halo < 0:
+            raise RuntimeError("invalid halo: %s" % halo)
+        if (read_ahead < 1) or (nr_of_threads < 1):
+            raise RuntimeError("invalid read-ahead: %s tiles, %s threads" % (read_ahead, nr_of_threads))
+        self._path = path
+        self._halo = halo
+        self._layers = tuple(layers) if layers is not None else self.layers
+        self._read_ahead = read_ahead
+        self._nr_of_threads = nr_of_threads
+        self._chunk_cache = chunk_cache
+        self._read_metadata()
+        if tile_shape is None:
+            tile_shape = self._chunk_shape
+        if (tile_shape[0] <= 0) or (tile_shape[1] <= 0):
+            raise RuntimeError("invalid tile shape: %s" % (tile_shape, ))
+        self._tile_shape = tuple(tile_shape)
+
+        data_path = os.path.splitext(path)[0] + ".csar0"
+        if not os.path.exists(data_path):
+            raise RuntimeError("unable to locate %s" % data_path)
+        self._fid = open(data_path, "rb")
+        self._lock = threading.Lock()  # file reads
+        self._cache_lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        try:
+            block_size, self._key = struct.unpack_from("<2I", self._read(0x20, 8))
+            self._chunks = {name: self._locate_chunks(self._tables[name], block_size) for name in self._layers}
+        except Exception:
+            self._fid.close()
+            raise
+
+    def _read_metadata(self) -> None:
+        if not os.path.exists(self._path):
+            raise RuntimeError("unable to locate %s" % self._path)
+        conn = sqlite3.connect("file:%s?mode=ro" % Path(self._path).resolve().as_posix(), uri=True)
+        try:
+            def _values(parent: str) -> dict:
+                return dict(conn.execute("SELECT name, value FROM master WHERE parent = ?", (parent, )))
+
+            dims = _values('/rg/master/gg/baseDim/')
+            if ('x' not in dims) or ('y' not in dims):
+                raise RuntimeError("unsupported CSAR grid (no base dimensions): %s" % self._path)
+            self._shape = (struct.unpack("<q", dims['y'])[0], struct.unpack("<q", dims['x'])[0])
+            origin = _values('/rg/master/gg/origin/')
+            self._origin = (struct.unpack("<d", origin['x'])[0], struct.unpack("<d", origin['y'])[0])
+            resolution = _values('/rg/master/gg/baseResolution/')
+            self._resolution = (struct.unpack("<d", resolution['x'])[0], struct.unpack("<d", resolution['y'])[0])
+            tile_size = _values('/rg/master/tileSize/')
+            self._chunk_shape = (struct.unpack("<I", tile_size['y'])[0], struct.unpack("<I", tile_size['x'])[0])
+
+            self._tables = dict()
+            self._band_nodata = dict()
+            for name in self._layers:
+                band = self.bands.get(name, name)
+                ggb = _values('/rg/master/bands/%s/ggb/' % band)
+                table = _values('/rg/master/bands/%s/cs/' % band).get('tableName')
+                if ('noDataValue' not in ggb) or (table is None):
+                    raise RuntimeError("missing band in %s: %s" % (self._path, band))
+                compression = _values('/rg/master/bands/%s/' % band).get('compressionMethod', b'')
+                if not compression.endswith(b'ZLib'):
+                    raise RuntimeError("unsupported compression for %s: %s" % (band, compression[4:].decode()))
+                data_type = struct.unpack_from("<I", ggb['noDataValue'])[0]
+                if data_type not in CsarChunk.data_types:
+                    raise RuntimeError("unsupported data type for %s: %d" % (band, data_type))
+                self._band_nodata[name] = np.frombuffer(ggb['noDataValue'][8:],
+                                                        dtype=CsarChunk.data_types[data_type])[0]
+                self._tables[name] = [tuple(row) for row in conn.execute("SELECT k2, o1 FROM \"%s\""
+                                                                          % table[4:].decode())]
+        except (sqlite3.Error, KeyError, struct.error) as e:
+            raise RuntimeError("invalid CSAR file %s: %s" % (self._path, e))
+        finally:
+            conn.close()
+
+    def _read(self, offset: int, size: int) -> bytes:
+        with self._lock:
+            self._fid.seek(offset)
+            data = self._fid.read(size)
+        if len(data) != size:
+            raise RuntimeError("truncated data file at %d: %s" % (offset, self._fid.name))
+        return data
+
+    def _locate_chunks(self, rows: list, block_size: int) -> dict:
+        """Return the chunk headers of a band by chunk position (row, col)
+
+        The chunk offsets are obfuscated in the tables with the key of the data file: the block index is spread
+        over the two words of the de-obfuscated offset. The record magic is checked for every located chunk, and
+        its position (from the bounding box of its nodes) must be on the chunk grid.
+        """
+        chunks = dict()
+        for _, offset in sorted(rows):
+            value = offset ^ self._key
+            position = (((value >> 32) | (value & 0xFFFFFFFF)) >> 10) * block_size
+            chunk = CsarChunk(offset=position, header=self._read(position, CsarChunk.header_size))
+            row = int(round((chunk.bbox[1] - self._origin[1]) / self._resolution[1]))
+            col = int(round((chunk.bbox[0] - self._origin[0]) / self._resolution[0]))
+            if (row % self._chunk_shape[0]) or (col % self._chunk_shape[1]) or ((row, col) in chunks):
+                raise RuntimeError("invalid chunk position at %d: %d, %d" % (position, row, col))
+            chunks[(row, col)] = chunk
+        return chunks
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self._shape
+
+    @property
+    def origin(self) -> Tuple[float, float]:
+        """Position (x, y) of the first grid node"""
+        return self._origin
+
+    @property
+    def resolution(self) -> Tuple[float, float]:
+        return self._resolution
+
+    @property
+    def tile_shape(self) -> Tuple[int, int]:
+        return self._tile_shape
+
+    @property
+    def chunk_shape(self) -> Tuple[int, int]:
+        return self._chunk_shape
+
+    @property
+    def halo(self) -> int:
+        return self._halo
+
+    @property
+    def band_nodata(self) -> dict:
+        """No-data value of each layer in the CSAR file"""
+        return dict(self._band_nodata)
+
+    @property
+    def nr_of_tiles(self) -> int:
+        return len(range(0, self._shape[0], self._tile_shape[0])) * len(range(0, self._shape[1], self._tile_shape[1]))
+
+    def _chunk(self, name: str, chunk: CsarChunk) -> np.ndarray:
+        key = (name, chunk.offset)
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        values = chunk.decode(self._read(chunk.offset + CsarChunk.header_size, chunk.nr_of_bytes))
+        if values.dtype.kind == 'f':
+            values = np.where(values == self._band_nodata[name], np.float32(self.nodata), values)
+        with self._cache_lock:
+            if key not in self._cache:
+                self._cache[key] = values
+                self._cache_bytes += values.nbytes
+                while (self._cache_bytes > self._chunk_cache) and (len(self._cache) > 1):
+                    self._cache_bytes -= self._cache.popitem(last=False)[1].nbytes
+        return values
+
+    def _read_layer(self, name: str, window: Tuple[slice, slice]) -> np.ndarray:
+        first = next(iter(self._chunks[name].values()), None)
+        dtype = first.dtype if first is not None else CsarChunk.data_types[0]
+        nodata = self.nodata if dtype.kind == 'f' else self._band_nodata[name]
+        layer = np.full((window[0].stop - window[0].start, window[1].stop - window[1].start), nodata, dtype=dtype)
+        rows, cols = self._chunk_shape
+        for chunk_row in range(window[0].start // rows * rows, window[0].stop, rows):
+            for chunk_col in range(window[1].start // cols * cols, window[1].stop, cols):
+                chunk = self._chunks[name].get((chunk_row, chunk_col))
+                if chunk is None:  # empty
+                    continue
+                values = self._chunk(name, chunk)
+                row0, row1 = max(window[0].start, chunk_row), min(window[0].stop, chunk_row + chunk.shape[0])
+                col0, col1 = max(window[1].start, chunk_col), min(window[1].stop, chunk_col + chunk.shape[1])
+                if (row0 >= row1) or (col0 >= col1):
+                    continue
+                layer[row0 - window[0].start:row1 - window[0].start, col0 - window[1].start:col1 - window[1].start] = \
+                    values[row0 - chunk_row:row1 - chunk_row, col0 - chunk_col:col1 - chunk_col]
+        return layer
+
+    def read_window(self, row: int, col: int, nr_rows: int, nr_cols: int) -> GridTile:
+        """Read the passed core cells (clipped at the grid borders) with their halo"""
+        row1 = min(row + nr_rows, self._shape[0])
+        col1 = min(col + nr_cols, self._shape[1])
+        origin = (max(row - self._halo, 0), max(col - self._halo, 0))
+        end = (min(row1 + self._halo, self._shape[0]), min(col1 + self._halo, self._shape[1]))
+        window = (slice(origin[0], end[0]), slice(origin[1], end[1]))
+        layers = {name: self._read_layer(name, window) for name in self._layers}
+        return GridTile(row=row, col=col, shape=(row1 - row, col1 - col), origin=origin, layers=layers)
+
+    def tiles(self) -> Iterator[GridTile]:
+        """Yield the tiles in row-major order (the last row and column of tiles may be smaller)
+
+        The following tiles are read in the background while the current one is processed.
+        """
+        positions = ((row, col) for row in range(0, self._shape[0], self._tile_shape[0])
+                     for col in range(0, self._shape[1], self._tile_shape[1]))
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self._nr_of_threads, thread_name_prefix="csar-read-ahead") as pool:
+            try:
+                for row, col in positions:
+                    pending.append(pool.submit(self.read_window, row, col, *self._tile_shape))
+                    if len(pending) > self._read_ahead:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def close(self) -> None:
+        self._fid.close()
+        with self._cache_lock:
+            self._cache.clear()
+            self._cache_bytes = 0
+
+    def __iter__(self):
+        return self.tiles()
+
+    def __len__(self):
+        return self.nr_of_tiles
+
+    @classmethod
+    def load_grid(cls, path: str) -> dict:
+        """Read the whole elevation, uncertainty and (if any) density layers of the passed CSAR file
+
+        This is the default grid loader of the CSAR files.
+        """
+        try:
+            reader = cls(path, layers=cls.layers + ("density", ), nr_of_threads=1)
+        except RuntimeError as e:  # without density band
+            logger.debug("%s" % e)
+            reader = cls(path, nr_of_threads=1)
+        with reader:
+            return dict(reader.read_window(0, 0, *reader.shape))
+
+    def __enter__(self) -> 'CsarTileReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <path: %s>\n" % os.path.basename(self._path)
+        msg += "  <shape: %s>\n" % (self._shape, )
+        msg += "  <tile shape: %s>\n" % (self._tile_shape, )
+        msg += "  <halo: %d>\n" % self._halo
+        msg += "  <read-ahead: %d tiles, %d threads>\n" % (self._read_ahead, self._nr_of_threads)
+        return msg
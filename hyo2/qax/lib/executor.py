@@ -0,0 +1,815 @@
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Callable, Optional
+
+from hyo2.qax.lib.check_index import CheckIndex
+from hyo2.qax.lib.fingerprint import FileFingerprint
+from hyo2.qax.lib.memory import GridMemoryEstimator, MemoryCalibration
+from hyo2.qax.lib.metrics import CheckMetrics
+from hyo2.qax.lib.result_cache import ResultCache
+from hyo2.qax.lib.scheduler import CheckScheduler, GridJob, GridLoaderRegistry, grid_loaders
+
+logger = logging.getLogger(__name__)
+
+
+def _process_context() -> multiprocessing.context.BaseContext:
+    """Return the context to start the worker processes
+
+    Where available, the workers are forked from a server process started fresh (otherwise, spawned), so that
+    they do not inherit the memory of the caller: it would be counted in the peak RSS of their checks.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["__main__", __name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def timestamp() -> str:
+    """Return the current UTC time as an ISO 8601 date-time (as used in 'outputs.execution')"""
+    return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+
+
+class CancellationToken:
+    """Thread-safe flag to cooperatively cancel an execution (e.g., from a GUI thread)"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def reset(self) -> None:
+        self._event.clear()
+
+
+class CheckRunnerRegistry:
+    """Registry of the functions that execute the checks, keyed by check name (i.e., 'info.name')
+
+    A runner is called with a copy of the check and with the loaded input grids (keyed by path), and returns
+    a dict merged into the check outputs (e.g., 'count', 'percentage', 'files'). Since they are executed
+    in worker processes, the runners must be picklable (i.e., module-level functions).
+    """
+
+    def __init__(self):
+        self._runners = dict()
+
+    def register(self, name: str, runner: Callable[[dict, dict], dict]) -> None:
+        self._runners[name] = runner
+        logger.debug("registered check runner: %s" % name)
+
+    def unregister(self, name: str) -> None:
+        self._runners.pop(name, None)
+
+    def runner(self, check: dict) -> Optional[Callable[[dict, dict], dict]]:
+        return self._runners.get(CheckIndex.value(check, 'name'))
+
+    def get(self, name: str) -> Optional[Callable[[dict, dict], dict]]:
+        return self._runners.get(name)
+
+    @property
+    def names(self) -> list:
+        return sorted(self._runners)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._runners
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        for name in self.names:
+            msg += "  <%s>\n" % name
+        return msg
+
+
+def _find_holidays(check: dict, grids: dict) -> dict:
+    from hyo2.qax.lib.holidays import find_holidays  # numpy is only imported by the workers running it
+
+    return find_holidays(check, grids)
+
+
+check_runners = CheckRunnerRegistry()
+check_runners.register("Holiday Finder", _find_holidays)
+
+_context = threading.local()
+
+
+def check_staging_folder() -> Optional[str]:
+    """Return the folder where the running check should write its output files (None if not staged)
+
+    The files listed in the check 'outputs.files' and written in this folder are moved to the output folder
+    only once the check completes, so that the files left by an interrupted check are not mistaken for results.
+    """
+    folder = getattr(_context, "staging_folder", None)
+    if folder is not None:
+        os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def add_processed_cells(nr_of_cells: int) -> None:
+    """Report cells processed by the running check (by default, the cells of its input grids are counted)"""
+    _context.cells = (getattr(_context, "cells", None) or 0) + nr_of_cells
+
+
+def _call_runner(runner: Callable[[dict, dict], dict], check: dict, grids: dict, staging: Optional[str]) -> tuple:
+    """Call the runner in the context of the check, returning its outputs and the number of processed cells"""
+    _context.staging_folder = staging
+    _context.cells = None
+    try:
+        outputs = runner(check, grids)
+        cells = _context.cells if _context.cells is not None else CheckMetrics.grid_cells(grids)
+        return outputs, cells
+    finally:
+        _context.staging_folder = None
+        _context.cells = None
+
+
+def _run_job(send: Callable[[tuple], None], tasks: list, loaders: dict,
+             cancelled: Optional[Callable[[], bool]] = None, isolated: bool = True) -> None:
+    """Execute the tasks of a grid job, loading each input once and releasing it after its last consumer
+
+    'isolated' tells that the job runs in a worker process (not in the process of the caller).
+    """
+    grids = dict()
+    for key, runner, check, paths, releases, staging in tasks:
+        if (cancelled is not None) and cancelled():
+            send(("finished", key, "aborted", None, "cancelled"))
+            continue
+        send(("running", key))
+        metrics = CheckMetrics(isolated=isolated)
+        try:
+            for path in paths:
+                if path not in grids:
+                    loader = loaders.get(path)
+                    grids[path] = path if loader is None else loader(path)
+            outputs, cells = _call_runner(runner, check, {path: grids[path] for path in paths}, staging)
+            send(("metrics", key, metrics.stop(cells=cells)))
+            send(("finished", key, "completed", outputs, None))
+        except Exception:
+            send(("metrics", key, metrics.stop()))
+            send(("finished", key, "failed", None, traceback.format_exc()))
+        for path in releases:
+            grids.pop(path, None)
+
+
+def _job_process(conn, tasks: list, loaders: dict) -> None:
+    _run_job(send=conn.send, tasks=tasks, loaders=loaders)
+    conn.close()
+
+
+def _load_shared_process(conn, path: str, loader: Callable[[str], dict]) -> None:
+    from hyo2.qax.lib.shared_grid import SharedGrid
+
+    try:
+        grid = SharedGrid.create(loader(path))
+        conn.send(("loaded", path, grid.descriptor))
+        grid.close()
+    except Exception:
+        conn.send(("load_failed", path, traceback.format_exc()))
+    conn.close()
+
+
+def _check_shared_process(conn, task: tuple, descriptors: dict) -> None:
+    from hyo2.qax.lib.shared_grid import SharedGrid
+
+    key, runner, check, paths, _, staging = task
+    conn.send(("running", key))
+    metrics = CheckMetrics()
+    grids = dict()
+    try:
+        for path in paths:
+            grids[path] = SharedGrid.attach(descriptors[path]) if path in descriptors else path
+        outputs, cells = _call_runner(runner, check, dict(grids), staging)
+        conn.send(("metrics", key, metrics.stop(cells=cells)))
+        conn.send(("finished", key, "completed", outputs, None))
+    except Exception:
+        conn.send(("metrics", key, metrics.stop()))
+        conn.send(("finished", key, "failed", None, traceback.format_exc()))
+    for grid in grids.values():
+        if isinstance(grid, SharedGrid):
+            grid.close()
+    conn.close()
+
+
+class _Worker:
+    """A worker process with the checks it is responsible for, and the one currently running"""
+
+    def __init__(self, process: multiprocessing.process.BaseProcess, keys: list, tag: object, reserved: int = 0):
+        self.process = process
+        self.reserved = reserved  # estimated memory, accounted against the budget
+        self.keys = dict.fromkeys(keys)
+        self.tag = tag
+        self.current = None
+        self.timeout = None
+        self.deadline = None  # when the current check (or the load) must be completed
+
+    def set_timeout(self, timeout: Optional[float]) -> None:
+        """Start timing the current check (or the load) with the passed limit (None for no limit)"""
+        self.timeout = timeout
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+
+
+class _JobDispatcher:
+    """Dispatch each grid job to a single worker process, that loads the shared inputs once"""
+
+    def __init__(self, executor: 'CheckExecutor', index: CheckIndex, jobs: list, handle: Callable):
+        self._executor = executor
+        self._index = index
+        self._jobs = deque(jobs)
+        self._handle = handle
+
+    @property
+    def pending(self) -> bool:
+        return len(self._jobs) > 0
+
+    def next_task(self, available: Optional[int] = None) -> Optional[tuple]:
+        # the largest job fitting in the available memory (if limited)
+        for i, job in enumerate(self._jobs):
+            if (available is None) or (job.peak_bytes <= available):
+                del self._jobs[i]
+                return _job_process, self._executor.payload(index=self._index, job=job), job.keys, job, \
+                    job.peak_bytes
+        return None
+
+    def on_message(self, message: tuple) -> None:
+        self._handle(message)
+
+    def on_exit(self, tag: object, keys: list, status: str, error: str) -> None:
+        for key in keys:
+            self._handle(("finished", key, status, None, error))
+
+    def on_timeout(self, tag: object, key: Optional[int], keys: list) -> None:
+        # abort the stuck check, and re-queue the job checks that did not run yet
+        if key is None:  # stuck before starting the first check
+            key = keys[0]
+        self._handle(("finished", key, "aborted", None, "timeout"))
+        remaining = [item for item in keys if item != key]
+        if remaining:
+            self._jobs.appendleft(tag.subset(remaining))
+
+    def abort(self, error: str = "not started") -> None:
+        while self._jobs:
+            self.on_exit(tag=None, keys=self._jobs.popleft().keys, status="aborted", error=error)
+
+    def close(self) -> None:
+        pass
+
+
+class _SharedGridDispatcher:
+    """Load each input grid in shared memory once, then run each consumer check in its own worker process
+
+    Loaders must return a mapping of layer names to numpy arrays. At most 'max_workers' grids are loaded
+    at the same time (plus the ones required by the next check), and each grid is unlinked as soon as
+    its last consumer is done. The shared memory support (and numpy) is only imported when this dispatcher is used.
+    """
+
+    def __init__(self, executor: 'CheckExecutor', index: CheckIndex, jobs: list, handle: Callable):
+        from multiprocessing import resource_tracker
+        from hyo2.qax.lib.shared_grid import SharedGridPool
+
+        self._executor = executor
+        self._index = index
+        self._handle = handle
+        self._pool = SharedGridPool()
+        # the workers must share the tracker of this process, or each of them would unlink its blocks at exit
+        resource_tracker.ensure_running()
+
+        self._pending = [key for job in jobs for key in job.keys]
+        self._tasks = dict()  # key -> (key, runner, check, paths, releases, staging)
+        self._loaders = dict()  # path -> loader (only for the paths with a loader)
+        self._consumers = dict()  # path -> number of consumers still to be done
+        self._states = dict()  # path -> "loading", "loaded", "released" or "failed"
+        self._sizes = dict()  # path -> estimated size
+        for job in jobs:
+            for path in job.paths:
+                self._sizes[path] = job.size(path)
+            tasks, loaders = executor.payload(index=index, job=job)
+            for task in tasks:
+                self._tasks[task[0]] = task
+            for path, loader in loaders.items():
+                if loader is not None:
+                    self._loaders[path] = loader
+        for key in self._pending:
+            for path in self._shared_paths(key):
+                self._consumers[path] = self._consumers.get(path, 0) + 1
+
+    def _shared_paths(self, key: int) -> list:
+        return [path for path in self._tasks[key][3] if path in self._loaders]
+
+    @property
+    def pending(self) -> bool:
+        return len(self._pending) > 0
+
+    def next_task(self, available: Optional[int] = None) -> Optional[tuple]:
+        # first, the checks with all their inputs in shared memory
+        for key in self._pending:
+            if all(self._states.get(path) == "loaded" for path in self._shared_paths(key)):
+                self._pending.remove(key)
+                descriptors = {path: self._pool.descriptor(path) for path in self._shared_paths(key)}
+                return _check_shared_process, (self._tasks[key], descriptors), [key], key, 0
+
+        # then, the loading of the grids required by the next checks (the ones of the first check are always
+        # loaded, to progress), within the memory budget for the resident grids
+        budget = self._executor.memory_budget
+        resident = [path for path, state in self._states.items() if state in ("loading", "loaded")]
+        resident_bytes = sum(self._sizes[path] for path in resident)
+        for i, key in enumerate(self._pending):
+            for path in self._shared_paths(key):
+                if path in self._states:
+                    continue
+                if (i > 0) and (len(resident) >= self._executor.max_workers):
+                    return None
+                if (i > 0) and (budget is not None) and (resident_bytes + self._sizes[path] > budget):
+                    return None
+                self._states[path] = "loading"
+                return _load_shared_process, (path, self._loaders[path]), list(), path, 0
+        return None
+
+    def _release(self, key: int) -> None:
+        for path in self._shared_paths(key):
+            self._consumers[path] -= 1
+            if self._pool.release(path):
+                self._states[path] = "released"
+
+    def _load_failed(self, path: str, error: str, status: str = "failed") -> None:
+        self._states[path] = "failed"
+        for key in [key for key in self._pending if path in self._shared_paths(key)]:
+            self._pending.remove(key)
+            self._handle(("running", key))
+            self._handle(("finished", key, status, None, "unable to load %s: %s" % (path, error)))
+            self._release(key)
+
+    def on_message(self, message: tuple) -> None:
+        if message[0] == "loaded":
+            path, descriptor = message[1:]
+            self._states[path] = "loaded"
+            if self._pool.add(path=path, descriptor=descriptor, consumers=self._consumers[path]):
+                self._states[path] = "released"
+        elif message[0] == "load_failed":
+            self._load_failed(path=message[1], error=message[2])
+        else:
+            self._handle(message)
+            if message[0] == "finished":
+                self._release(message[1])
+
+    def on_exit(self, tag: object, keys: list, status: str, error: str) -> None:
+        if tag in self._states:  # a loading process
+            if self._states[tag] == "loading":
+                self._load_failed(path=tag, error=error)
+            return
+        for key in keys:
+            self._handle(("finished", key, status, None, error))
+            self._release(key)
+
+    def on_timeout(self, tag: object, key: Optional[int], keys: list) -> None:
+        if tag in self._states:  # a loading process
+            self._load_failed(path=tag, error="timeout", status="aborted")
+            return
+        self.on_exit(tag=tag, keys=keys, status="aborted", error="timeout")
+
+    def abort(self, error: str = "not started") -> None:
+        while self._pending:
+            key = self._pending.pop(0)
+            self._handle(("finished", key, "aborted", None, error))
+            self._release(key)
+
+    def close(self) -> None:
+        self._pool.clear()
+
+
+class CheckExecutor:
+    """Execute checks in worker processes, updating their 'outputs.execution' block
+
+    The checks are grouped in grid jobs by the scheduler, so that the checks sharing an input load it once.
+    Each job runs in its own process (up to 'max_workers' at the same time), so that a crashing
+    or misbehaving check cannot take down the others. The status moves from 'queued' to 'running',
+    and then to 'completed', 'failed' (runner error) or 'aborted' (killed worker). The checks without
+    a registered runner are skipped (left unchanged).
+    With 'shared_memory', each input grid is instead loaded once in shared memory and the checks
+    consuming it run in separate processes, attaching to its layers zero-copy.
+    The cost of each executed check (see 'CheckMetrics') is stored in its 'outputs.execution.metrics'.
+    With a result cache, the checks with unchanged identity, parameters and inputs get their cached outputs.
+    A check running beyond its timeout (the 'timeout' parameter of the check, or the global one) is aborted
+    by killing its worker, and the checks left by that worker are re-queued.
+    With a staging folder, each check writes its output files in its own sub-folder (see 'check_staging_folder'),
+    and they are moved to the output folder once it completes: the files of the failed or interrupted checks
+    are removed, at the end or at the next execution.
+    With a memory budget, the jobs (or the shared grid loads) are only started while their estimated memory
+    fits in it, and the estimated versus actual peak RSS of each check is recorded in the calibration (if any).
+    With 'max_workers' equal to 0, the checks are executed serially in the current process (the timeout
+    is not enforced, and cancellation is only checked between checks).
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, registry: Optional[CheckRunnerRegistry] = None,
+                 scheduler: Optional[CheckScheduler] = None, loaders: Optional[GridLoaderRegistry] = None,
+                 shared_memory: bool = False, cache: Optional[ResultCache] = None, timeout: Optional[float] = None,
+                 memory_budget: Optional[int] = None, calibration: Optional[MemoryCalibration] = None,
+                 staging_folder: Optional[Path] = None, output_folder: Optional[Path] = None,
+                 grace_period: float = 5.0, poll_interval: float = 0.5):
+        self._max_workers = max_workers
+        self._registry = registry if registry is not None else check_runners
+        self._scheduler = scheduler if scheduler is not None \
+            else CheckScheduler(size_estimator=GridMemoryEstimator().estimate)
+        self._loaders = loaders if loaders is not None else grid_loaders
+        self._shared_memory = shared_memory
+        self._cache = cache
+        self._timeout = timeout
+        self._memory_budget = memory_budget
+        self._calibration = calibration
+        self._staging_folder = staging_folder
+        self._output_folder = output_folder
+        self._grace_period = grace_period
+        self._poll_interval = poll_interval
+        self._peak_memory_bound = 0
+
+        self.queued = None  # callback(keys)
+        self.started = None  # callback(key)
+        self.finished = None  # callback(key, status)
+
+    @property
+    def max_workers(self) -> int:
+        if self._max_workers is None:
+            return os.cpu_count() or 1
+        return self._max_workers
+
+    @max_workers.setter
+    def max_workers(self, value: Optional[int]) -> None:
+        self._max_workers = value
+
+    @property
+    def registry(self) -> CheckRunnerRegistry:
+        return self._registry
+
+    @property
+    def scheduler(self) -> CheckScheduler:
+        return self._scheduler
+
+    @property
+    def shared_memory(self) -> bool:
+        return self._shared_memory
+
+    @shared_memory.setter
+    def shared_memory(self, value: bool) -> None:
+        self._shared_memory = value
+
+    @property
+    def cache(self) -> Optional[ResultCache]:
+        return self._cache
+
+    @cache.setter
+    def cache(self, value: Optional[ResultCache]) -> None:
+        self._cache = value
+
+    @property
+    def timeout(self) -> Optional[float]:
+        """Wall-clock limit for each check (in seconds), after which its worker is killed
+
+        A check can set its own limit with its 'timeout' parameter.
+        """
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value: Optional[float]) -> None:
+        self._timeout = value
+
+    @property
+    def memory_budget(self) -> Optional[int]:
+        """Global limit for the estimated memory of the running workers (in bytes)"""
+        return self._memory_budget
+
+    @memory_budget.setter
+    def memory_budget(self, value: Optional[int]) -> None:
+        self._memory_budget = value
+
+    @property
+    def calibration(self) -> Optional[MemoryCalibration]:
+        return self._calibration
+
+    @calibration.setter
+    def calibration(self, value: Optional[MemoryCalibration]) -> None:
+        self._calibration = value
+
+    @property
+    def staging_folder(self) -> Optional[Path]:
+        return self._staging_folder
+
+    @property
+    def output_folder(self) -> Optional[Path]:
+        """Destination of the staged output files (by default, the parent of the staging folder)"""
+        if (self._output_folder is None) and (self._staging_folder is not None):
+            return Path(self._staging_folder).parent
+        return self._output_folder
+
+    @property
+    def peak_memory_bound(self) -> int:
+        """Upper bound of the memory used by the loaded grids during the last execution (in bytes)"""
+        return self._peak_memory_bound
+
+    def execute(self, index: CheckIndex, keys: list, token: Optional[CancellationToken] = None) -> dict:
+        """Execute the checks with the passed keys, returning the number of checks for each final status
+
+        Once the passed token is cancelled, the queued checks are aborted and the running workers are stopped.
+        The checks without a registered runner are left unchanged, and counted as 'skipped'.
+        """
+        summary = dict()
+        for key in keys:  # the files left by an interrupted execution
+            self._discard_files(check=index.get(key))
+        skipped = {key for key in keys if self._registry.runner(index.get(key)) is None}
+        if skipped:
+            names = sorted({str(index.value(index.get(key), 'name')) for key in skipped})
+            logger.info("skipping %d checks without runner: %s" % (len(skipped), ", ".join(names)))
+            keys = [key for key in keys if key not in skipped]
+            summary["skipped"] = len(skipped)
+        index.set_status(keys, "queued")
+        if self.queued is not None:
+            self.queued(list(keys))
+        cache_keys = dict()  # check key -> result cache key
+        fingerprints = dict()  # check key -> fingerprints of the inputs
+        estimates = dict()  # check key -> estimated memory
+        metrics = dict()  # check key -> measured execution metrics
+        calibration = self._calibration
+
+        def _handle(message: tuple) -> None:
+            nonlocal calibration
+            if message[0] == "running":
+                self._start(index=index, key=message[1])
+                return
+            if message[0] == "metrics":
+                key, metrics[key] = message[1:]
+                if calibration is not None:  # only the peaks measured for the check alone
+                    try:
+                        calibration.record(name=index.value(index.get(key), 'name'),
+                                           estimated=estimates.get(key, 0), peak=metrics[key].get('peak_rss'))
+                    except OSError as e:
+                        logger.warning("unable to record the memory calibration, continuing without: %s" % e)
+                        calibration = None
+                return
+            key, status, outputs, error = message[1:]
+            if status == "completed":
+                outputs = self._commit_files(check=index.get(key), outputs=outputs)
+            else:
+                self._discard_files(check=index.get(key))
+            if (key in cache_keys) and (status == "completed") and (outputs is not None):
+                self._cache.put(cache_keys.pop(key), outputs)
+            if (key in fingerprints) and (status == "completed"):
+                self._record_fingerprints(index=index, key=key, fingerprints=fingerprints.pop(key))
+            self._finish(index=index, key=key, status=status, outputs=outputs, error=error,
+                         metrics=metrics.pop(key, None))
+            summary[status] = summary.get(status, 0) + 1
+            if self.finished is not None:
+                self.finished(key, status)
+
+        start = time.perf_counter()
+        runnable_keys = list()
+        for key in keys:
+            fingerprints[key] = [FileFingerprint.of(item['path'])
+                                 for item in index.get(key).get('inputs', dict()).get('files', list())]
+            if self._cache is not None:
+                cache_key = self._cache.make_key(index.get(key), fingerprints=fingerprints[key])
+                outputs = self._cache.get(cache_key)
+                if outputs is not None:  # restore the cached outputs
+                    _handle(("running", key))
+                    _handle(("finished", key, "completed", outputs, None))
+                    continue
+                cache_keys[key] = cache_key
+            runnable_keys.append(key)
+
+        timeouts = {key: self.check_timeout(index.get(key)) for key in runnable_keys}
+        jobs = self._scheduler.schedule(index=index, keys=runnable_keys)
+        estimates.update({key: job.estimate(key) for job in jobs for key in job.keys})
+        self._peak_memory_bound = self._scheduler.peak_memory_bound(jobs=jobs, max_workers=self.max_workers)
+        if self._memory_budget is not None:
+            self._peak_memory_bound = min(self._peak_memory_bound,
+                                          max([self._memory_budget] + [job.peak_bytes for job in jobs]))
+        logger.info("%d checks in %d grid jobs, peak memory bound: %.1f MB"
+                    % (len(runnable_keys), len(jobs), self._peak_memory_bound / (1024 * 1024)))
+
+        if self.max_workers == 0:
+            def _cancelled() -> bool:
+                return (token is not None) and token.cancelled
+
+            for job in jobs:
+                _run_job(_handle, *self.payload(index=index, job=job), cancelled=_cancelled, isolated=False)
+        elif self._shared_memory:
+            self._execute_in_processes(_SharedGridDispatcher(self, index=index, jobs=jobs, handle=_handle),
+                                       token=token, timeouts=timeouts)
+        else:
+            self._execute_in_processes(_JobDispatcher(self, index=index, jobs=jobs, handle=_handle), token=token,
+                                       timeouts=timeouts)
+
+        logger.info("executed %d checks in %.2f sec: %s" % (len(keys), time.perf_counter() - start, summary))
+        if self._cache is not None:
+            logger.info("result cache: %s" % self._cache.stats())
+        return summary
+
+    def payload(self, index: CheckIndex, job: GridJob) -> tuple:
+        """Return the picklable tasks and loaders to execute the passed grid job in a worker process"""
+        tasks = [(key, self._registry.runner(index.get(key)), index.get(key), job.inputs(key), job.releases(key),
+                  self._check_staging_folder(index.get(key))) for key in job.keys]
+        loaders = {path: self._loaders.loader(path) for path in job.paths}
+        return tasks, loaders
+
+    def check_timeout(self, check: dict) -> Optional[float]:
+        """Return the wall-clock limit of the passed check: its 'timeout' parameter, otherwise the global one"""
+        timeout = (check.get('params') or dict()).get('timeout')
+        return self._timeout if timeout is None else float(timeout)
+
+    @classmethod
+    def _dispatch(cls, dispatcher, message: tuple) -> None:
+        """Pass a worker message to the dispatcher: an error while handling it only fails the affected check"""
+        try:
+            dispatcher.on_message(message)
+        except Exception:
+            error = traceback.format_exc()
+            if (message[0] != "finished") or (message[2] == "failed"):
+                logger.warning("unable to handle the '%s' message: %s" % (message[0], error))
+                return
+            logger.warning("unable to handle the result of check %s: %s" % (message[1], error))
+            dispatcher.on_message(("finished", message[1], "failed", None, error))
+
+    def _execute_in_processes(self, dispatcher, token: Optional[CancellationToken], timeouts: dict) -> None:
+        context = _process_context()
+        running = dict()  # connection -> worker
+        try:
+            while dispatcher.pending or running:
+                if (token is not None) and token.cancelled:
+                    logger.info("execution cancelled")
+                    break
+
+                while len(running) < self.max_workers:
+                    available = None
+                    if (self._memory_budget is not None) and running:  # an oversized task can still run alone
+                        available = self._memory_budget - sum(worker.reserved for worker in running.values())
+                    task = dispatcher.next_task(available=available)
+                    if task is None:
+                        break
+                    target, args, keys, tag, reserved = task
+                    if (self._memory_budget is not None) and (reserved > self._memory_budget):
+                        logger.warning("estimated memory beyond the budget: %.1f MB" % (reserved / (1024 * 1024)))
+                    recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+                    process = context.Process(target=target, args=(send_conn,) + tuple(args), daemon=True)
+                    process.start()
+                    send_conn.close()
+                    worker = _Worker(process=process, keys=keys, tag=tag, reserved=reserved)
+                    if not keys:  # a grid load
+                        worker.set_timeout(self._timeout)
+                    running[recv_conn] = worker
+                if not running:
+                    raise RuntimeError("unable to dispatch the pending checks")
+
+                sentinels = {worker.process.sentinel: conn for conn, worker in running.items()}
+                ready = wait(list(running) + list(sentinels), timeout=self._poll_interval)
+                for conn in {sentinels.get(item, item) for item in ready}:
+                    worker = running[conn]
+                    while True:
+                        try:
+                            if not conn.poll():
+                                break
+                            message = conn.recv()
+                        except (EOFError, OSError):  # the worker has exited
+                            del running[conn]
+                            conn.close()
+                            worker.process.join()
+                            status = "aborted" if worker.process.exitcode < 0 else "failed"
+                            dispatcher.on_exit(tag=worker.tag, keys=list(worker.keys), status=status,
+                                               error="worker exit code: %s" % worker.process.exitcode)
+                            break
+                        if message[0] == "running":
+                            worker.current = message[1]
+                            worker.set_timeout(timeouts.get(message[1], self._timeout))
+                        elif message[0] == "finished":
+                            worker.keys.pop(message[1], None)
+                            worker.current = None
+                            worker.set_timeout(None)
+                        self._dispatch(dispatcher, message)
+
+                now = time.monotonic()
+                for conn, worker in list(running.items()):
+                    if (worker.deadline is None) or (now <= worker.deadline):
+                        continue
+                    logger.warning("timeout after %.1f sec: killing worker %s" % (worker.timeout, worker.process.pid))
+                    del running[conn]
+                    self._stop(worker.process)
+                    conn.close()
+                    dispatcher.on_timeout(tag=worker.tag, key=worker.current, keys=list(worker.keys))
+        finally:
+            cancelled = (token is not None) and token.cancelled
+            dispatcher.abort(error="cancelled" if cancelled else "not started")
+            for conn, worker in running.items():
+                self._stop(worker.process)
+                conn.close()
+                dispatcher.on_exit(tag=worker.tag, keys=list(worker.keys), status="aborted",
+                                   error="cancelled" if cancelled else "terminated")
+            dispatcher.close()
+
+    def _stop(self, process: multiprocessing.process.BaseProcess) -> None:
+        """Terminate the worker process, killing it if still alive after the grace period"""
+        process.terminate()
+        process.join(self._grace_period)
+        if process.is_alive():
+            logger.warning("killing stuck worker %s" % process.pid)
+            process.kill()
+            process.join()
+
+    def _check_staging_folder(self, check: dict) -> Optional[str]:
+        if self._staging_folder is None:
+            return None
+        name = re.sub(r"[^\w.-]", "_", str(CheckIndex.value(check, 'id')))
+        return os.path.join(os.path.abspath(str(self._staging_folder)), name)
+
+    def _commit_files(self, check: dict, outputs: Optional[dict]) -> Optional[dict]:
+        """Move the output files written in the staging folder of the check to the output folder"""
+        staging = self._check_staging_folder(check)
+        if (staging is None) or (outputs is None):
+            return outputs
+        for item in outputs.get('files', list()):
+            path = os.path.abspath(item['path'])
+            if os.path.commonpath([path, staging]) != staging:
+                continue
+            target = os.path.join(str(self.output_folder), os.path.relpath(path, os.path.dirname(staging)))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(path, target)
+            item['path'] = target
+        self._discard_files(check=check)
+        return outputs
+
+    def _discard_files(self, check: dict) -> None:
+        """Remove the staging folder of the check, with any file partially written by a not completed execution"""
+        staging = self._check_staging_folder(check)
+        if (staging is None) or (not os.path.exists(staging)):
+            return
+        nr_of_files = sum(len(files) for _, _, files in os.walk(staging))
+        if nr_of_files > 0:
+            logger.warning("removing %d partial output files of check %s"
+                           % (nr_of_files, CheckIndex.value(check, 'id')))
+        shutil.rmtree(staging, ignore_errors=True)
+
+    @classmethod
+    def is_outdated(cls, check: dict) -> bool:
+        """Whether the check has not been completed, or any of its inputs changed since its last execution"""
+        if CheckIndex.value(check, 'status') != "completed":
+            return True
+        for item in check.get('inputs', dict()).get('files', list()):
+            if not FileFingerprint.matches(item['path'], item.get('fingerprint')):
+                return True
+        return False
+
+    @classmethod
+    def _record_fingerprints(cls, index: CheckIndex, key: int, fingerprints: list) -> None:
+        def _set_fingerprints(check: dict) -> None:
+            for item, fingerprint in zip(check['inputs']['files'], fingerprints):
+                if fingerprint is None:
+                    item.pop('fingerprint', None)
+                else:
+                    item['fingerprint'] = fingerprint
+
+        if len(fingerprints) > 0:
+            index.update([key], _set_fingerprints)
+
+    def _start(self, index: CheckIndex, key: int) -> None:
+        def _set_running(check: dict) -> None:
+            execution = check.setdefault('outputs', dict()).setdefault('execution', dict())
+            execution['status'] = "running"
+            execution['start'] = timestamp()
+            execution.pop('end', None)
+            execution.pop('metrics', None)
+
+        index.update([key], _set_running)
+        if self.started is not None:
+            self.started(key)
+
+    @classmethod
+    def _finish(cls, index: CheckIndex, key: int, status: str, outputs: Optional[dict],
+                error: Optional[str], metrics: Optional[dict] = None) -> None:
+        def _set_result(check: dict) -> None:
+            check_outputs = check.setdefault('outputs', dict())
+            if outputs is not None:
+                check_outputs.update(outputs)
+            execution = check_outputs.setdefault('execution', dict())
+            execution['status'] = status
+            execution['end'] = timestamp()
+            if metrics is not None:
+                execution['metrics'] = metrics
+
+        index.update([key], _set_result)
+        if error is not None:
+            logger.warning("check %s: %s -> %s" % (index.value(index.get(key), 'name'), status, error))
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <max workers: %d>\n" % self.max_workers
+        msg += "  <runners: %d>\n" % len(self._registry.names)
+        return msg
@@ -0,0 +1,51 @@
+import hashlib
+import logging
+import os
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FileFingerprint:
+    """Cheap identity of an input file: size, modification time and a hash of its head and tail
+
+    Hashing only the first and the last blocks keeps the fingerprint of multi-GB grids fast,
+    while still catching the common rewrites (a reprocessed grid changes its header and/or its tail).
+    """
+
+    block_size = 1 << 20
+
+    @classmethod
+    def of(cls, path: str) -> Optional[dict]:
+        """Return the fingerprint of the passed file, or None if it cannot be read"""
+        try:
+            stat = os.stat(path)
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(str(stat.st_size).encode())
+            with open(path, "rb") as fid:
+                digest.update(fid.read(cls.block_size))
+                if stat.st_size > cls.block_size:
+                    fid.seek(max(stat.st_size - cls.block_size, cls.block_size))
+                    digest.update(fid.read(cls.block_size))
+        except OSError as e:
+            logger.debug("unable to fingerprint %s: %s" % (path, e))
+            return None
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': digest.hexdigest()}
+
+    @classmethod
+    def matches(cls, path: str, fingerprint: Optional[dict]) -> bool:
+        """Whether the file still matches the passed (previously recorded) fingerprint
+
+        The size and the modification time are checked first, so that the hash is only computed
+        for the files that look unchanged.
+        """
+        if not fingerprint:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if (stat.st_size != fingerprint.get('size')) or (stat.st_mtime_ns != fingerprint.get('mtime')):
+            return False
+        current = cls.of(path)
+        return (current is not None) and (current['hash'] == fingerprint.get('hash'))
@@ -0,0 +1,404 @@
+import bisect
+import logging
+import os
+import re
+from collections.abc import Mapping
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class GridTile(Mapping):
+    """Window of grid layers: the core cells of the tile, surrounded by a halo (clipped at the grid borders)
+
+    The layers are keyed by name and cover the whole window. The core cells are the ones owned by the tile
+    (each grid cell is in the core of exactly one tile), while the halo provides the neighbourhood context.
+    """
+
+    def __init__(self, row: int, col: int, shape: Tuple[int, int], origin: Tuple[int, int], layers: dict):
+        self._row = row
+        self._col = col
+        self._shape = shape
+        self._origin = origin  # grid position of the first window cell
+        self._layers = layers
+
+    @property
+    def row(self) -> int:
+        """Grid row of the first core cell"""
+        return self._row
+
+    @property
+    def col(self) -> int:
+        """Grid column of the first core cell"""
+        return self._col
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """Shape of the core cells"""
+        return self._shape
+
+    @property
+    def origin(self) -> Tuple[int, int]:
+        """Grid position of the first window cell"""
+        return self._origin
+
+    @property
+    def window_shape(self) -> Tuple[int, int]:
+        return next(iter(self._layers.values())).shape if self._layers else self._shape
+
+    @property
+    def core_slices(self) -> Tuple[slice, slice]:
+        """Slices of the core cells in the window layers"""
+        row0 = self._row - self._origin[0]
+        col0 = self._col - self._origin[1]
+        return slice(row0, row0 + self._shape[0]), slice(col0, col0 + self._shape[1])
+
+    def core(self, name: str) -> np.ndarray:
+        return self._layers[name][self.core_slices]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._layers[name]
+
+    def __iter__(self):
+        return iter(self._layers)
+
+    def __len__(self):
+        return len(self._layers)
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <core: %d, %d [%d x %d]>\n" % (self._row, self._col, self._shape[0], self._shape[1])
+        msg += "  <window: %d, %d [%d x %d]>\n" % (self._origin + self.window_shape)
+        return msg
+
+
+class BagTileReader:
+    """Stream a BAG grid (HDF5) as fixed-size tiles of elevation and uncertainty, with a configurable halo
+
+    Each window is read with a single hyperslab selection, so that only the HDF5 chunks intersecting it are
+    read and decompressed. With the default tile shape (the dataset chunk shape), each chunk is read once for
+    the core cells; the halo only touches the neighbouring chunks. The HDF5 chunk cache is limited to
+    'chunk_cache' bytes, so the memory stays bounded by the windows and the cache, whatever the grid size.
+    The empty cells keep the BAG no-data value (see 'nodata').
+    """
+
+    nodata = 1000000.0
+    layers = ("elevation", "uncertainty")
+
+    def __init__(self, path: str, tile_shape: Optional[Tuple[int, int]] = None, halo: int = 0,
+                 layers: Optional[tuple] = None, chunk_cache: int = 4 * 1024 * 1024):
+        try:
+            import h5py
+        except ImportError:
+            raise RuntimeError("h5py is required to read BAG files: %s" % path)
+
+        if halo < 0:
+            raise RuntimeError("invalid halo: %s" % halo)
+        self._path = path
+        self._halo = halo
+        self._layers = tuple(layers) if layers is not None else self.layers
+        self._fid = h5py.File(path, "r", rdcc_nbytes=chunk_cache)
+        try:
+            root = self._fid['BAG_root']
+            self._datasets = {name: root[name] for name in self._layers}
+        except KeyError as e:
+            self._fid.close()
+            raise RuntimeError("invalid BAG file %s: %s" % (path, e))
+
+        elevation = next(iter(self._datasets.values()))
+        self._shape = elevation.shape
+        if tile_shape is None:
+            tile_shape = elevation.chunks if elevation.chunks is not None else (512, 512)
+        if (tile_shape[0] <= 0) or (tile_shape[1] <= 0):
+            raise RuntimeError("invalid tile shape: %s" % (tile_shape, ))
+        self._tile_shape = tuple(tile_shape)
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self._shape
+
+    @property
+    def tile_shape(self) -> Tuple[int, int]:
+        return self._tile_shape
+
+    @property
+    def halo(self) -> int:
+        return self._halo
+
+    @property
+    def nr_of_tiles(self) -> int:
+        return len(range(0, self._shape[0], self._tile_shape[0])) * len(range(0, self._shape[1], self._tile_shape[1]))
+
+    def read_window(self, row: int, col: int, nr_rows: int, nr_cols: int) -> GridTile:
+        """Read the passed core cells (clipped at the grid borders) with their halo"""
+        row1 = min(row + nr_rows, self._shape[0])
+        col1 = min(col + nr_cols, self._shape[1])
+        origin = (max(row - self._halo, 0), max(col - self._halo, 0))
+        end = (min(row1 + self._halo, self._shape[0]), min(col1 + self._halo, self._shape[1]))
+        window = (slice(origin[0], end[0]), slice(origin[1], end[1]))
+        layers = {name: dataset[window] for name, dataset in self._datasets.items()}
+        return GridTile(row=row, col=col, shape=(row1 - row, col1 - col), origin=origin, layers=layers)
+
+    def tiles(self) -> Iterator[GridTile]:
+        """Yield the tiles in row-major order (the last row and column of tiles may be smaller)"""
+        for row in range(0, self._shape[0], self._tile_shape[0]):
+            for col in range(0, self._shape[1], self._tile_shape[1]):
+                yield self.read_window(row=row, col=col, nr_rows=self._tile_shape[0], nr_cols=self._tile_shape[1])
+
+    def close(self) -> None:
+        self._fid.close()
+
+    def __iter__(self):
+        return self.tiles()
+
+    def __len__(self):
+        return self.nr_of_tiles
+
+    @classmethod
+    def load_grid(cls, path: str) -> dict:
+        """Read the whole elevation and uncertainty layers of the passed BAG file (its default grid loader)"""
+        with cls(path) as reader:
+            return dict(reader.read_window(0, 0, *reader.shape))
+
+    def __enter__(self) -> 'BagTileReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <path: %s>\n" % os.path.basename(self._path)
+        msg += "  <shape: %s>\n" % (self._shape, )
+        msg += "  <tile shape: %s>\n" % (self._tile_shape, )
+        msg += "  <halo: %d>\n" % self._halo
+        return msg
+
+
+class Refinement(Mapping):
+    """Refinement grid of a supergrid cell of a variable-resolution BAG, with its georeferencing
+
+    The layers ('elevation' and 'uncertainty') are indexed by [row, col], with row 0 at the south. The origin is
+    the position of the first (south-west) node, and the nodes are spaced by the refinement resolution.
+    """
+
+    def __init__(self, row: int, col: int, origin: Tuple[float, float], resolution: Tuple[float, float],
+                 layers: dict):
+        self._row = row
+        self._col = col
+        self._origin = origin
+        self._resolution = resolution
+        self._layers = layers
+
+    @property
+    def row(self) -> int:
+        """Row of the supergrid cell"""
+        return self._row
+
+    @property
+    def col(self) -> int:
+        """Column of the supergrid cell"""
+        return self._col
+
+    @property
+    def origin(self) -> Tuple[float, float]:
+        """Easting and northing of the south-west node"""
+        return self._origin
+
+    @property
+    def resolution(self) -> Tuple[float, float]:
+        return self._resolution
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return next(iter(self._layers.values())).shape
+
+    @property
+    def x(self) -> np.ndarray:
+        """Easting of the node columns"""
+        return self._origin[0] + np.arange(self.shape[1]) * self._resolution[0]
+
+    @property
+    def y(self) -> np.ndarray:
+        """Northing of the node rows"""
+        return self._origin[1] + np.arange(self.shape[0]) * self._resolution[1]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._layers[name]
+
+    def __iter__(self):
+        return iter(self._layers)
+
+    def __len__(self):
+        return len(self._layers)
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <supergrid: %d, %d>\n" % (self._row, self._col)
+        msg += "  <shape: %s>\n" % (self.shape, )
+        msg += "  <origin: %.3f, %.3f>\n" % self._origin
+        msg += "  <resolution: %.3f, %.3f>\n" % self._resolution
+        return msg
+
+
+class VrRefinementReader:
+    """Stream the refinements of a variable-resolution BAG, supergrid by supergrid or in batches of supergrids
+
+    Only the refinements of the current batch are in memory: the supergrid metadata are read one row at a time,
+    and the refinements of a batch with a single read for each contiguous span (usually, one for the whole batch).
+    For parallel consumption, the supergrid rows can be split in 'partitions' with about the same number of refined
+    nodes: each worker opens its own reader (HDF5 handles cannot be shared between processes) and streams its own
+    rows.
+    """
+
+    nodata = BagTileReader.nodata
+    no_refinement = 0xFFFFFFFF
+    coordinates_pattern = re.compile(r"<gml:coordinates[^>]*>\s*([^<]+)</gml:coordinates>")
+    resolution_pattern = re.compile(r"<gmd:resolution>\s*<gco:Measure[^>]*>\s*([^<]+)</gco:Measure>")
+
+    def __init__(self, path: str, chunk_cache: int = 4 * 1024 * 1024):
+        try:
+            import h5py
+        except ImportError:
+            raise RuntimeError("h5py is required to read BAG files: %s" % path)
+
+        self._path = path
+        self._fid = h5py.File(path, "r", rdcc_nbytes=chunk_cache)
+        try:
+            root = self._fid['BAG_root']
+            self._metadata = root['varres_metadata']
+            self._refinements = root['varres_refinements']
+            xml = root['metadata'][:].tobytes().decode("utf-8", errors="replace")
+            self._sw_corner, self._resolution = self._georeferencing(xml)
+        except (KeyError, ValueError) as e:
+            self._fid.close()
+            raise RuntimeError("invalid variable-resolution BAG file %s: %s" % (path, e))
+
+    @classmethod
+    def _georeferencing(cls, xml: str) -> tuple:
+        """Return the position of the south-west supergrid node and the supergrid (x, y) resolution"""
+        match = cls.coordinates_pattern.search(xml)
+        if match is None:
+            raise ValueError("missing corner points")
+        sw_x, sw_y = (float(value) for value in match.group(1).split()[0].split(","))
+        resolutions = [float(value) for value in cls.resolution_pattern.findall(xml)[:2]]
+        if len(resolutions) != 2:
+            raise ValueError("missing resolution")
+        return (sw_x, sw_y), (resolutions[1], resolutions[0])  # the row resolution is along y
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """Shape of the supergrid"""
+        return self._metadata.shape
+
+    @property
+    def resolution(self) -> Tuple[float, float]:
+        """Supergrid resolution"""
+        return self._resolution
+
+    def supergrid_origin(self, row: int, col: int) -> Tuple[float, float]:
+        """Easting and northing of the south-west corner of the passed supergrid cell"""
+        return (self._sw_corner[0] + (col - 0.5) * self._resolution[0],
+                self._sw_corner[1] + (row - 0.5) * self._resolution[1])
+
+    def nr_of_nodes(self, rows: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """Return the number of refined nodes of each supergrid row"""
+        rows = rows if rows is not None else (0, self.shape[0])
+        counts = np.zeros(rows[1] - rows[0], dtype=np.int64)
+        for row in range(*rows):
+            metadata = self._metadata[row, :]
+            refined = metadata['index'] != self.no_refinement
+            counts[row - rows[0]] = np.sum(metadata['dimensions_x'][refined].astype(np.int64)
+                                           * metadata['dimensions_y'][refined])
+        return counts
+
+    def partitions(self, nr_of_parts: int) -> list:
+        """Split the supergrid rows in contiguous (start, end) ranges with about the same number of refined nodes"""
+        counts = self.nr_of_nodes()
+        total = int(counts.sum())
+        cumulated = np.cumsum(counts)
+        bounds = [0]
+        for part in range(1, nr_of_parts):
+            bounds.append(max(int(np.searchsorted(cumulated, total * part / nr_of_parts, side="right")), bounds[-1]))
+        bounds.append(self.shape[0])
+        return [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+    def batches(self, batch_size: int = 64, rows: Optional[Tuple[int, int]] = None) -> Iterator[list]:
+        """Yield lists of up to 'batch_size' refinements, in supergrid row-major order (optionally, only some rows)"""
+        if batch_size <= 0:
+            raise RuntimeError("invalid batch size: %s" % batch_size)
+        rows = rows if rows is not None else (0, self.shape[0])
+        batch = list()
+        for row in range(*rows):
+            metadata = self._metadata[row, :]
+            for col in range(metadata.shape[0]):
+                if (metadata[col]['index'] == self.no_refinement) or (metadata[col]['dimensions_x'] == 0):
+                    continue
+                batch.append((row, col, metadata[col]))
+                if len(batch) == batch_size:
+                    yield self._read_batch(batch)
+                    batch = list()
+        if batch:
+            yield self._read_batch(batch)
+
+    def refinements(self, rows: Optional[Tuple[int, int]] = None) -> Iterator[Refinement]:
+        """Yield the refinements one supergrid at a time (read in small batches)"""
+        for batch in self.batches(batch_size=16, rows=rows):
+            for refinement in batch:
+                yield refinement
+
+    def _read_batch(self, batch: list) -> list:
+        starts = [int(metadata['index']) for _, _, metadata in batch]
+        ends = [start + int(metadata['dimensions_x']) * int(metadata['dimensions_y'])
+                for start, (_, _, metadata) in zip(starts, batch)]
+        # the refinements are usually stored in supergrid order, but they may be out of order or not adjacent
+        spans = list()
+        for start, end in sorted(zip(starts, ends)):
+            if spans and (start <= spans[-1][1]):
+                spans[-1][1] = max(end, spans[-1][1])
+            else:
+                spans.append([start, end])
+        firsts = [first for first, _ in spans]
+        nodes = [self._refinements[0, first:end] for first, end in spans]
+        refinements = list()
+        for start, end, (row, col, metadata) in zip(starts, ends, batch):
+            shape = (int(metadata['dimensions_y']), int(metadata['dimensions_x']))
+            span = bisect.bisect_right(firsts, start) - 1
+            values = nodes[span][start - firsts[span]:end - firsts[span]]
+            supergrid_x, supergrid_y = self.supergrid_origin(row=row, col=col)
+            refinements.append(Refinement(
+                row=row, col=col,
+                origin=(supergrid_x + float(metadata['sw_corner_x']), supergrid_y + float(metadata['sw_corner_y'])),
+                resolution=(float(metadata['resolution_x']), float(metadata['resolution_y'])),
+                layers={'elevation': values['depth'].reshape(shape),
+                        'uncertainty': values['depth_uncrt'].reshape(shape)}))
+        return refinements
+
+    def close(self) -> None:
+        self._fid.close()
+
+    def __iter__(self):
+        return self.refinements()
+
+    def __enter__(self) -> 'VrRefinementReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <path: %s>\n" % os.path.basename(self._path)
+        msg += "  <supergrid shape: %s>\n" % (self.shape, )
+        msg += "  <supergrid resolution: %.3f, %.3f>\n" % self._resolution
+        return msg
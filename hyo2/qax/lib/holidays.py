@@ -0,0 +1,289 @@
+import logging
+import os
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+
+from hyo2.qax.lib.grid_tiles import BagTileReader, GridTile
+
+logger = logging.getLogger(__name__)
+
+
+class Holiday:
+    """Group of empty grid nodes (4-connected) fully surrounded by populated nodes"""
+
+    def __init__(self, row: int, col: int, size: int):
+        self._row = row
+        self._col = col
+        self._size = size
+
+    @property
+    def row(self) -> int:
+        """Grid row of the first node (in row-major order)"""
+        return self._row
+
+    @property
+    def col(self) -> int:
+        """Grid column of the first node (in row-major order)"""
+        return self._col
+
+    @property
+    def size(self) -> int:
+        """Number of empty nodes"""
+        return self._size
+
+    def _key(self) -> tuple:
+        return self._row, self._col, self._size
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Holiday) and (self._key() == other._key())
+
+    def __lt__(self, other: 'Holiday') -> bool:
+        return self._key() < other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return "<%s: %d, %d [%d nodes]>" % (self.__class__.__name__, self._row, self._col, self._size)
+
+
+def _open_reader(path: str, tile_shape: Tuple[int, int], halo: int):
+    if os.path.splitext(path)[-1].lower() == ".csar":
+        from hyo2.qax.lib.csar_tiles import CsarTileReader
+        return CsarTileReader(path, tile_shape=tile_shape, halo=halo, layers=("elevation", ), nr_of_threads=1)
+    return BagTileReader(path, tile_shape=tile_shape, halo=halo, layers=("elevation", ))
+
+
+def _find_in_tiles(path: str, tile_shape: Tuple[int, int], positions: list) -> list:
+    """Process pool entry point: return the components of the passed tiles"""
+    with _open_reader(path, tile_shape=tile_shape, halo=1) as reader:
+        return [HolidayFinder.tile_components(reader.read_window(row, col, *tile_shape), shape=reader.shape,
+                                              nodata=reader.nodata)
+                for row, col in positions]
+
+
+class HolidayFinder:
+    """Detect the holidays of a grid, tile by tile, in a pool of processes
+
+    Each tile is labelled independently with vectorized NumPy operations (label propagation with pointer
+    jumping). The tiles are read with a halo of one node, so that each tile reports the links between its empty
+    core nodes and the empty nodes of the following tiles: the pieces of the holidays that cross the tile
+    boundaries are then merged with a union-find on the (few) boundary labels. The empty groups touching the grid
+    borders are not holidays, and neither are the ones smaller than 'min_size' nodes.
+
+    'reference' is the serial implementation (a flood fill of the whole grid) that the engine is validated against.
+    """
+
+    def __init__(self, min_size: int = 1, tile_shape: Tuple[int, int] = (512, 512),
+                 max_workers: Optional[int] = None):
+        if min_size < 1:
+            raise RuntimeError("invalid minimum size: %s" % min_size)
+        if (tile_shape[0] <= 0) or (tile_shape[1] <= 0):
+            raise RuntimeError("invalid tile shape: %s" % (tile_shape, ))
+        self._min_size = min_size
+        self._tile_shape = tuple(tile_shape)
+        self._max_workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+
+    @property
+    def min_size(self) -> int:
+        return self._min_size
+
+    @property
+    def tile_shape(self) -> Tuple[int, int]:
+        return self._tile_shape
+
+    @property
+    def max_workers(self) -> int:
+        return self._max_workers
+
+    @classmethod
+    def label(cls, empty: np.ndarray) -> np.ndarray:
+        """Label the 4-connected groups of empty nodes with the flat index of their first node (-1 if populated)
+
+        The horizontal runs of empty nodes are linked to the overlapping runs of the next row, and the run graph
+        is resolved by hooking the roots on the smaller one and pointer jumping, in a few vectorized rounds.
+        """
+        labels = np.full(empty.shape, -1, dtype=np.int64)
+        starts = empty.copy()
+        starts[:, 1:] &= ~empty[:, :-1]
+        firsts = np.flatnonzero(starts)
+        if firsts.size == 0:
+            return labels
+        runs = (np.cumsum(starts.ravel()) - 1).reshape(empty.shape)
+        # one link per overlap of two runs: where it starts, or where one of the runs starts
+        vertical = empty[1:, :] & empty[:-1, :]
+        overlaps = vertical & (starts[1:, :] | starts[:-1, :])
+        overlaps[:, 1:] |= vertical[:, 1:] & ~vertical[:, :-1]
+        edges = np.stack([runs[:-1, :][overlaps], runs[1:, :][overlaps]])
+
+        parents = np.arange(firsts.size, dtype=np.int64)
+        while True:
+            first, second = parents[edges[0]], parents[edges[1]]
+            linked = first != second
+            if not linked.any():
+                break
+            np.minimum.at(parents, np.maximum(first[linked], second[linked]), np.minimum(first[linked], second[linked]))
+            while True:
+                jumped = parents[parents]
+                if np.array_equal(jumped, parents):
+                    break
+                parents = jumped
+        labels[empty] = firsts[parents[runs[empty]]]
+        return labels
+
+    @classmethod
+    def tile_components(cls, tile: GridTile, shape: Tuple[int, int], nodata: float) -> dict:
+        """Label the empty core nodes of a tile read with a halo of (at least) one node
+
+        The labels are the grid flat indices of the first node of each piece. Besides the piece sizes and whether
+        they touch the grid borders, the labels of the empty nodes on the core edges and the links between them
+        and the empty halo nodes are returned (the halo nodes are identified by their grid flat index).
+        """
+        window = tile['elevation']
+        empty = (window == nodata) | np.isnan(window)
+        rows, cols = tile.core_slices
+        core = empty[rows, cols]
+        local = cls.label(core)
+        grid_rows = np.arange(tile.row, tile.row + tile.shape[0])[:, np.newaxis]
+        grid_cols = np.arange(tile.col, tile.col + tile.shape[1])[np.newaxis, :]
+        flat = local.ravel()
+        valid = flat >= 0
+        labels = np.full(local.shape, -1, dtype=np.int64)
+        labels.ravel()[valid] = (tile.row + flat[valid] // core.shape[1]) * shape[1] \
+            + tile.col + flat[valid] % core.shape[1]
+        border = (grid_rows == 0) | (grid_rows == shape[0] - 1) | (grid_cols == 0) | (grid_cols == shape[1] - 1)
+
+        pieces, sizes = np.unique(labels[core], return_counts=True)
+        touching = np.unique(labels[core & border])
+
+        edge = np.zeros(core.shape, dtype=bool)
+        edge[[0, -1], :] = True
+        edge[:, [0, -1]] = True
+        edge &= core
+        edges = np.stack([(grid_rows * shape[1] + grid_cols)[edge], labels[edge]])
+
+        # links to the following tiles (south and east), through the halo
+        links = list()
+        if rows.stop < empty.shape[0]:
+            below = core[-1, :] & empty[rows.stop, cols]
+            links.append(np.stack([labels[-1, :][below], (tile.row + tile.shape[0]) * shape[1] + grid_cols[0][below]]))
+        if cols.stop < empty.shape[1]:
+            right = core[:, -1] & empty[rows, cols.stop]
+            links.append(np.stack([labels[:, -1][right], grid_rows[:, 0][right] * shape[1] + tile.col + tile.shape[1]]))
+        links = np.concatenate(links, axis=1) if links else np.zeros((2, 0), dtype=np.int64)
+        return {'pieces': pieces, 'sizes': sizes, 'touching': touching, 'edges': edges, 'links': links}
+
+    def merge(self, components: list, shape: Tuple[int, int]) -> list:
+        """Merge the pieces of the tiles into holidays"""
+        parents = dict()
+
+        def _root(label: int) -> int:
+            root = label
+            while parents.get(root, root) != root:
+                root = parents[root]
+            while label != root:
+                parents[label], label = root, parents.get(label, label)
+            return root
+
+        edge_labels = dict()
+        for component in components:
+            edge_labels.update(zip(component['edges'][0].tolist(), component['edges'][1].tolist()))
+        for component in components:
+            for label, node in zip(*component['links'].tolist()):
+                first, second = _root(label), _root(edge_labels[node])
+                if first != second:
+                    parents[max(first, second)] = min(first, second)
+
+        sizes = dict()
+        touching = set()
+        for component in components:
+            for label, size in zip(component['pieces'].tolist(), component['sizes'].tolist()):
+                root = _root(label)
+                sizes[root] = sizes.get(root, 0) + size
+            touching.update(_root(label) for label in component['touching'].tolist())
+        return sorted(Holiday(row=root // shape[1], col=root % shape[1], size=size) for root, size in sizes.items()
+                      if (root not in touching) and (size >= self._min_size))
+
+    def find(self, path: str) -> list:
+        """Return the holidays of the passed BAG or CSAR grid, sorted by position"""
+        with _open_reader(path, tile_shape=self._tile_shape, halo=1) as reader:
+            shape = reader.shape
+        positions = [(row, col) for row in range(0, shape[0], self._tile_shape[0])
+                     for col in range(0, shape[1], self._tile_shape[1])]
+        nr_of_jobs = min(self._max_workers, len(positions))
+        if nr_of_jobs <= 1:
+            components = _find_in_tiles(path, self._tile_shape, positions)
+        else:
+            batches = [positions[job::nr_of_jobs] for job in range(nr_of_jobs)]
+            with ProcessPoolExecutor(max_workers=nr_of_jobs) as pool:
+                results = pool.map(_find_in_tiles, [path] * nr_of_jobs, [self._tile_shape] * nr_of_jobs, batches)
+                components = [component for result in results for component in result]
+        holidays = self.merge(components, shape=shape)
+        logger.debug("%d holidays in %s (%d tiles)" % (len(holidays), os.path.basename(path), len(positions)))
+        return holidays
+
+    def find_grid(self, grid: Mapping, nodata: float = BagTileReader.nodata) -> list:
+        """Return the holidays of a loaded grid (with an 'elevation' layer), tile by tile in the calling process"""
+        elevation = grid['elevation']
+        shape = elevation.shape
+        components = list()
+        for row in range(0, shape[0], self._tile_shape[0]):
+            for col in range(0, shape[1], self._tile_shape[1]):
+                end = (min(row + self._tile_shape[0], shape[0]), min(col + self._tile_shape[1], shape[1]))
+                origin = (max(row - 1, 0), max(col - 1, 0))
+                window = elevation[origin[0]:end[0] + 1, origin[1]:end[1] + 1]  # a view, with a halo of one node
+                tile = GridTile(row=row, col=col, shape=(end[0] - row, end[1] - col), origin=origin,
+                                layers={'elevation': window})
+                components.append(self.tile_components(tile, shape=shape, nodata=nodata))
+        return self.merge(components, shape=shape)
+
+    def reference(self, empty: np.ndarray) -> list:
+        """Serial reference: flood fill the empty groups of the whole grid"""
+        visited = np.zeros(empty.shape, dtype=bool)
+        holidays = list()
+        nr_rows, nr_cols = empty.shape
+        for row, col in zip(*np.nonzero(empty)):
+            if visited[row, col]:
+                continue
+            visited[row, col] = True
+            queue = deque([(row, col)])
+            size = 0
+            touching = False
+            while queue:
+                r, c = queue.popleft()
+                size += 1
+                if (r == 0) or (c == 0) or (r == nr_rows - 1) or (c == nr_cols - 1):
+                    touching = True
+                for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                    if (0 <= nr < nr_rows) and (0 <= nc < nr_cols) and empty[nr, nc] and not visited[nr, nc]:
+                        visited[nr, nc] = True
+                        queue.append((nr, nc))
+            if not touching and (size >= self._min_size):
+                holidays.append(Holiday(row=int(row), col=int(col), size=size))
+        return sorted(holidays)
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <min size: %d>\n" % self._min_size
+        msg += "  <tile shape: %s>\n" % (self._tile_shape, )
+        msg += "  <max workers: %d>\n" % self._max_workers
+        return msg
+
+
+def find_holidays(check: dict, grids: dict) -> dict:
+    """Runner of the 'Holiday Finder' checks: count the holidays of the input grids (BAG or CSAR, keyed by path)
+
+    The grids already loaded (see 'grid_loaders', possibly in shared memory) are not read again.
+    """
+    finder = HolidayFinder(max_workers=1)  # already in a worker process
+    holidays = list()
+    for path, grid in grids.items():
+        if isinstance(grid, Mapping):
+            holidays.extend(finder.find_grid(grid))
+        else:
+            holidays.extend(finder.find(path))
+    return {'count': len(holidays)}
@@ -36,6 +36,10 @@ class QAXInputs:
             return
         self._qa_json = QAJson(path=value)
 
+    def load_json(self, path: Path, cache_folder: Optional[Path] = None) -> None:
+        """Load the QA JSON, optionally going through the sidecar cache in the passed folder"""
+        self._qa_json = QAJson(path=path, cache_folder=cache_folder)
+
     @property
     def raw_paths(self) -> list:
         return self._raw_paths
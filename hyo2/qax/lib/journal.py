@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional
+
+from hyo2.qax.lib.json_backend import json_backend
+from hyo2.qax.lib.qa_json import QAJson
+
+logger = logging.getLogger(__name__)
+
+
+def _cache_path(json_path: Path, folder: Path, ext: str) -> Path:
+    """Return the path in the passed folder for the QA JSON file, keyed by a hash of its absolute path"""
+    json_path = Path(json_path)
+    digest = hashlib.blake2b(str(json_path.resolve()).encode("utf-8"), digest_size=8).hexdigest()
+    return Path(folder).joinpath("%s.%s%s" % (json_path.name, digest, ext))
+
+
+class QAJournal:
+    """Append-only journal of check-level changes to a QA JSON file
+
+    Each line is a JSON record with the QA group, the position and the id of a check, its new outputs and
+    the fingerprints of its inputs.
+    Appending a record is cheap compared to rewriting the whole document, and the journal can later be
+    compacted into the QA JSON file. A truncated last line (e.g., from an interrupted write) is ignored.
+    The journal is kept in a cache folder (not next to the QA JSON file, that may be read-only or shared).
+
+    The first line is a header with the size, the modification time and the hash of the QA JSON file that
+    the records apply to: if the file has changed since (e.g., replaced or edited), the journal is discarded.
+    """
+
+    ext = ".journal"
+
+    def __init__(self, path: Path, json_path: Path):
+        self._path = Path(path)
+        self._json_path = Path(json_path)
+
+    @classmethod
+    def for_json(cls, json_path: Path, folder: Path) -> 'QAJournal':
+        return cls(path=_cache_path(json_path=json_path, folder=folder, ext=cls.ext), json_path=json_path)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def json_path(self) -> Path:
+        return self._json_path
+
+    @classmethod
+    def base_state(cls, json_path: Path) -> Optional[dict]:
+        """Return the size, the modification time and the hash of the passed QA JSON file (None if unreadable)"""
+        try:
+            stat = os.stat(str(json_path))
+            digest = hashlib.blake2b(digest_size=16)
+            with open(str(json_path), "rb") as fid:
+                for block in iter(lambda: fid.read(1 << 20), b""):
+                    digest.update(block)
+        except OSError as e:
+            logger.debug("unable to read %s: %s" % (json_path, e))
+            return None
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'blake2b': digest.hexdigest()}
+
+    def header(self) -> Optional[dict]:
+        """Return the state of the QA JSON file when the journal was started (None if missing)"""
+        if not self._path.exists():
+            return None
+        with open(str(self._path), "rb") as fid:
+            line = fid.readline()
+        if not line.endswith(b"\n"):
+            return None
+        return json_backend.loads(line).get('base')
+
+    def is_valid(self) -> bool:
+        """Whether the journal applies to the current QA JSON file"""
+        header = self.header()
+        return (header is not None) and (header == self.base_state(self._json_path))
+
+    def append(self, record: dict, fsync: bool = True) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(self._path), "ab") as fid:
+            if fid.tell() == 0:
+                fid.write(json_backend.dumps({"base": self.base_state(self._json_path)}) + b"\n")
+            fid.write(json_backend.dumps(record) + b"\n")
+            if fsync:
+                fid.flush()
+                os.fsync(fid.fileno())
+
+    def append_check(self, qa_group: str, idx: int, check: dict, fsync: bool = True) -> None:
+        self.append(record={"qa_group": qa_group, "idx": idx, "id": check['info']['id'],
+                            "outputs": check['outputs'],
+                            "fingerprints": [item.get('fingerprint') for item in check['inputs']['files']]},
+                    fsync=fsync)
+
+    def records(self) -> Iterator[dict]:
+        if not self._path.exists():
+            return
+        with open(str(self._path), "rb") as fid:
+            for nr, line in enumerate(fid):
+                if not line.endswith(b"\n"):
+                    logger.warning("skipping truncated record #%d in %s" % (nr, self._path))
+                    return
+                record = json_backend.loads(line)
+                if (nr == 0) and ('base' in record):
+                    continue
+                yield record
+
+    def replay(self, js: dict, keys: Optional[list] = None) -> int:
+        """Apply the journaled outputs to the passed document, returning the number of applied records
+
+        The (qa group, position) of each affected check is appended to the passed keys list, if any.
+        A journal that does not apply to the current QA JSON file is discarded.
+        """
+        if not self._path.exists():
+            return 0
+        if not self.is_valid():
+            logger.warning("discarding the journal of %s: the file has changed since" % self._json_path)
+            self.clear()
+            return 0
+        nr_of_applied = 0
+        for record in self.records():
+            checks = js['qa'][record['qa_group']]['checks']
+            idx = record['idx']
+            if (idx >= len(checks)) or (checks[idx]['info']['id'] != record['id']):
+                logger.warning("skipping journal record for missing check %s (#%d)" % (record['id'], idx))
+                continue
+            checks[idx]['outputs'] = record['outputs']
+            for item, fingerprint in zip(checks[idx]['inputs']['files'], record.get('fingerprints', list())):
+                if fingerprint is None:
+                    item.pop('fingerprint', None)
+                else:
+                    item['fingerprint'] = fingerprint
+            if keys is not None:
+                keys.append((record['qa_group'], idx))
+            nr_of_applied += 1
+        return nr_of_applied
+
+    def compact(self, compact_output: bool = False) -> int:
+        """Merge the journal into its QA JSON file (atomically replaced), then clear the journal"""
+        if not self._path.exists():
+            return 0
+        qa_json = QAJson(path=self.json_path, check_valid=False)
+        nr_of_applied = self.replay(js=qa_json.js)
+        if not self._path.exists():  # discarded
+            return 0
+        if not qa_json.validate_changes():
+            raise RuntimeError("invalid json after journal replay: %s" % self.json_path)
+        QAJson.dump(js=qa_json.js, path=self.json_path, compact=compact_output)
+        self.clear()
+        logger.debug("compacted %d journal records into %s" % (nr_of_applied, self.json_path))
+        return nr_of_applied
+
+    def clear(self) -> None:
+        if self._path.exists():
+            os.remove(str(self._path))
+
+    def __len__(self):
+        return sum(1 for _ in self.records())
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <path: %s>\n" % self._path
+        msg += "  <json path: %s>\n" % self._json_path
+        return msg
+
+
+class QACheckpoint:
+    """Marker of an execution in progress on a QA JSON file, left behind if the execution is interrupted
+
+    Since each completed check is journaled with its outputs and input fingerprints, an execution restarted
+    on the same file can resume from the checks that were not completed. As the journal, the marker is kept
+    in a cache folder.
+    """
+
+    ext = ".checkpoint"
+
+    def __init__(self, path: Path):
+        self._path = Path(path)
+
+    @classmethod
+    def for_json(cls, json_path: Path, folder: Path) -> 'QACheckpoint':
+        return cls(path=_cache_path(json_path=json_path, folder=folder, ext=cls.ext))
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def qa_group(self) -> Optional[str]:
+        """The QA group of the interrupted execution, if any"""
+        if not self._path.exists():
+            return None
+        try:
+            return json_backend.loads(self._path.read_bytes())['qa_group']
+        except (ValueError, KeyError) as e:  # e.g., truncated by the interruption
+            logger.warning("unreadable checkpoint %s: %s" % (self._path, e))
+            return None
+
+    def interrupted(self, qa_group: str) -> bool:
+        return self.qa_group == qa_group
+
+    def start(self, qa_group: str) -> None:
+        start = datetime.now(timezone.utc).replace(microsecond=0).isoformat()
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(self._path), "wb") as fid:
+            fid.write(json_backend.dumps({"qa_group": qa_group, "start": start}))
+            fid.flush()
+            os.fsync(fid.fileno())
+
+    def finish(self) -> None:
+        if self._path.exists():
+            os.remove(str(self._path))
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <path: %s>\n" % self._path
+        msg += "  <interrupted: %s>\n" % self.qa_group
+        return msg
@@ -0,0 +1,73 @@
+import json
+import logging
+from typing import Optional, Union
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+class JsonBackend:
+    """Decode/encode JSON with the fastest available library, falling back to the standard library"""
+
+    backends = ["orjson", "ujson", "json"]
+
+    def __init__(self, name: Optional[str] = None):
+        self._name = None
+        self.name = name
+
+    @classmethod
+    def available_backends(cls) -> list:
+        available = list()
+        if orjson is not None:
+            available.append("orjson")
+        if ujson is not None:
+            available.append("ujson")
+        available.append("json")
+        return available
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @name.setter
+    def name(self, value: Optional[str]) -> None:
+        if value is None:
+            value = self.available_backends()[0]
+        if value not in self.available_backends():
+            raise RuntimeError("unavailable JSON backend: %s (available: %s)" % (value, self.available_backends()))
+        self._name = value
+        logger.debug("JSON backend: %s" % self._name)
+
+    def loads(self, data: Union[bytes, str]) -> object:
+        if self._name == "orjson":
+            return orjson.loads(data)
+        if self._name == "ujson":
+            return ujson.loads(data)
+        return json.loads(data)
+
+    def dumps(self, obj: object, indent: Optional[int] = None) -> bytes:
+        # orjson only supports 2-space indentation, so other indentations go through the standard library
+        if self._name == "orjson" and indent in (None, 2):
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+        if self._name == "ujson":
+            return ujson.dumps(obj, indent=indent or 0, ensure_ascii=False,
+                               escape_forward_slashes=False).encode("utf-8")
+        separators = (',', ':') if indent is None else None
+        return json.dumps(obj, indent=indent, separators=separators, ensure_ascii=False).encode("utf-8")
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <name: %s>\n" % self._name
+        msg += "  <available: %s>\n" % (self.available_backends(), )
+        return msg
+
+
+json_backend = JsonBackend()
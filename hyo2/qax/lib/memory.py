@@ -0,0 +1,190 @@
+import logging
+import os
+import sqlite3
+import struct
+import sys
+from pathlib import Path
+from statistics import median
+from typing import Iterator, Optional
+
+from hyo2.qax.lib.json_backend import json_backend
+
+logger = logging.getLogger(__name__)
+
+
+def reset_peak_rss() -> bool:
+    """Reset the peak resident set size of the current process to the current one (only on Linux)
+
+    Return whether it was reset, i.e., whether 'peak_rss' now measures the peak from this point on.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as fid:
+            fid.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss() -> Optional[int]:
+    """Return the peak resident set size of the current process (in bytes), if available
+
+    On Linux, this is the high-water mark of the process (VmHWM), that can be reset by 'reset_peak_rss'.
+    """
+    try:
+        with open("/proc/self/status", "rb") as fid:
+            for line in fid:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024  # bytes on macOS, KB elsewhere
+    except ImportError:  # e.g., on Windows
+        pass
+    try:
+        import psutil
+        memory_info = psutil.Process().memory_info()
+        return getattr(memory_info, "peak_wset", memory_info.rss)
+    except ImportError:
+        return None
+
+
+class GridMemoryEstimator:
+    """Estimate the peak memory required to check a grid, from the dimensions in its header
+
+    Only the header is read: the dataset shapes for BAG files (through h5py, if available) and the base
+    dimensions for CSAR files. The decoded size is scaled by 'working_factor' to account for the working
+    arrays of the checks. For other or unreadable grids, the file size scaled by 'fallback_factor' is used.
+    """
+
+    bag_layers = ("elevation", "uncertainty", "varres_refinements")
+    csar_layers = ("Depth", "Uncertainty", "Density")
+
+    def __init__(self, working_factor: float = 2.0, fallback_factor: float = 4.0):
+        self._working_factor = working_factor
+        self._fallback_factor = fallback_factor
+
+    @property
+    def working_factor(self) -> float:
+        return self._working_factor
+
+    @property
+    def fallback_factor(self) -> float:
+        return self._fallback_factor
+
+    def estimate(self, path: str) -> int:
+        decoded = self.decoded_bytes(path)
+        if decoded is not None:
+            return int(decoded * self._working_factor)
+        try:
+            return int(os.path.getsize(path) * self._fallback_factor)
+        except OSError:
+            return 0
+
+    @classmethod
+    def decoded_bytes(cls, path: str) -> Optional[int]:
+        """Return the size of the decoded grid layers, or None if it cannot be read from the header"""
+        ext = os.path.splitext(path)[1].lower()
+        try:
+            if ext == ".bag":
+                return cls._bag_bytes(path)
+            if ext == ".csar":
+                return cls._csar_bytes(path)
+        except (OSError, KeyError, ValueError, sqlite3.Error, struct.error) as e:
+            logger.debug("unable to read the header of %s: %s" % (path, e))
+        return None
+
+    @classmethod
+    def _bag_bytes(cls, path: str) -> Optional[int]:
+        try:
+            import h5py
+        except ImportError:
+            return None
+        nr_of_bytes = 0
+        with h5py.File(path, "r") as fid:
+            root = fid['BAG_root']
+            for name in cls.bag_layers:
+                if name in root:
+                    dataset = root[name]
+                    nr_of_bytes += dataset.size * dataset.dtype.itemsize
+        return nr_of_bytes
+
+    @classmethod
+    def _csar_bytes(cls, path: str) -> Optional[int]:
+        if not os.path.exists(path):
+            return None
+        conn = sqlite3.connect("file:%s?mode=ro" % Path(path).resolve().as_posix(), uri=True)
+        try:
+            dims = dict(conn.execute("SELECT name, value FROM master WHERE parent = '/rg/master/gg/baseDim/'"))
+            bands = {row[0] for row in conn.execute("SELECT name FROM master WHERE parent = '/rg/master/bands/'")}
+        finally:
+            conn.close()
+        if ('x' not in dims) or ('y' not in dims):  # e.g., variable resolution
+            return None
+        nr_of_layers = max(len(bands.intersection(cls.csar_layers)), 1)
+        return struct.unpack("<q", dims['x'])[0] * struct.unpack("<q", dims['y'])[0] * 4 * nr_of_layers
+
+
+class MemoryCalibration:
+    """Append-only record of the estimated versus the actual peak memory of the executed checks
+
+    Each line is a JSON record with the check name, the estimated bytes and the peak RSS of the check.
+    The ratios can be used to tune the estimator factors and the memory budget. Only the peaks measured for
+    a single check are recorded: the records of older versions (measuring the whole worker) are ignored.
+    """
+
+    filename = "memory_calibration.jsonl"
+    version = 2
+
+    def __init__(self, path: Path):
+        self._path = Path(path)
+
+    @classmethod
+    def for_folder(cls, folder: Path) -> 'MemoryCalibration':
+        return cls(path=Path(folder).joinpath(cls.filename))
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    def record(self, name: Optional[str], estimated: int, peak: Optional[int]) -> None:
+        """Record a sample, unless the peak of the check was not measured"""
+        if peak is None:
+            return
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        with open(str(self._path), "ab") as fid:
+            fid.write(json_backend.dumps({"version": self.version, "name": name, "estimated": estimated,
+                                          "peak_rss": peak}) + b"\n")
+
+    def records(self) -> Iterator[dict]:
+        if not self._path.exists():
+            return
+        with open(str(self._path), "rb") as fid:
+            for line in fid:
+                if not line.endswith(b"\n"):
+                    continue
+                record = json_backend.loads(line)
+                if record.get('version') == self.version:
+                    yield record
+
+    def ratios(self, name: Optional[str] = None) -> list:
+        """Return the actual/estimated ratios, optionally only for the checks with the passed name"""
+        return [record['peak_rss'] / record['estimated'] for record in self.records()
+                if (record['estimated'] > 0) and ((name is None) or (record['name'] == name))]
+
+    def summary(self) -> dict:
+        """Return the number of records and the median actual/estimated ratio for each check name"""
+        ratios = dict()
+        for record in self.records():
+            if record['estimated'] > 0:
+                ratios.setdefault(record['name'], list()).append(record['peak_rss'] / record['estimated'])
+        return {name: (len(values), median(values)) for name, values in ratios.items()}
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <path: %s>\n" % self._path
+        for name, (nr_of_records, ratio) in sorted(self.summary().items(), key=lambda item: str(item[0])):
+            msg += "  <%s: %d records, median ratio: %.2f>\n" % (name, nr_of_records, ratio)
+        return msg
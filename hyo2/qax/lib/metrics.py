@@ -0,0 +1,71 @@
+import logging
+import time
+from collections.abc import Mapping
+from typing import Optional
+
+from hyo2.qax.lib.memory import peak_rss, reset_peak_rss
+
+logger = logging.getLogger(__name__)
+
+
+class CheckMetrics:
+    """Cost of a check execution, measured in the process running it (stored in 'outputs.execution.metrics')
+
+    The wall and CPU times are in seconds, the peak RSS and the bytes read are in bytes, and the cells are
+    the ones processed by the check (as reported by the runner, or the cells of its input grids).
+    The peak RSS is the one of the check alone: it is only measured for the checks running in a worker process
+    ('isolated'), from a reset of the process high-water mark (on Linux) or for the first check of the process.
+    Otherwise, it is None. The other metrics that cannot be measured on the current platform are omitted.
+    """
+
+    fields = ("wall_time", "cpu_time", "peak_rss", "bytes_read", "cells")
+
+    _nr_of_checks = 0  # checks measured in the current process
+
+    def __init__(self, isolated: bool = True):
+        self._peak_rss = isolated and (reset_peak_rss() or (CheckMetrics._nr_of_checks == 0))
+        CheckMetrics._nr_of_checks += 1
+        self._wall_time = time.perf_counter()
+        self._cpu_time = time.process_time()
+        self._bytes_read = self.bytes_read()
+
+    @classmethod
+    def bytes_read(cls) -> Optional[int]:
+        """Return the bytes read by the current process so far (including the ones from the page cache)"""
+        try:
+            with open("/proc/self/io", "rb") as fid:
+                for line in fid:
+                    if line.startswith(b"rchar:"):
+                        return int(line.split()[1])
+        except (OSError, ValueError, IndexError):
+            pass
+        try:
+            import psutil
+            counters = psutil.Process().io_counters()
+            return getattr(counters, "read_chars", counters.read_bytes)
+        except (ImportError, AttributeError):
+            return None
+
+    @classmethod
+    def grid_cells(cls, grids: Mapping) -> Optional[int]:
+        """Return the number of cells of the loaded grids (the largest layer of each), None if not known"""
+        cells = None
+        for grid in grids.values():
+            if isinstance(grid, Mapping):
+                sizes = [layer.size for layer in grid.values() if hasattr(layer, "size")]
+                if sizes:
+                    cells = (cells or 0) + max(sizes)
+        return cells
+
+    def stop(self, cells: Optional[int] = None) -> dict:
+        metrics = {
+            "wall_time": round(time.perf_counter() - self._wall_time, 6),
+            "cpu_time": round(time.process_time() - self._cpu_time, 6),
+        }
+        metrics["peak_rss"] = peak_rss() if self._peak_rss else None
+        bytes_read = self.bytes_read()
+        if (bytes_read is not None) and (self._bytes_read is not None):
+            metrics["bytes_read"] = bytes_read - self._bytes_read
+        if cells is not None:
+            metrics["cells"] = cells
+        return metrics
@@ -0,0 +1,223 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from hyo2.qax.lib.json_backend import json_backend
+from hyo2.qax.lib.qa_json import QAJson
+from hyo2.qax.lib.schema_catalog import SchemaCatalog
+
+logger = logging.getLogger(__name__)
+
+
+def _has_results(outputs: dict) -> bool:
+    return any(key in outputs for key in ("count", "grade", "percentage")) or (len(outputs.get("files", [])) > 0)
+
+
+def _from_0_1_1_to_0_1_2(js: dict) -> None:
+    # v0.1.2 requires an execution block in the outputs
+    for check in QAJsonMigration.iter_checks(js):
+        outputs = check.get('outputs')
+        if outputs is None:
+            continue
+        if 'execution' not in outputs:
+            outputs['execution'] = {'status': "completed" if _has_results(outputs) else "draft"}
+
+
+def _from_0_1_2_to_0_1_3(js: dict) -> None:
+    # v0.1.3 requires the outputs, and renamed 'grade' as 'percentage'
+    for check in QAJsonMigration.iter_checks(js):
+        outputs = check.setdefault('outputs', {'execution': {'status': "draft"}})
+        if 'grade' in outputs:
+            outputs['percentage'] = outputs.pop('grade')
+
+
+def _from_0_1_3_to_0_1_4(js: dict) -> None:
+    # v0.1.4 adds the optional fingerprints of the input files, execution metrics and check timeout: nothing to change
+    pass
+
+
+class QAJsonMigration:
+    """Upgrade QA JSON documents to a newer schema version by chaining per-version transforms"""
+
+    # source version -> (target version, in-place transform)
+    transforms = {
+        "0.1.1": ("0.1.2", _from_0_1_1_to_0_1_2),
+        "0.1.2": ("0.1.3", _from_0_1_2_to_0_1_3),
+        "0.1.3": ("0.1.4", _from_0_1_3_to_0_1_4),
+    }
+
+    @classmethod
+    def iter_checks(cls, js: dict):
+        for data_level in js['qa'].values():
+            if isinstance(data_level, dict):
+                yield from data_level.get('checks', list())
+
+    @classmethod
+    def detect_version(cls, js: dict) -> str:
+        try:
+            return js['qa']['version']
+        except (KeyError, TypeError):
+            raise RuntimeError("unable to detect the QA version")
+
+    @classmethod
+    def latest_version(cls) -> str:
+        return QAJson.catalog().latest_version
+
+    @classmethod
+    def chain(cls, source_version: str, target_version: str) -> list:
+        """Return the list of (source, target) steps to go from the source to the target version"""
+        steps = list()
+        version = source_version
+        while version != target_version:
+            if version not in cls.transforms:
+                raise RuntimeError("no migration path from %s to %s" % (source_version, target_version))
+            next_version = cls.transforms[version][0]
+            steps.append((version, next_version))
+            version = next_version
+        return steps
+
+    @classmethod
+    def migrate(cls, js: dict, target_version: Optional[str] = None) -> bool:
+        """Migrate in place the passed document, returning whether it was modified"""
+        if target_version is None:
+            target_version = cls.latest_version()
+        source_version = cls.detect_version(js)
+        if SchemaCatalog.version_tuple(source_version) > SchemaCatalog.version_tuple(target_version):
+            raise RuntimeError("unable to downgrade from %s to %s" % (source_version, target_version))
+
+        steps = cls.chain(source_version=source_version, target_version=target_version)
+        for step_source, step_target in steps:
+            cls.transforms[step_source][1](js)
+            js['qa']['version'] = step_target
+            logger.debug("migrated from %s to %s" % (step_source, step_target))
+        return len(steps) > 0
+
+    @classmethod
+    def migrate_file(cls, path: Path, output_path: Optional[Path] = None, target_version: Optional[str] = None,
+                     check_valid: bool = True) -> bool:
+        """Migrate a QA JSON file, writing the result only if an output path is passed"""
+        js = json_backend.loads(Path(path).read_bytes())
+        migrated = cls.migrate(js=js, target_version=target_version)
+        if check_valid:
+            schema_path = QAJson.catalog().schema_path(cls.detect_version(js))
+            if not QAJson.validate_qa_obj(qa=js, schema_path=schema_path):
+                raise RuntimeError("invalid migrated json: %s" % path)
+        if (output_path is not None) and (migrated or (Path(output_path) != Path(path))):
+            QAJson.dump(js=js, path=output_path)
+        return migrated
+
+
+def _migrate_job(job: tuple) -> tuple:
+    path, output_path, target_version = job
+    try:
+        migrated = QAJsonMigration.migrate_file(path=path, output_path=output_path, target_version=target_version)
+        return path, "migrated" if migrated else "unchanged", None
+    except Exception as e:
+        return path, "failed", "%s" % e
+
+
+class MigrationReport:
+
+    def __init__(self):
+        self.migrated = list()
+        self.unchanged = list()
+        self.failed = list()  # (path, error message)
+        self.nr_of_bytes = 0
+        self.elapsed = 0.0
+
+    @property
+    def nr_of_files(self) -> int:
+        return len(self.migrated) + len(self.unchanged) + len(self.failed)
+
+    @property
+    def files_per_sec(self) -> float:
+        if self.elapsed == 0.0:
+            return 0.0
+        return self.nr_of_files / self.elapsed
+
+    @property
+    def mb_per_sec(self) -> float:
+        if self.elapsed == 0.0:
+            return 0.0
+        return self.nr_of_bytes / (1024 * 1024) / self.elapsed
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <files: %d>\n" % self.nr_of_files
+        msg += "  <migrated: %d>\n" % len(self.migrated)
+        msg += "  <unchanged: %d>\n" % len(self.unchanged)
+        msg += "  <failed: %d>\n" % len(self.failed)
+        msg += "  <elapsed: %.2f sec>\n" % self.elapsed
+        msg += "  <throughput: %.1f files/sec, %.2f MB/sec>\n" % (self.files_per_sec, self.mb_per_sec)
+        return msg
+
+
+class QAJsonMigrator:
+    """Migrate whole directory trees of QA JSON files in parallel worker processes
+
+    The source files are left untouched, unless in-place rewriting is requested. Without an output folder
+    and in-place rewriting, the migration is only validated (dry run).
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, chunk_size: int = 16):
+        self._max_workers = max_workers
+        self._chunk_size = chunk_size
+
+    @property
+    def max_workers(self) -> Optional[int]:
+        return self._max_workers
+
+    @max_workers.setter
+    def max_workers(self, value: Optional[int]) -> None:
+        self._max_workers = value
+
+    def migrate_folder(self, input_folder: Path, output_folder: Optional[Path] = None, in_place: bool = False,
+                       target_version: Optional[str] = None, pattern: str = "*.json") -> MigrationReport:
+        input_folder = Path(input_folder)
+        if in_place and (output_folder is not None):
+            raise RuntimeError("an output folder cannot be used with in-place rewriting")
+        if target_version is None:
+            target_version = QAJsonMigration.latest_version()
+
+        jobs = list()
+        report = MigrationReport()
+        for path in sorted(input_folder.rglob(pattern)):
+            if path.match('*.schema.json'):
+                continue
+            if in_place:
+                output_path = path
+            elif output_folder is not None:
+                output_path = Path(output_folder).joinpath(path.relative_to(input_folder))
+            else:
+                output_path = None
+            jobs.append((path, output_path, target_version))
+            report.nr_of_bytes += path.stat().st_size
+        logger.info("migrating %d files to v.%s ..." % (len(jobs), target_version))
+
+        start = time.perf_counter()
+        if self._max_workers == 0:  # serial, in the current process
+            results = map(_migrate_job, jobs)
+            self._collect(results=results, report=report)
+        else:
+            with ProcessPoolExecutor(max_workers=self._max_workers) as executor:
+                results = executor.map(_migrate_job, jobs, chunksize=self._chunk_size)
+                self._collect(results=results, report=report)
+        report.elapsed = time.perf_counter() - start
+
+        logger.info("migration: %d migrated, %d unchanged, %d failed in %.2f sec (%.1f files/sec)"
+                    % (len(report.migrated), len(report.unchanged), len(report.failed), report.elapsed,
+                       report.files_per_sec))
+        return report
+
+    @classmethod
+    def _collect(cls, results, report: MigrationReport) -> None:
+        for path, status, error in results:
+            if status == "migrated":
+                report.migrated.append(path)
+            elif status == "unchanged":
+                report.unchanged.append(path)
+            else:
+                logger.warning("unable to migrate %s: %s" % (path, error))
+                report.failed.append((path, error))
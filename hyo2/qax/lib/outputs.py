@@ -21,6 +21,15 @@ class QAXOutputs:
     def output_folder(self, value: Path) -> None:
         self._output_folder = value
 
+    @property
+    def cache_folder(self) -> Path:
+        return Path(self.output_folder).joinpath("qax_cache")
+
+    @property
+    def staging_folder(self) -> Path:
+        """Where the running checks write their output files, before being moved to the output folder"""
+        return Path(self.output_folder).joinpath("qax_staging")
+
     def open_output_folder(self) -> None:
         if self.output_folder:
             Helper.explore_folder(str(self.output_folder))
@@ -25,6 +25,13 @@ class QAXParams:
         self._project_folder = False
         self._subfolders = False
 
+        self._json_cache = False
+        self._max_workers = None
+        self._shared_memory = False
+        self._result_cache = False
+        self._timeout = None
+        self._memory_budget = None
+
     @property
     def profile(self) -> str:
         return self._profile
@@ -121,6 +128,59 @@ class QAXParams:
     def subfolders(self, value: bool) -> None:
         self._subfolders = value
 
+    @property
+    def json_cache(self) -> bool:
+        return self._json_cache
+
+    @json_cache.setter
+    def json_cache(self, value: bool) -> None:
+        self._json_cache = value
+
+    @property
+    def max_workers(self) -> Optional[int]:
+        """Number of worker processes used to execute the checks (None: all the cores, 0: serial)"""
+        return self._max_workers
+
+    @max_workers.setter
+    def max_workers(self, value: Optional[int]) -> None:
+        self._max_workers = value
+
+    @property
+    def shared_memory(self) -> bool:
+        """Whether the input grids are loaded once in shared memory for the checks consuming them"""
+        return self._shared_memory
+
+    @shared_memory.setter
+    def shared_memory(self, value: bool) -> None:
+        self._shared_memory = value
+
+    @property
+    def result_cache(self) -> bool:
+        """Whether the check outputs are cached (and restored) in the output folder"""
+        return self._result_cache
+
+    @result_cache.setter
+    def result_cache(self, value: bool) -> None:
+        self._result_cache = value
+
+    @property
+    def timeout(self) -> Optional[float]:
+        """Wall-clock limit for each check (in seconds), None for no limit"""
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value: Optional[float]) -> None:
+        self._timeout = value
+
+    @property
+    def memory_budget(self) -> Optional[int]:
+        """Limit for the estimated memory of the running checks (in bytes), None for no limit"""
+        return self._memory_budget
+
+    @memory_budget.setter
+    def memory_budget(self, value: Optional[int]) -> None:
+        self._memory_budget = value
+
     def __repr__(self):
         msg = "  <%s>\n" % self.__class__.__name__
         msg += "    <progress: %s>\n" % bool(self.progress)
@@ -135,4 +195,10 @@ class QAXParams:
         msg += "    <write kml: %s>\n" % self._write_kml
         msg += "    <project folder: %s>\n" % self._project_folder
         msg += "    <sub-folders: %s>\n" % self._subfolders
+        msg += "    <json cache: %s>\n" % self._json_cache
+        msg += "    <max workers: %s>\n" % self._max_workers
+        msg += "    <shared memory: %s>\n" % self._shared_memory
+        msg += "    <result cache: %s>\n" % self._result_cache
+        msg += "    <timeout: %s>\n" % self._timeout
+        msg += "    <memory budget: %s>\n" % self._memory_budget
         return msg
@@ -1,16 +1,25 @@
+import asyncio
 from collections import defaultdict
-import json
+from concurrent import futures
+import copy
 import time
 import os
 from pathlib import Path
+import sqlite3
 import traceback
 import logging
-from typing import Optional
+from typing import AsyncIterator, Callable, Optional
 from jsonschema import validate, ValidationError, SchemaError, Draft7Validator
 
+from hyo2.qax.lib.executor import CancellationToken, CheckExecutor
 from hyo2.qax.lib.inputs import QAXInputs
+from hyo2.qax.lib.journal import QACheckpoint, QAJournal
+from hyo2.qax.lib.memory import MemoryCalibration
+from hyo2.qax.lib.migration import QAJsonMigration
 from hyo2.qax.lib.outputs import QAXOutputs
 from hyo2.qax.lib.params import QAXParams
+from hyo2.qax.lib.qa_json import QAJson
+from hyo2.qax.lib.result_cache import ResultCache
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +31,7 @@ class QAXProject:
         self._p = QAXParams()
         self._i = QAXInputs()
         self._o = QAXOutputs()
+        self._token = CancellationToken()
 
     @property
     def params(self) -> QAXParams:
@@ -50,18 +60,203 @@ class QAXProject:
     def outputs(self, value: QAXOutputs) -> None:
         self._o = value
 
-    def save_cur_json(self, path: Path):
+    def load_json(self, path: Path) -> None:
+        cache_folder = None
+        if self.params.json_cache:
+            cache_folder = self.outputs.cache_folder
+        self.inputs.load_json(path=path, cache_folder=cache_folder)
+
+        # recover the check changes journaled after the last full save
+        qa_json = self.inputs.qa_json
+        positions = list()
+        nr_of_records = self._journal().replay(js=qa_json.js, keys=positions)
+        if nr_of_records > 0:
+            logger.info("replayed %d journaled changes" % nr_of_records)
+            self._migrate_json()  # the journaled outputs may use fields of the latest schema
+            index = qa_json.index
+            for qa_group, idx in positions:
+                index.mark_dirty(index.key(qa_json.js['qa'][qa_group]['checks'][idx]))
+
+    def _journal(self) -> QAJournal:
+        """Return the journal of the current QA JSON file (kept in the cache folder)"""
+        return QAJournal.for_json(self.inputs.qa_json.path, folder=self.outputs.cache_folder)
+
+    def _migrate_json(self) -> None:
+        """Migrate the current QA JSON to the latest schema version (if needed and possible)"""
+        try:
+            if QAJsonMigration.migrate(self.inputs.qa_json.js):
+                logger.info("QA JSON migrated to v.%s" % QAJsonMigration.detect_version(self.inputs.qa_json.js))
+        except RuntimeError as e:
+            logger.warning("unable to migrate the QA JSON: %s" % e)
+
+    def save_cur_json(self, path: Path, compact: bool = False):
         logger.debug("save json to %s" % path)
-        with open(str(path), "w") as file:
-            json.dump(self.inputs.qa_json.js, file, indent=4)
-
-    def execute_all(self, qa_group: str = "survey_products"):
-        checks = self.inputs.qa_json.js['qa'][qa_group]['checks']
-        logger.debug("checks: %s" % checks)
-        nr_of_checks = len(checks)
-        for idx in range(nr_of_checks):
-            # TODO
-            checks[idx]['outputs']['execution']['status'] = "completed"
+        qa_json = self.inputs.qa_json
+        if not qa_json.validate_changes():
+            raise RuntimeError("invalid json: %s" % path)
+        QAJson.dump(js=qa_json.js, path=path, compact=compact)
+
+        # the journaled changes are now part of the saved file
+        if qa_json.path is not None:
+            self._journal().clear()
+
+    def journal_checks(self, keys: list) -> None:
+        """Append the outputs of the passed checks to the journal of the current QA JSON file"""
+        qa_json = self.inputs.qa_json
+        if qa_json.path is None:
+            raise RuntimeError("unable to journal changes for a QA JSON without path")
+        journal = self._journal()
+        index = qa_json.index
+        for key in keys:
+            journal.append_check(qa_group=index.qa_group(key), idx=index.position(key), check=index.get(key))
+
+    def compact_journal(self, compact: bool = False) -> int:
+        """Merge the journal of the current QA JSON into the file on disk"""
+        return self._journal().compact(compact_output=compact)
+
+    def execute_all(self, qa_group: str = "survey_products", incremental: bool = False,
+                    queued: Optional[Callable[[list], None]] = None, started: Optional[Callable[[int], None]] = None,
+                    finished: Optional[Callable[[int, str], None]] = None,
+                    token: Optional[CancellationToken] = None) -> dict:
+        """Execute all the checks of the passed data level, returning the number of checks for each status
+
+        In incremental mode, only the checks not completed or with inputs changed since their last execution
+        are executed, while the others keep their outputs.
+        The optional callbacks receive the keys of the queued checks, and the key of each started and finished
+        check (with its status). They are called from the executing thread.
+        Without a token, the execution can be stopped with 'cancel_execution'.
+        For a QA JSON file, each completed check is journaled: if the execution is interrupted, the next
+        execution on the same file resumes from the checks not completed (as in incremental mode).
+        If the cache folder cannot be written, the execution continues without checkpoint (and result cache).
+        """
+        self._migrate_json()  # the execution writes fields of the latest schema
+        qa_json = self.inputs.qa_json
+        index = qa_json.index
+        keys = index.keys(qa_group=qa_group)
+        logger.debug("checks: %d" % len(keys))
+        checkpoint = None
+        if qa_json.path is not None:
+            checkpoint = QACheckpoint.for_json(qa_json.path, folder=self.outputs.cache_folder)
+            if checkpoint.interrupted(qa_group):
+                logger.info("resuming the interrupted execution of %s" % qa_group)
+                incremental = True
+        if incremental:
+            nr_of_checks = len(keys)
+            keys = [key for key in keys if CheckExecutor.is_outdated(index.get(key))]
+            logger.info("incremental execution: %d outdated checks, %d skipped"
+                        % (len(keys), nr_of_checks - len(keys)))
+        cache = None
+        if self.params.result_cache:
+            try:
+                cache = ResultCache.for_folder(self.outputs.cache_folder)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning("unable to open the result cache, continuing without: %s" % e)
+        executor = CheckExecutor(max_workers=self.params.max_workers, shared_memory=self.params.shared_memory,
+                                 cache=cache, timeout=self.params.timeout, memory_budget=self.params.memory_budget,
+                                 calibration=MemoryCalibration.for_folder(self.outputs.cache_folder),
+                                 staging_folder=self.outputs.staging_folder, output_folder=self.outputs.output_folder)
+        executor.queued = queued
+        executor.started = started
+
+        def _stop_checkpoint(error: Optional[OSError] = None) -> None:
+            nonlocal checkpoint
+            if error is not None:
+                logger.warning("unable to checkpoint the execution, continuing without: %s" % error)
+            try:
+                checkpoint.finish()
+            except OSError as e:
+                logger.warning("unable to remove the checkpoint: %s" % e)
+            checkpoint = None
+
+        def _finished(key: int, status: str) -> None:
+            if (checkpoint is not None) and (status == "completed"):
+                try:
+                    self.journal_checks([key])
+                except OSError as e:
+                    _stop_checkpoint(error=e)
+            if finished is not None:
+                finished(key, status)
+
+        executor.finished = _finished
+        if token is None:
+            token = self._token
+            token.reset()
+        if checkpoint is not None:
+            try:
+                checkpoint.start(qa_group)
+            except OSError as e:
+                _stop_checkpoint(error=e)
+        try:
+            summary = executor.execute(index=index, keys=keys, token=token)
+        finally:
+            if cache is not None:
+                cache.close()
+        if checkpoint is not None:
+            _stop_checkpoint()
+        return summary
+
+    def cancel_execution(self) -> None:
+        """Stop the current execution (thread-safe): the queued and running checks are aborted"""
+        self._token.cancel()
+
+    async def iter_group(self, qa_group: str = "survey_products", incremental: bool = False, max_pending: int = 64,
+                         executor: Optional[futures.Executor] = None) -> AsyncIterator[tuple]:
+        """Execute the checks of the passed data level, yielding (key, status, outputs) as each check finishes
+
+        The blocking execution runs in the passed executor (the default one of the event loop, if None), so that
+        the loop can multiplex several projects. At most 'max_pending' results are buffered: beyond that, the
+        execution waits for the consumer (and stops dispatching checks). When the iteration is cancelled or
+        closed early, the queued and running checks are aborted before returning.
+        """
+        loop = asyncio.get_running_loop()
+        results = asyncio.Queue(maxsize=max_pending)
+        token = CancellationToken()
+        done = object()
+
+        def _put(item: object) -> None:
+            put = asyncio.run_coroutine_threadsafe(results.put(item), loop)
+            while not token.cancelled:
+                try:
+                    put.result(timeout=0.1)
+                    return
+                except futures.TimeoutError:
+                    continue
+            put.cancel()
+
+        def _finished(key: int, status: str) -> None:
+            outputs = copy.deepcopy(self.inputs.qa_json.index.get(key).get('outputs', dict()))
+            _put((key, status, outputs))
+
+        def _execute() -> dict:
+            try:
+                return self.execute_all(qa_group, incremental=incremental, finished=_finished, token=token)
+            finally:
+                _put(done)
+
+        execution = loop.run_in_executor(executor, _execute)
+        try:
+            while True:
+                item = await results.get()
+                if item is done:
+                    break
+                yield item
+            await execution  # to raise any execution error
+        finally:
+            if not execution.done():
+                logger.info("cancelling the execution of %s" % qa_group)
+                token.cancel()
+                await asyncio.wait([execution])
+
+    async def run_group(self, qa_group: str = "survey_products", incremental: bool = False,
+                        executor: Optional[futures.Executor] = None) -> dict:
+        """Execute the checks of the passed data level, returning the number of checks for each status
+
+        Cancelling the awaiting task aborts the queued and running checks.
+        """
+        summary = dict()
+        async for _, status, _ in self.iter_group(qa_group, incremental=incremental, executor=executor):
+            summary[status] = summary.get(status, 0) + 1
+        return summary
 
     def __repr__(self):
         msg = super().__repr__()
@@ -1,12 +1,19 @@
 from collections import defaultdict
-import json
 import time
 import os
 from pathlib import Path
+import tempfile
 import traceback
 import logging
 from typing import Optional
-from jsonschema import validate, ValidationError, SchemaError, Draft7Validator
+from jsonschema import ValidationError, SchemaError
+from jsonschema.exceptions import best_match
+
+from hyo2.qax.lib.check_index import CheckIndex
+from hyo2.qax.lib.json_backend import json_backend
+from hyo2.qax.lib.schema_catalog import SchemaCatalog
+from hyo2.qax.lib.sidecar_cache import SidecarCache
+from hyo2.qax.lib.validator_registry import validator_registry
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +21,7 @@ logger = logging.getLogger(__name__)
 class QAJson:
 
     here = Path(__file__).parent
+    _catalog = None
 
     @classmethod
     def schemas_folder(cls) -> Path:
@@ -23,20 +31,20 @@ class QAJson:
         return schemas_path
 
     @classmethod
-    def schema_paths(cls) -> list:
-        paths = list()
-        for path in cls.schemas_folder().rglob('*.json'):
+    def catalog(cls) -> SchemaCatalog:
+        """Version-sorted catalog of the shipped schemas, built once per process"""
+        if cls._catalog is None:
+            cls._catalog = SchemaCatalog(folder=cls.schemas_folder())
+        return cls._catalog
 
-            if path.match('*.schema.json'):
-                paths.append(path)
-
-        return paths
+    @classmethod
+    def schema_paths(cls) -> list:
+        return cls.catalog().schema_paths()
 
     @classmethod
     def validate_schema(cls, path: Path) -> bool:
-        schema = json.loads(open(str(path)).read())
         try:
-            Draft7Validator.check_schema(schema)
+            validator_registry.validator(path)
         except Exception as e:
             logger.warning("%s" % e)
             return False
@@ -45,10 +53,16 @@ class QAJson:
 
     @classmethod
     def validate_qa_json(cls, path: Path, schema_path: Path) -> bool:
-        qa = json.loads(open(str(path)).read())
+        qa = json_backend.loads(Path(path).read_bytes())
         # logger.debug(json)
+        return cls.validate_qa_obj(qa=qa, schema_path=schema_path)
+
+    @classmethod
+    def validate_qa_obj(cls, qa: object, schema_path: Path) -> bool:
         try:
-            validate(instance=qa, schema=json.loads(open(str(schema_path)).read()))
+            error = best_match(validator_registry.validator(schema_path).iter_errors(qa))
+            if error is not None:
+                raise error
         except ValidationError as e:
             logger.warning("%s" % e)
             return False
@@ -58,43 +72,96 @@ class QAJson:
         return True
 
     @classmethod
-    def example_paths(cls) -> list:
-        paths = list()
-        for path in cls.schemas_folder().rglob('*.json'):
-
-            if not path.match('*.schema.json'):
-                paths.append(path)
+    def dump(cls, js: object, path: Path, compact: bool = False) -> None:
+        """Write the passed document through a temporary file that atomically replaces the destination"""
+        path = Path(path)
+        data = json_backend.dumps(js, indent=None if compact else 4)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=path.name, suffix=".tmp", dir=str(path.parent))
+        try:
+            with os.fdopen(fd, "wb") as fid:
+                fid.write(data)
+                fid.flush()
+                os.fsync(fid.fileno())
+            os.replace(tmp_path, str(path))
+        except Exception:
+            os.remove(tmp_path)
+            raise
 
-        return paths
+    @classmethod
+    def example_paths(cls) -> list:
+        return cls.catalog().example_paths()
 
-    def __init__(self, path: Path, schema_path: Optional[Path] = None, check_valid: bool = True):
-        self._path = Path(path)
+    def __init__(self, path: Optional[Path], schema_path: Optional[Path] = None, check_valid: bool = True,
+                 js: Optional[object] = None, cache_folder: Optional[Path] = None):
+        self._path = None if path is None else Path(path)
         if schema_path is None:
-            schema_path = self.schema_paths()[-1]
+            schema_path = self.catalog().schema_path()
         self._schema_path = schema_path
 
+        # read and decode the file only once, then validate the in-memory object
+        data = None
+        cache = None
+        validated = False
+        if js is None:
+            if self._path is None:
+                raise RuntimeError("either a path or a decoded object is required")
+            data = self._path.read_bytes()
+
+            # an up-to-date sidecar holds the already-validated document
+            if cache_folder is not None:
+                cache = SidecarCache(folder=cache_folder)
+                js = cache.load(source_path=self._path, data=data, schema_version=self.schema_version)
+                validated = js is not None
+
+            if js is None:
+                js = json_backend.loads(data)
+
         # validation stuff
-        if check_valid:
+        if check_valid and not validated:
             valid = self.validate_schema(path=self._schema_path)
             logger.debug("valid QA schema: %s" % valid)
             if not valid:
                 raise RuntimeError("invalid schema: %s" % self._schema_path)
 
-            valid = self.validate_qa_json(path=self._path, schema_path=self._schema_path)
+            valid = self.validate_qa_obj(qa=js, schema_path=self._schema_path)
             logger.debug("valid QA json: %s" % valid)
             if not valid:
                 raise RuntimeError("invalid json: %s" % self._path)
+            validated = True
+
+            if cache is not None:
+                try:
+                    cache.store(source_path=self._path, data=data, schema_version=self.schema_version, js=js)
+                except OSError as e:
+                    logger.warning("unable to store sidecar: %s" % e)
+
+        self._js = js
+        self._index = None
+        self._needs_full_validation = not validated
+
+    @classmethod
+    def from_bytes(cls, data: bytes, path: Optional[Path] = None, schema_path: Optional[Path] = None,
+                   check_valid: bool = True) -> 'QAJson':
+        return cls(path=path, schema_path=schema_path, check_valid=check_valid, js=json_backend.loads(data))
 
-        self._js = json.loads(open(str(self._path)).read())
+    @classmethod
+    def from_obj(cls, js: object, path: Optional[Path] = None, schema_path: Optional[Path] = None,
+                 check_valid: bool = True) -> 'QAJson':
+        return cls(path=path, schema_path=schema_path, check_valid=check_valid, js=js)
 
     @property
-    def path(self) -> Path:
+    def path(self) -> Optional[Path]:
         return self._path
 
     @property
     def schema_path(self) -> Path:
         return self._schema_path
 
+    @property
+    def schema_version(self) -> str:
+        return validator_registry.schema_version(self._schema_path)
+
     @property
     def js(self) -> Optional[object]:
         return self._js
@@ -102,6 +169,46 @@ class QAJson:
     @js.setter
     def js(self, value: object) -> None:
         self._js = value
+        self._index = None
+        self._needs_full_validation = True
+
+    @property
+    def index(self) -> CheckIndex:
+        """Index over the checks of the document, lazily built on first access"""
+        if self._index is None:
+            self._index = CheckIndex(js=self._js)
+        return self._index
+
+    def validate_changes(self) -> bool:
+        """Validate the checks added or updated through the index since the last validation
+
+        A full validation is performed only if the whole document has never been validated.
+        """
+        if self._needs_full_validation:
+            valid = self.validate_qa_obj(qa=self._js, schema_path=self._schema_path)
+            logger.debug("valid QA json: %s" % valid)
+            if valid:
+                self._needs_full_validation = False
+                if self._index is not None:
+                    self._index.clear_dirty()
+            return valid
+
+        if self._index is None:
+            return True
+
+        validator = validator_registry.validator(self._schema_path, definition="check")
+        valid = True
+        dirty_keys = self._index.dirty_keys()
+        for key in dirty_keys:
+            error = best_match(validator.iter_errors(self._index.get(key)))
+            if error is not None:
+                logger.warning("invalid check #%s: %s" % (key, error.message))
+                valid = False
+        logger.debug("validated checks: %d -> valid: %s" % (len(dirty_keys), valid))
+
+        if valid:
+            self._index.clear_dirty()
+        return valid
 
     def __repr__(self):
         msg = super().__repr__()
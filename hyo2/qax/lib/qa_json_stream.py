@@ -0,0 +1,260 @@
+import codecs
+import json
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Iterator, Optional
+
+from hyo2.qax.lib.json_backend import json_backend
+
+logger = logging.getLogger(__name__)
+
+
+class _TextScanner:
+    """Forward-only JSON tokenizer working on a bounded window of a UTF-8 file
+
+    All the positions are absolute offsets, so that the consumed part of the window can be dropped
+    at any time. Values are decoded by the C-accelerated standard library scanner. When an output
+    file is passed, the consumed text is copied through it and single values can be replaced on the fly.
+    """
+
+    _whitespace = re.compile(r'\s*')
+    _delimiters = ",:]} \t\r\n"
+
+    def __init__(self, fid, chunk_size: int, out=None):
+        self._fid = fid
+        self._chunk_size = chunk_size
+        self._out = out
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buf = str()
+        self._base = 0  # absolute offset of the first char in the window
+        self._pos = 0  # absolute offset of the cursor
+        self._flushed = 0  # absolute offset of the first char not yet copied to the output
+        self._last_start = 0  # absolute offset of the last value read
+        self._eof = False
+
+    @property
+    def _end(self) -> int:
+        return self._base + len(self._buf)
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+
+        if self._pos - self._base >= self._chunk_size:
+            self._flush(self._pos)
+            self._buf = self._buf[self._pos - self._base:]
+            self._base = self._pos
+
+        chunk = self._fid.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            self._buf += self._utf8.decode(b'', final=True)
+            return False
+        self._buf += self._utf8.decode(chunk)
+        return True
+
+    def _flush(self, upto: int) -> None:
+        if (self._out is None) or (upto <= self._flushed):
+            return
+        self._out.write(self._buf[self._flushed - self._base:upto - self._base])
+        self._flushed = upto
+
+    def _error(self, msg: str) -> RuntimeError:
+        return RuntimeError("invalid json at char %d: %s" % (self._pos, msg))
+
+    def peek(self) -> str:
+        while True:
+            m = self._whitespace.match(self._buf, self._pos - self._base)
+            self._pos = self._base + m.end()
+            if self._pos < self._end:
+                return self._buf[self._pos - self._base]
+            if not self._fill():
+                return str()
+
+    def consume(self, expected: str) -> None:
+        if self.peek() != expected:
+            raise self._error("expected '%s'" % expected)
+        self._pos += 1
+
+    def read_value(self) -> object:
+        """Decode the value at the cursor, reading more of the file until the value is complete"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos - self._base)
+                # a scalar (e.g., '100.' of '100.5') may have been truncated by the end of the window
+                if self._eof or ((end < len(self._buf)) and (self._buf[end] in self._delimiters)):
+                    break
+            except json.JSONDecodeError as e:
+                if self._eof:
+                    raise self._error("%s" % e)
+            self._fill()
+
+        self._last_start = self._pos
+        self._pos = self._base + end
+        return value
+
+    def skip_value(self) -> None:
+        """Skip the value at the cursor, walking objects and arrays to keep the window bounded"""
+        first = self.peek()
+        if first == '{':
+            for _ in self.object_keys():
+                self.skip_value()
+        elif first == '[':
+            # array items (e.g., the checks) are small enough to be decoded in a single shot
+            for _ in self.array_items():
+                self.read_value()
+        else:
+            self.read_value()
+
+    def replace_value(self, text: str) -> None:
+        """Replace the value that has just been read with the passed text"""
+        self._flush(self._last_start)
+        self._out.write(text)
+        self._flushed = self._pos
+
+    def read_string(self) -> str:
+        if self.peek() != '"':
+            raise self._error("expected string")
+        return self.read_value()
+
+    def object_keys(self) -> Iterator[str]:
+        """Yield the keys of the object at the cursor, the caller has to consume each value"""
+        self.consume('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.read_string()
+            self.consume(':')
+            yield key
+            sep = self.peek()
+            self.consume(sep if sep in (',', '}') else ',')
+            if sep == '}':
+                return
+
+    def array_items(self) -> Iterator[int]:
+        """Yield the indices of the array at the cursor, the caller has to consume each item"""
+        self.consume('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        idx = 0
+        while True:
+            yield idx
+            idx += 1
+            sep = self.peek()
+            self.consume(sep if sep in (',', ']') else ',')
+            if sep == ']':
+                return
+
+    def finish(self) -> None:
+        if self._out is None:
+            return
+        while self._fill():
+            pass
+        self._pos = self._end
+        self._flush(self._end)
+
+
+class QAJsonStream:
+    """Stream the checks of a QA JSON file one by one, without materializing the whole document"""
+
+    def __init__(self, path: Path, chunk_size: int = 1 << 20):
+        self._path = Path(path)
+        self._chunk_size = chunk_size
+        self._version = None
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def version(self) -> Optional[str]:
+        """The QA version (only available once the 'version' entry has been streamed)"""
+        return self._version
+
+    def _walk(self, scanner: _TextScanner, qa_groups: Optional[list], statuses: Optional[list],
+              updates: Optional[dict]) -> Iterator[tuple]:
+        for key in scanner.object_keys():
+            if key != "qa":
+                scanner.skip_value()
+                continue
+
+            for qa_key in scanner.object_keys():
+                if qa_key == "version":
+                    self._version = scanner.read_value()
+                    continue
+                if (scanner.peek() != '{') or ((qa_groups is not None) and (qa_key not in qa_groups)):
+                    scanner.skip_value()
+                    continue
+
+                for group_key in scanner.object_keys():
+                    if group_key != "checks":
+                        scanner.skip_value()
+                        continue
+
+                    for idx in scanner.array_items():
+                        if updates is None:
+                            check = scanner.read_value()
+                        elif (qa_key, idx) in updates:
+                            check = scanner.read_value()
+                            check['outputs'] = updates[(qa_key, idx)]
+                            scanner.replace_value(json_backend.dumps(check).decode("utf-8"))
+                            yield qa_key, idx, check
+                            continue
+                        else:
+                            scanner.read_value()
+                            continue
+
+                        if statuses is not None:
+                            try:
+                                status = check['outputs']['execution']['status']
+                            except (KeyError, TypeError):
+                                status = None
+                            if status not in statuses:
+                                continue
+                        yield qa_key, idx, check
+
+    def iter_checks(self, qa_groups: Optional[list] = None, statuses: Optional[list] = None) -> Iterator[tuple]:
+        """Yield (qa group, index in the group, check) for each check, optionally filtered"""
+        with open(str(self._path), "rb") as fid:
+            scanner = _TextScanner(fid=fid, chunk_size=self._chunk_size)
+            yield from self._walk(scanner=scanner, qa_groups=qa_groups, statuses=statuses, updates=None)
+
+    def update_outputs(self, outputs: dict, output_path: Optional[Path] = None) -> int:
+        """Replace the outputs of the checks keyed by (qa group, index), streaming the document to disk
+
+        The result is written to a temporary file that atomically replaces the output path (by default,
+        the source file).
+        """
+        if output_path is None:
+            output_path = self._path
+        output_path = Path(output_path)
+
+        nr_of_updates = 0
+        fd, tmp_path = tempfile.mkstemp(prefix=output_path.name, suffix=".tmp", dir=str(output_path.parent))
+        try:
+            with open(str(self._path), "rb") as fid, os.fdopen(fd, "w", encoding="utf-8", newline="") as out:
+                scanner = _TextScanner(fid=fid, chunk_size=self._chunk_size, out=out)
+                for _ in self._walk(scanner=scanner, qa_groups=None, statuses=None, updates=outputs):
+                    nr_of_updates += 1
+                scanner.finish()
+            os.replace(tmp_path, str(output_path))
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+        if nr_of_updates != len(outputs):
+            logger.warning("updated %d checks out of %d" % (nr_of_updates, len(outputs)))
+        return nr_of_updates
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <path: %s>\n" % (self._path, )
+        msg += "  <chunk size: %d>\n" % self._chunk_size
+        return msg
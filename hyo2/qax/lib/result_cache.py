@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+from hyo2.qax.lib.check_index import CheckIndex
+from hyo2.qax.lib.fingerprint import FileFingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCacheStats:
+
+    def __init__(self, entries: int, nr_of_bytes: int, max_bytes: int, hits: int, misses: int, evictions: int):
+        self.entries = entries
+        self.nr_of_bytes = nr_of_bytes
+        self.max_bytes = max_bytes
+        self.hits = hits
+        self.misses = misses
+        self.evictions = evictions
+
+    @property
+    def hit_ratio(self) -> float:
+        if (self.hits + self.misses) == 0:
+            return 0.0
+        return self.hits / (self.hits + self.misses)
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <entries: %d>\n" % self.entries
+        msg += "  <size: %.1f/%.1f KB>\n" % (self.nr_of_bytes / 1024, self.max_bytes / 1024)
+        msg += "  <hits: %d>\n" % self.hits
+        msg += "  <misses: %d>\n" % self.misses
+        msg += "  <hit ratio: %.1f%%>\n" % (self.hit_ratio * 100.0)
+        msg += "  <evictions: %d>\n" % self.evictions
+        return msg
+
+
+class ResultCache:
+    """Persistent cache of the check outputs, keyed by check identity, parameters and input fingerprints
+
+    The key combines the check name and 'info.version', the canonicalized 'params', and the path, size and
+    partial hash of each input file. The outputs (without the execution block) are stored in a SQLite
+    database, and the least recently used entries are evicted beyond 'max_bytes'.
+    """
+
+    filename = "results.sqlite"
+    cached_fields = ("count", "percentage", "files")
+
+    def __init__(self, path: Path, max_bytes: int = 64 * 1024 * 1024):
+        self._path = Path(path)
+        self._max_bytes = max_bytes
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self._path))
+        self._conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, outputs TEXT NOT NULL, "
+                           "size INTEGER NOT NULL, last_used REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self._conn.commit()
+
+    @classmethod
+    def for_folder(cls, folder: Path, max_bytes: int = 64 * 1024 * 1024) -> 'ResultCache':
+        return cls(path=Path(folder).joinpath(cls.filename), max_bytes=max_bytes)
+
+    @property
+    def path(self) -> Path:
+        return self._path
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value: int) -> None:
+        self._max_bytes = value
+        self._evict()
+
+    @classmethod
+    def make_key(cls, check: dict, fingerprints: Optional[list] = None) -> Optional[str]:
+        """Return the cache key of the passed check, or None if any of its inputs cannot be fingerprinted
+
+        The fingerprints of the input files, if already computed, can be passed (in the same order).
+        """
+        inputs = list()
+        items = check.get('inputs', dict()).get('files', list())
+        if fingerprints is None:
+            fingerprints = [FileFingerprint.of(item['path']) for item in items]
+        for item, fingerprint in zip(items, fingerprints):
+            if fingerprint is None:
+                return None
+            inputs.append((os.path.normpath(item['path']), fingerprint['size'], fingerprint['hash']))
+        identity = {
+            'name': CheckIndex.value(check, 'name'),
+            'version': check.get('info', dict()).get('version'),
+            'params': check.get('params', dict()),
+            'inputs': inputs,
+        }
+        canonical = json.dumps(identity, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: Optional[str]) -> Optional[dict]:
+        """Return the cached outputs for the passed key (if any), marking them as recently used"""
+        row = None
+        if key is not None:
+            row = self._conn.execute("SELECT outputs FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, key: Optional[str], outputs: dict) -> None:
+        if key is None:
+            return
+        data = json.dumps({field: outputs[field] for field in self.cached_fields if field in outputs})
+        self._conn.execute("INSERT OR REPLACE INTO results (key, outputs, size, last_used) VALUES (?, ?, ?, ?)",
+                           (key, data, len(data), time.time()))
+        self._evict()
+        self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self._max_bytes:
+            return
+        keys = list()
+        for key, size in self._conn.execute("SELECT key, size FROM results ORDER BY last_used"):
+            if total <= self._max_bytes:
+                break
+            keys.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM results WHERE key = ?", keys)
+        self._evictions += len(keys)
+        logger.debug("evicted %d cached results" % len(keys))
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM results")
+        self._conn.commit()
+
+    def stats(self) -> ResultCacheStats:
+        entries, nr_of_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return ResultCacheStats(entries=entries, nr_of_bytes=nr_of_bytes, max_bytes=self._max_bytes,
+                                hits=self._hits, misses=self._misses, evictions=self._evictions)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <path: %s>\n" % self._path
+        msg += "  <entries: %d>\n" % len(self)
+        return msg
@@ -0,0 +1,196 @@
+import logging
+import os
+from typing import Callable, Optional
+
+from hyo2.qax.lib.check_index import CheckIndex
+
+logger = logging.getLogger(__name__)
+
+
+class GridLoaderRegistry:
+    """Registry of the functions that load a grid from its path, keyed by (lower-case) file extension
+
+    A loader is called once per grid job and its result is shared by all the checks consuming that input.
+    Inputs without a registered loader are passed to the checks as their path. By default ('grid_loaders'), the
+    whole layers of the BAG and CSAR grids are read.
+    """
+
+    def __init__(self):
+        self._loaders = dict()
+
+    def register(self, ext: str, loader: Callable[[str], object]) -> None:
+        self._loaders[ext.lower()] = loader
+        logger.debug("registered grid loader: %s" % ext)
+
+    def unregister(self, ext: str) -> None:
+        self._loaders.pop(ext.lower(), None)
+
+    def loader(self, path: str) -> Optional[Callable[[str], object]]:
+        return self._loaders.get(os.path.splitext(path)[1].lower())
+
+    def __contains__(self, ext: str) -> bool:
+        return ext.lower() in self._loaders
+
+
+def _load_bag(path: str) -> dict:
+    from hyo2.qax.lib.grid_tiles import BagTileReader  # numpy and h5py are only imported by the loading processes
+
+    return BagTileReader.load_grid(path)
+
+
+def _load_csar(path: str) -> dict:
+    from hyo2.qax.lib.csar_tiles import CsarTileReader
+
+    return CsarTileReader.load_grid(path)
+
+
+grid_loaders = GridLoaderRegistry()
+grid_loaders.register(".bag", _load_bag)
+grid_loaders.register(".csar", _load_csar)
+
+
+class GridJob:
+    """Checks that (directly or transitively) share at least one input, to be executed together
+
+    The checks are ordered to keep the consumers of the same grid adjacent, and each grid is released
+    right after its last consumer.
+    """
+
+    def __init__(self, keys: list, inputs: dict, sizes: dict):
+        self._keys = keys
+        self._inputs = inputs  # key -> list of input paths
+        self._sizes = sizes  # path -> estimated size
+        self._releases = dict()  # key -> list of paths to release after the check
+        last_consumers = dict()
+        for key in keys:
+            for path in inputs[key]:
+                last_consumers[path] = key
+        for path, key in last_consumers.items():
+            self._releases.setdefault(key, list()).append(path)
+
+        # simulate the loads and releases to bound the memory used by the job
+        self._peak_bytes = 0
+        loaded = set()
+        for key in keys:
+            loaded.update(inputs[key])
+            self._peak_bytes = max(self._peak_bytes, sum(sizes[path] for path in loaded))
+            loaded.difference_update(self._releases.get(key, list()))
+        self._nr_of_bytes = sum(sizes[path] for path in last_consumers)
+
+    @property
+    def keys(self) -> list:
+        return list(self._keys)
+
+    @property
+    def paths(self) -> list:
+        return sorted({path for key in self._keys for path in self._inputs[key]})
+
+    @property
+    def peak_bytes(self) -> int:
+        return self._peak_bytes
+
+    @property
+    def nr_of_bytes(self) -> int:
+        return self._nr_of_bytes
+
+    def subset(self, keys: list) -> 'GridJob':
+        """Return a job with only the passed checks (e.g., to re-queue the ones left by a killed worker)"""
+        keys = set(keys)
+        return GridJob(keys=[key for key in self._keys if key in keys], inputs=self._inputs, sizes=self._sizes)
+
+    def size(self, path: str) -> int:
+        return self._sizes[path]
+
+    def estimate(self, key: int) -> int:
+        """Estimated memory required by the passed check (i.e., by its inputs)"""
+        return sum(self._sizes[path] for path in self._inputs[key])
+
+    def inputs(self, key: int) -> list:
+        return list(self._inputs[key])
+
+    def releases(self, key: int) -> list:
+        return list(self._releases.get(key, list()))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <checks: %d>\n" % len(self._keys)
+        msg += "  <inputs: %d>\n" % len(self.paths)
+        msg += "  <peak: %.1f MB>\n" % (self._peak_bytes / (1024 * 1024))
+        return msg
+
+
+class CheckScheduler:
+    """Group the checks into grid jobs, so that each input grid is loaded only once
+
+    The checks and their 'inputs.files[].path' form a bipartite graph: each connected component
+    becomes a job. The jobs are sorted by decreasing peak memory (largest first), and the peak
+    memory of a run is bounded by the sum of the largest job peaks that can run at the same time.
+    """
+
+    def __init__(self, size_estimator: Optional[Callable[[str], int]] = None):
+        self._size_estimator = size_estimator if size_estimator is not None else self.file_size
+
+    @classmethod
+    def file_size(cls, path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    @classmethod
+    def input_paths(cls, check: dict) -> list:
+        paths = list()
+        for item in check.get('inputs', dict()).get('files', list()):
+            path = os.path.normpath(item['path'])
+            if path not in paths:
+                paths.append(path)
+        return paths
+
+    def schedule(self, index: CheckIndex, keys: list) -> list:
+        inputs = {key: self.input_paths(index.get(key)) for key in keys}
+
+        # union-find on the input paths
+        parents = dict()
+
+        def _find(path: str) -> str:
+            root = path
+            while parents[root] != root:
+                root = parents[root]
+            while parents[path] != root:
+                parents[path], path = root, parents[path]
+            return root
+
+        for paths in inputs.values():
+            for path in paths:
+                parents.setdefault(path, path)
+            for path in paths[1:]:
+                parents[_find(path)] = _find(paths[0])
+
+        components = dict()  # root path (or check key, without inputs) -> keys
+        for key in keys:
+            root = _find(inputs[key][0]) if inputs[key] else key
+            components.setdefault(root, list()).append(key)
+
+        sizes = {path: self._size_estimator(path) for path in parents}
+        jobs = list()
+        for component in components.values():
+            # keep the consumers of the same grid adjacent, preserving the document order otherwise
+            first_seen = dict()
+            for key in component:
+                for path in inputs[key]:
+                    first_seen.setdefault(path, len(first_seen))
+            component.sort(key=lambda k: min((first_seen[path] for path in inputs[k]), default=0))
+            jobs.append(GridJob(keys=component, inputs=inputs, sizes=sizes))
+        jobs.sort(key=lambda job: job.peak_bytes, reverse=True)
+
+        logger.debug("scheduled %d checks in %d jobs (%d inputs)" % (len(keys), len(jobs), len(parents)))
+        return jobs
+
+    @classmethod
+    def peak_memory_bound(cls, jobs: list, max_workers: int) -> int:
+        """Upper bound of the memory used by the loaded grids, with 'max_workers' jobs at the same time"""
+        peaks = sorted((job.peak_bytes for job in jobs), reverse=True)
+        return sum(peaks[:max(max_workers, 1)])
@@ -0,0 +1,85 @@
+import logging
+import re
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaCatalog:
+    """Catalog of the QA schemas and of their examples, sorted by semantic version
+
+    Each version is stored in a folder named after it (e.g., 'v0.1.3') that contains the 'qa.schema.json'
+    schema and optional example files. The folder is scanned only once, at creation.
+    """
+
+    version_pattern = re.compile(r'^v(\d+(?:\.\d+)*)$')
+    schema_name = "qa.schema.json"
+
+    def __init__(self, folder: Path):
+        self._folder = Path(folder)
+        self._schemas = dict()  # version -> schema path
+        self._examples = dict()  # version -> list of example paths
+
+        for path in self._folder.iterdir():
+            m = self.version_pattern.match(path.name)
+            if (m is None) or not path.is_dir():
+                continue
+            schema_path = path.joinpath(self.schema_name)
+            if not schema_path.exists():
+                logger.warning("missing schema in %s" % path)
+                continue
+            version = m.group(1)
+            self._schemas[version] = schema_path
+            self._examples[version] = sorted(example for example in path.glob('*.json')
+                                             if not example.match('*.schema.json'))
+
+        self._versions = sorted(self._schemas, key=self.version_tuple)
+        if len(self._versions) == 0:
+            raise RuntimeError("no schemas in %s" % self._folder)
+        logger.debug("schema versions: %s" % self._versions)
+
+    @classmethod
+    def version_tuple(cls, version: str) -> tuple:
+        return tuple(int(token) for token in version.lstrip('v').split('.'))
+
+    @property
+    def folder(self) -> Path:
+        return self._folder
+
+    @property
+    def versions(self) -> list:
+        return list(self._versions)
+
+    @property
+    def latest_version(self) -> str:
+        return self._versions[-1]
+
+    def schema_path(self, version: Optional[str] = None) -> Path:
+        """Return the schema path for the passed version (the latest one, if not passed)"""
+        if version is None:
+            version = self._versions[-1]
+        try:
+            return self._schemas[version.lstrip('v')]
+        except KeyError:
+            raise RuntimeError("unknown schema version: %s" % version)
+
+    def schema_paths(self) -> list:
+        return [self._schemas[version] for version in self._versions]
+
+    def example_paths(self, version: Optional[str] = None) -> list:
+        """Return the example paths for the passed version (for all the versions, if not passed)"""
+        if version is not None:
+            self.schema_path(version)  # raise for unknown versions
+            return list(self._examples[version.lstrip('v')])
+        return [path for version in self._versions for path in self._examples[version]]
+
+    def __contains__(self, version: str) -> bool:
+        return version.lstrip('v') in self._schemas
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <folder: %s>\n" % self._folder
+        for version in self._versions:
+            msg += "  <v%s: %d examples>\n" % (version, len(self._examples[version]))
+        return msg
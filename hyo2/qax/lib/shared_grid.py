@@ -0,0 +1,135 @@
+import logging
+from collections.abc import Mapping
+from multiprocessing import shared_memory
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SharedGrid(Mapping):
+    """Grid layers (e.g., depth, uncertainty, density) stored in shared memory blocks, one per layer
+
+    The grid is created once (by the loading process) and then attached zero-copy by the consumers
+    through its picklable descriptor. The attached layers are read-only.
+    """
+
+    def __init__(self, blocks: dict, layers: dict):
+        self._blocks = blocks  # layer name -> SharedMemory
+        self._layers = layers  # layer name -> numpy array backed by the block
+
+    @classmethod
+    def create(cls, layers: Mapping) -> 'SharedGrid':
+        blocks = dict()
+        shared_layers = dict()
+        try:
+            for name, array in layers.items():
+                array = np.ascontiguousarray(array)
+                block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks[name] = block
+                shared_layers[name] = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+                shared_layers[name][...] = array
+        except Exception:
+            grid = cls(blocks=blocks, layers=shared_layers)
+            grid.close()
+            grid.unlink()
+            raise
+        return cls(blocks=blocks, layers=shared_layers)
+
+    @classmethod
+    def attach(cls, descriptor: dict) -> 'SharedGrid':
+        blocks = dict()
+        layers = dict()
+        for name, (block_name, shape, dtype) in descriptor.items():
+            blocks[name] = shared_memory.SharedMemory(name=block_name)
+            layers[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=blocks[name].buf)
+            layers[name].flags.writeable = False
+        return cls(blocks=blocks, layers=layers)
+
+    @property
+    def descriptor(self) -> dict:
+        """Picklable description of the shared blocks: layer name -> (block name, shape, dtype)"""
+        return {name: (self._blocks[name].name, layer.shape, layer.dtype.str) for name, layer in self._layers.items()}
+
+    @property
+    def nr_of_bytes(self) -> int:
+        return sum(layer.nbytes for layer in self._layers.values())
+
+    def close(self) -> None:
+        """Detach from the shared blocks (any array still referencing them keeps them mapped)"""
+        self._layers.clear()
+        for block in self._blocks.values():
+            try:
+                block.close()
+            except BufferError:
+                logger.debug("block still referenced: %s" % block.name)
+
+    def unlink(self) -> None:
+        """Free the shared blocks, once all the consumers are done"""
+        for block in self._blocks.values():
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._layers[name]
+
+    def __iter__(self):
+        return iter(self._layers)
+
+    def __len__(self):
+        return len(self._layers)
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        for name, layer in self._layers.items():
+            msg += "  <%s: %s %s>\n" % (name, layer.shape, layer.dtype)
+        return msg
+
+
+class SharedGridPool:
+    """Reference-counted shared grids, keyed by path: a grid is unlinked when its last consumer releases it"""
+
+    def __init__(self):
+        self._descriptors = dict()
+        self._counts = dict()
+
+    def add(self, path: str, descriptor: dict, consumers: int) -> bool:
+        """Add a shared grid for the passed number of consumers, returning whether it was already unlinked"""
+        self._descriptors[path] = descriptor
+        self._counts[path] = consumers
+        if consumers <= 0:
+            self._unlink(path)
+            return True
+        return False
+
+    def descriptor(self, path: str) -> dict:
+        return self._descriptors[path]
+
+    def release(self, path: str) -> bool:
+        """Release a consumer of the passed grid, returning whether the grid was unlinked"""
+        if path not in self._counts:
+            return False
+        self._counts[path] -= 1
+        if self._counts[path] <= 0:
+            self._unlink(path)
+            return True
+        return False
+
+    def _unlink(self, path: str) -> None:
+        grid = SharedGrid.attach(self._descriptors.pop(path))
+        grid.unlink()
+        grid.close()
+        del self._counts[path]
+        logger.debug("released shared grid: %s" % path)
+
+    def clear(self) -> None:
+        for path in list(self._descriptors):
+            self._unlink(path)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._descriptors
+
+    def __len__(self):
+        return len(self._descriptors)
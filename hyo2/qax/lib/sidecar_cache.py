@@ -0,0 +1,115 @@
+import gc
+import hashlib
+import logging
+import marshal
+import os
+import struct
+import sys
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SidecarCache:
+    """Binary cache of parsed and validated QA JSON documents
+
+    Each source file has a single sidecar in the cache folder. The sidecar stores the decoded document
+    in marshal format (which only deals with the plain types of a JSON document), together with the hash
+    of the source bytes and the version of the schema used for validation. A sidecar is only used when
+    both match.
+    """
+
+    magic = b"QAXC"
+    header = struct.Struct("<4sHH20s16s")  # magic, format version, marshal version, content hash, schema version
+    format_version = 1
+    ext = ".qaxc"
+
+    def __init__(self, folder: Path):
+        self._folder = Path(folder)
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def folder(self) -> Path:
+        return self._folder
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    @classmethod
+    def content_hash(cls, data: bytes) -> bytes:
+        return hashlib.blake2b(data, digest_size=20).digest()
+
+    def sidecar_path(self, source_path: Path) -> Path:
+        source_path = Path(source_path).resolve()
+        path_hash = hashlib.blake2b(str(source_path).encode("utf-8"), digest_size=8).hexdigest()
+        return self._folder.joinpath("%s.%s%s" % (source_path.name, path_hash, self.ext))
+
+    @classmethod
+    def _marshal_version(cls) -> int:
+        # the marshal format may change among Python versions
+        return marshal.version * 1000 + sys.version_info[0] * 100 + sys.version_info[1]
+
+    def _make_header(self, data: bytes, schema_version: str) -> bytes:
+        return self.header.pack(self.magic, self.format_version, self._marshal_version(),
+                                self.content_hash(data), schema_version.encode("utf-8"))
+
+    def load(self, source_path: Path, data: bytes, schema_version: str) -> Optional[object]:
+        """Return the cached document for the passed source bytes, or None if missing or outdated"""
+        path = self.sidecar_path(source_path)
+        try:
+            with open(str(path), "rb") as fid:
+                header = fid.read(self.header.size)
+                if header != self._make_header(data=data, schema_version=schema_version):
+                    logger.debug("outdated sidecar: %s" % path)
+                    self._misses += 1
+                    return None
+                payload = fid.read()
+            # the cyclic garbage collector is useless (and slow) while building a tree of plain containers
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                js = marshal.loads(payload)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+        except FileNotFoundError:
+            self._misses += 1
+            return None
+        except (EOFError, ValueError, TypeError) as e:
+            logger.info("corrupted sidecar %s: %s" % (path, e))
+            self._misses += 1
+            return None
+
+        logger.debug("sidecar hit: %s" % path)
+        self._hits += 1
+        return js
+
+    def store(self, source_path: Path, data: bytes, schema_version: str, js: object) -> Path:
+        path = self.sidecar_path(source_path)
+        self._folder.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=path.name, suffix=".tmp", dir=str(self._folder))
+        try:
+            with os.fdopen(fd, "wb") as fid:
+                fid.write(self._make_header(data=data, schema_version=schema_version))
+                marshal.dump(js, fid)
+            os.replace(tmp_path, str(path))
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        logger.debug("stored sidecar: %s" % path)
+        return path
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <folder: %s>\n" % self._folder
+        msg += "  <hits: %d>\n" % self._hits
+        msg += "  <misses: %d>\n" % self._misses
+        return msg
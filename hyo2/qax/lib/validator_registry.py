@@ -0,0 +1,91 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Optional
+from jsonschema import Draft7Validator
+
+logger = logging.getLogger(__name__)
+
+
+class ValidatorRegistry:
+    """Process-wide cache of compiled schema validators
+
+    Validators are keyed by schema path, modification time and schema version, so that
+    an edited schema file is transparently re-parsed and re-compiled on the next lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = dict()
+        self._hits = 0
+        self._misses = 0
+
+    @classmethod
+    def schema_version(cls, schema_path: Path) -> str:
+        # the schemas are stored in version-named folders (e.g., 'v0.1.3')
+        return Path(schema_path).parent.name.lstrip('v')
+
+    @classmethod
+    def make_key(cls, schema_path: Path) -> tuple:
+        schema_path = Path(schema_path).resolve()
+        return str(schema_path), schema_path.stat().st_mtime_ns, cls.schema_version(schema_path)
+
+    def validator(self, schema_path: Path, definition: Optional[str] = None) -> Draft7Validator:
+        """Return the compiled validator for the passed schema (SchemaError if the schema is invalid)
+
+        When a definition name is passed (e.g., 'check'), the validator only targets that sub-schema.
+        """
+        key = self.make_key(schema_path)
+        with self._lock:
+            entry = self._entries.get((key[0], definition))
+            if (entry is not None) and (entry[0] == key):
+                self._hits += 1
+                return entry[1]
+            self._misses += 1
+
+        if definition is None:
+            with open(key[0]) as fid:
+                schema = json.load(fid)
+            Draft7Validator.check_schema(schema)
+        else:
+            definitions = self.validator(schema_path).schema['definitions']
+            if definition not in definitions:
+                raise RuntimeError("unknown schema definition: %s" % definition)
+            schema = {"$ref": "#/definitions/%s" % definition, "definitions": definitions}
+        validator = Draft7Validator(schema)
+        logger.debug("compiled validator for %s#%s (v.%s)" % (key[0], definition or "", key[2]))
+
+        with self._lock:
+            self._entries[(key[0], definition)] = (key, validator)
+        return validator
+
+    def schema(self, schema_path: Path) -> dict:
+        return self.validator(schema_path).schema
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        msg = "<%s>\n" % self.__class__.__name__
+        msg += "  <validators: %d>\n" % len(self)
+        msg += "  <hits: %d>\n" % self._hits
+        msg += "  <misses: %d>\n" % self._misses
+        return msg
+
+
+validator_registry = ValidatorRegistry()
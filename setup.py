@@ -51,6 +51,8 @@ setup(
     extras_require={
         "QCTools": ["hyo2.qc"],
         "Mate": ["hyo2.mate"],
+        "FastJson": ["orjson"],
+        "Grids": ["h5py"],
     },
     python_requires='>=3.5',
     entry_points={
@@ -58,6 +60,7 @@ setup(
             'qax = hyo2.qax.app.gui:gui',
         ],
         "console_scripts": [
+            'qax_validate = hyo2.qax.lib.batch_validation:main',
         ],
     },
     test_suite="tests",
@@ -0,0 +1,72 @@
+import io
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from hyo2.qax.lib.batch_validation import QAJsonBatchValidator, _validate_job, json_pointer, main
+from hyo2.qax.lib.json_backend import json_backend
+from hyo2.qax.lib.qa_json import QAJson
+
+
+class TestBatchValidation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_folder = Path(tempfile.mkdtemp())
+        for path in QAJson.example_paths():
+            dst_path = self.tmp_folder.joinpath(path.parent.name, path.name)
+            dst_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(str(path), str(dst_path))
+
+        js = json_backend.loads(QAJson.example_paths()[-1].read_bytes())
+        js['qa']['survey_products']['checks'][1]['outputs']['execution']['status'] = "unknown"
+        self.tmp_folder.joinpath("invalid.json").write_bytes(json_backend.dumps(js))
+        self.tmp_folder.joinpath("broken.json").write_text("{")
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp_folder))
+
+    def test_json_pointer(self):
+        self.assertEqual(json_pointer(["qa", "a/b", "c~d", 0]), "/qa/a~1b/c~0d/0")
+
+    def test_validate_folder(self):
+        output = io.StringIO()
+        report = QAJsonBatchValidator(max_workers=2).validate_folder(self.tmp_folder, output=output)
+        self.assertEqual(report.nr_of_files, len(QAJson.example_paths()) + 2)
+        self.assertEqual(report.invalid, 1)
+        self.assertEqual(report.unreadable, 1)
+
+        results = {Path(result['path']).name: result
+                   for result in map(json_backend.loads, output.getvalue().splitlines())}
+        self.assertEqual(results['broken.json']['status'], "unreadable")
+        self.assertEqual(results['invalid.json']['status'], "invalid")
+        self.assertEqual(results['invalid.json']['pointer'],
+                         "/qa/survey_products/checks/1/outputs/execution/status")
+
+    def test_main(self):
+        output_path = self.tmp_folder.joinpath("results.jsonl")
+        self.assertEqual(main([str(self.tmp_folder), "-w", "0", "-o", str(output_path), "-p", "output.json"]), 0)
+        self.assertEqual(len(output_path.read_text().splitlines()), 2)
+
+    def test_unknown_schema_version(self):
+        # an explicit unknown version is rejected before the batch starts (no fallback to the latest schema)
+        with self.assertRaises(RuntimeError):
+            QAJsonBatchValidator(max_workers=0, schema_version="9.9.9")
+        output_path = self.tmp_folder.joinpath("results.jsonl")
+        self.assertEqual(main([str(self.tmp_folder), "-w", "0", "-o", str(output_path), "-s", "9.9.9"]), 2)
+        self.assertFalse(output_path.exists())
+        result = _validate_job((str(QAJson.example_paths()[-1]), "9.9.9"))
+        self.assertEqual(result['status'], "invalid")
+        self.assertIn("9.9.9", result['error'])
+        # without an explicit version, the files declaring an unknown version use the latest schema
+        js = json_backend.loads(QAJson.example_paths()[-1].read_bytes())
+        js['qa']['version'] = "9.9.9"
+        path = self.tmp_folder.joinpath("future.json")
+        path.write_bytes(json_backend.dumps(js))
+        self.assertEqual(_validate_job((str(path), None))['status'], "valid")
+
+
+def suite():
+    s = unittest.TestSuite()
+    s.addTests(unittest.TestLoader().loadTestsFromTestCase(TestBatchValidation))
+    return s
@@ -0,0 +1,49 @@
+import unittest
+
+from hyo2.qax.lib.check_index import CheckIndex
+from hyo2.qax.lib.qa_json import QAJson
+
+
+class TestCheckIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.qa_json = QAJson(path=QAJson.example_paths()[-1])
+        self.checks = self.qa_json.js['qa']['survey_products']['checks']
+
+    def test_query(self):
+        index = self.qa_json.index
+        self.assertEqual(len(index), len(self.checks))
+        self.assertEqual(index.query(qa_group="survey_products"), self.checks)
+        expected = [check for check in self.checks if check['info']['name'] == "Holiday Finder"]
+        self.assertEqual(index.query(name="Holiday Finder"), expected)
+        expected = [check for check in expected if check['info']['group']['id'] == "H12123"]
+        self.assertEqual(index.query(name="Holiday Finder", group_id="H12123"), expected)
+
+    def test_delete(self):
+        index = self.qa_json.index
+        doomed = index.keys(name="Holiday Finder")
+        remaining = [check for check in self.checks if check['info']['name'] != "Holiday Finder"]
+        self.assertEqual(index.delete(doomed), len(doomed))
+        self.assertEqual(self.qa_json.js['qa']['survey_products']['checks'], remaining)
+        self.assertEqual(index.keys(name="Holiday Finder"), list())
+        self.assertEqual(len(index), len(remaining))
+
+    def test_set_status(self):
+        index = self.qa_json.index
+        keys = index.keys(qa_group="survey_products")
+        index.set_status(keys, "queued")
+        self.assertEqual(index.keys(status="queued"), keys)
+        self.assertEqual(index.keys(status=["completed", "draft"]), list())
+
+    def test_rebuild_on_new_js(self):
+        index = self.qa_json.index
+        self.qa_json.js = {"qa": {"version": "0.1.3", "raw_data": {"checks": []}, "survey_products": {"checks": []}}}
+        self.assertIsNot(self.qa_json.index, index)
+        self.assertEqual(len(self.qa_json.index), 0)
+        self.assertIsInstance(self.qa_json.index, CheckIndex)
+
+
+def suite():
+    s = unittest.TestSuite()
+    s.addTests(unittest.TestLoader().loadTestsFromTestCase(TestCheckIndex))
+    return s
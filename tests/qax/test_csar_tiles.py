@@ -0,0 +1,171 @@
+import shutil
+import sqlite3
+import struct
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from hyo2.qax.lib.csar_tiles import CsarChunk, CsarTileReader
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+data_folder = Path(__file__).parents[2].joinpath("data", "input")
+
+
+def _rechunk(path: str, output_path: str, chunk_shape: tuple) -> None:
+    """Copy a single chunk CSAR grid, splitting the chunk of each band in chunks of the passed shape
+
+    The new chunk records are appended to the data file (with offsets obfuscated as in the source file), and the
+    band chunk tables and the chunk shape of the metadata are updated.
+    """
+    shutil.copyfile(path, output_path)
+    data = bytearray(Path(path + "0").read_bytes())
+    block_size, key = struct.unpack_from("<2I", data, 0x20)
+    conn = sqlite3.connect(output_path)
+
+    def _value(parent: str, name: str) -> bytes:
+        return conn.execute("SELECT value FROM master WHERE parent = ? AND name = ?", (parent, name)).fetchone()[0]
+
+    rows, cols = chunk_shape
+    for band in CsarTileReader.bands.values():
+        table = _value('/rg/master/bands/%s/cs/' % band, 'tableName')[4:].decode()
+        (offset, ), = conn.execute("SELECT o1 FROM \"%s\"" % table)
+        value = offset ^ key
+        position = (((value >> 32) | (value & 0xFFFFFFFF)) >> 10) * block_size
+        header = bytes(data[position:position + CsarChunk.header_size])
+        chunk = CsarChunk(offset=position, header=header)
+        values = chunk.decode(bytes(data[position + CsarChunk.header_size:
+                                         position + CsarChunk.header_size + chunk.nr_of_bytes]))
+        overhead = struct.unpack_from("<I", header, 4)[0] - chunk.nr_of_bytes
+        resolution = ((chunk.bbox[2] - chunk.bbox[0]) / (chunk.shape[1] - 1),
+                      (chunk.bbox[3] - chunk.bbox[1]) / (chunk.shape[0] - 1))
+        conn.execute("DELETE FROM \"%s\"" % table)
+        for nr, (row, col) in enumerate((row, col) for row in range(0, chunk.shape[0], rows)
+                                        for col in range(0, chunk.shape[1], cols)):
+            part = values[row:row + rows, col:col + cols]  # smaller at the last row and column
+            compressed = zlib.compress(part.tobytes())
+            record = bytearray(header)
+            struct.pack_into("<I", record, 4, len(compressed) + overhead)
+            struct.pack_into("<4d", record, 37, chunk.bbox[0] + col * resolution[0],
+                             chunk.bbox[1] + row * resolution[1],
+                             chunk.bbox[0] + (col + part.shape[1] - 1) * resolution[0],
+                             chunk.bbox[1] + (row + part.shape[0] - 1) * resolution[1])
+            struct.pack_into("<2I", record, 69, part.shape[1], part.shape[0])
+            struct.pack_into("<I", record, 105, len(compressed))
+            data.extend(bytes(-len(data) % block_size))
+            conn.execute("INSERT INTO \"%s\" (k1, k2, o1) VALUES (?, ?, ?)" % table,
+                         (struct.pack("<QQ", nr, 0), 0, ((len(data) // block_size) << 10) ^ key))
+            data.extend(record + compressed)
+    conn.execute("UPDATE master SET value = ? WHERE parent = '/rg/master/tileSize/' AND name = 'x'",
+                 (struct.pack("<I", cols), ))
+    conn.execute("UPDATE master SET value = ? WHERE parent = '/rg/master/tileSize/' AND name = 'y'",
+                 (struct.pack("<I", rows), ))
+    conn.commit()
+    conn.close()
+    Path(output_path + "0").write_bytes(bytes(data))
+
+
+class TestCsarTileReader(unittest.TestCase):
+
+    def setUp(self):
+        self.path = str(data_folder.joinpath("tiny_sr.csar"))
+
+    def test_default_tiles(self):
+        with CsarTileReader(self.path) as reader:
+            self.assertEqual(reader.shape, (87, 117))
+            self.assertEqual(reader.chunk_shape, (256, 256))
+            self.assertEqual(reader.tile_shape, (256, 256))  # the chunk shape
+            self.assertEqual(reader.resolution, (0.5, 0.5))
+            tiles = list(reader)
+            self.assertEqual(len(tiles), reader.nr_of_tiles)
+            self.assertEqual(tiles[0]['elevation'].shape, (87, 117))
+            self.assertEqual(tiles[0]['elevation'].dtype, np.float32)
+
+    @unittest.skipIf(h5py is None, "h5py is not available")
+    def test_same_as_bag(self):
+        with h5py.File(str(data_folder.joinpath("tiny_sr.bag")), "r") as fid:
+            elevation = fid['BAG_root/elevation'][:]
+            uncertainty = fid['BAG_root/uncertainty'][:]
+        covered = np.zeros(elevation.shape, dtype=int)
+        with CsarTileReader(self.path, tile_shape=(20, 30), halo=2, read_ahead=3, nr_of_threads=2) as reader:
+            self.assertEqual(reader.nr_of_tiles, 5 * 4)
+            for tile in reader.tiles():
+                window = (slice(tile.origin[0], tile.origin[0] + tile.window_shape[0]),
+                          slice(tile.origin[1], tile.origin[1] + tile.window_shape[1]))
+                np.testing.assert_array_equal(tile['elevation'], elevation[window])
+                np.testing.assert_array_equal(tile['uncertainty'], uncertainty[window])
+                covered[tile.row:tile.row + tile.shape[0], tile.col:tile.col + tile.shape[1]] += 1
+        # the cores cover each cell once
+        self.assertTrue(np.all(covered == 1))
+
+    @unittest.skipIf(h5py is None, "h5py is not available")
+    def test_load_grid(self):
+        with h5py.File(str(data_folder.joinpath("tiny_sr.bag")), "r") as fid:
+            elevation = fid['BAG_root/elevation'][:]
+        grid = CsarTileReader.load_grid(self.path)
+        self.assertEqual(sorted(grid), ["density", "elevation", "uncertainty"])
+        np.testing.assert_array_equal(grid['elevation'], elevation)
+        self.assertTrue(np.all(grid['density'][elevation != CsarTileReader.nodata] > 0))
+
+    @unittest.skipIf(h5py is None, "h5py is not available")
+    def test_several_chunks(self):
+        with h5py.File(str(data_folder.joinpath("tiny_sr.bag")), "r") as fid:
+            elevation = fid['BAG_root/elevation'][:]
+            uncertainty = fid['BAG_root/uncertainty'][:]
+        tmp_folder = Path(tempfile.mkdtemp())
+        try:
+            path = str(tmp_folder.joinpath("tiny_sr.csar"))
+            _rechunk(self.path, path, chunk_shape=(32, 40))
+            with CsarTileReader(path, tile_shape=(20, 30), halo=2, chunk_cache=0) as reader:
+                self.assertEqual(reader.chunk_shape, (32, 40))
+                for tile in reader.tiles():
+                    window = (slice(tile.origin[0], tile.origin[0] + tile.window_shape[0]),
+                              slice(tile.origin[1], tile.origin[1] + tile.window_shape[1]))
+                    np.testing.assert_array_equal(tile['elevation'], elevation[window])
+                    np.testing.assert_array_equal(tile['uncertainty'], uncertainty[window])
+            grid = CsarTileReader.load_grid(path)
+            np.testing.assert_array_equal(grid['elevation'], elevation)
+            np.testing.assert_array_equal(grid['density'], CsarTileReader.load_grid(self.path)['density'])
+        finally:
+            shutil.rmtree(str(tmp_folder))
+
+    def test_band_layers(self):
+        with CsarTileReader(self.path, layers=("Density", "elevation"), chunk_cache=0) as reader:
+            tile = reader.read_window(row=0, col=0, nr_rows=10, nr_cols=500)
+            self.assertEqual(tile.shape, (10, 117))
+            self.assertEqual(tile['Density'].dtype, np.int32)
+            empty = tile['elevation'] == reader.nodata
+            self.assertTrue(np.all(tile['Density'][empty] == reader.band_nodata['Density']))
+            self.assertTrue(np.all(tile['Density'][~empty] > 0))
+
+    def test_invalid(self):
+        with self.assertRaises(RuntimeError):
+            CsarTileReader(self.path, halo=-1)
+        with self.assertRaises(RuntimeError):
+            CsarTileReader(self.path, read_ahead=0)
+        with self.assertRaises(RuntimeError):
+            CsarTileReader(self.path, layers=("missing", ))
+        # variable resolution
+        with self.assertRaises(RuntimeError):
+            CsarTileReader(str(data_folder.joinpath("tiny_vr.csar")))
+        tmp_folder = Path(tempfile.mkdtemp())
+        try:
+            # missing data file
+            path = tmp_folder.joinpath("tiny_sr.csar")
+            shutil.copyfile(self.path, str(path))
+            with self.assertRaises(RuntimeError):
+                CsarTileReader(str(path))
+        finally:
+            shutil.rmtree(str(tmp_folder))
+
+
+def suite():
+    s = unittest.TestSuite()
+    s.addTests(unittest.TestLoader().loadTestsFromTestCase(TestCsarTileReader))
+    return s
@@ -0,0 +1,291 @@
+import functools
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from hyo2.qax.lib.check_index import CheckIndex
+from hyo2.qax.lib.executor import CancellationToken, CheckExecutor, CheckRunnerRegistry, check_staging_folder
+from hyo2.qax.lib.holidays import HolidayFinder
+from hyo2.qax.lib.json_backend import json_backend
+from hyo2.qax.lib.qa_json import QAJson
+from hyo2.qax.lib.scheduler import CheckScheduler, GridLoaderRegistry
+from hyo2.qax.lib.shared_grid import SharedGrid, SharedGridPool
+
+data_folder = Path(__file__).parents[2].joinpath("data", "input")
+loaded_paths = list()
+
+
+def _load_grid(path: str) -> dict:
+    loaded_paths.append(path)
+    return {'path': path}
+
+
+def _load_shared_grid(load_log: str, path: str) -> dict:
+    with open(load_log, "a") as fod:
+        fod.write(path + "\n")
+    return {'depth': np.full((8, 8), 10.0, dtype=np.float32), 'uncertainty': np.ones((8, 8), dtype=np.float32)}
+
+
+def _sum_depths(check: dict, grids: dict) -> dict:
+    return {'count': int(sum(grid['depth'].sum() for grid in grids.values()))}
+
+
+def _count_grids(check: dict, grids: dict) -> dict:
+    return {'count': len(grids)}
+
+
+def _count_cells(check: dict, grids: dict) -> dict:
+    return {'count': sum(grid['elevation'].size for grid in grids.values())}
+
+
+def _write_report(check: dict, grids: dict) -> dict:
+    path = Path(check_staging_folder()).joinpath("report.txt")
+    path.write_text("%d grids" % len(grids))
+    return {'count': len(grids), 'files': [{'path': str(path)}]}
+
+
+def _raise_error(check: dict, grids: dict) -> dict:
+    raise RuntimeError("broken check")
+
+
+def _crash(check: dict, grids: dict) -> dict:
+    os._exit(3)
+
+
+def _hang(check: dict, grids: dict) -> dict:
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    time.sleep(60.0)
+    return dict()
+
+
+def _hang_if_limited(check: dict, grids: dict) -> dict:
+    if 'timeout' in check['params']:
+        _hang(check, grids)
+    return {'count': len(grids)}
+
+
+class TestCheckExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.js = json_backend.loads(QAJson.catalog().schema_path().parent.joinpath("qc_tools.json").read_bytes())
+        self.index = CheckIndex(js=self.js)
+        self.keys = self.index.keys(qa_group="survey_products")
+        self.registry = CheckRunnerRegistry()
+        self.registry.register("Holiday Finder", _count_grids)
+        self.registry.register("Flier Finder", _raise_error)
+        self.registry.register("Grid Data Density", _count_grids)
+        self.loaders = GridLoaderRegistry()
+        self.loaders.register(".BAG", _load_grid)
+        loaded_paths.clear()
+
+    def _execute(self, max_workers: int) -> dict:
+        executor = CheckExecutor(max_workers=max_workers, registry=self.registry, loaders=self.loaders,
+                                 poll_interval=0.05)
+        self.started = list()
+        executor.started = self.started.append
+        return executor.execute(index=self.index, keys=self.keys)
+
+    def test_schedule(self):
+        scheduler = CheckScheduler(size_estimator=lambda path: 100)
+        keys = self.index.keys(name=["Holiday Finder", "Flier Finder", "Grid Data Density"])
+        jobs = scheduler.schedule(index=self.index, keys=keys)
+        self.assertEqual(len(jobs), 4)
+        self.assertEqual(sum(len(job) for job in jobs), len(keys))
+        self.assertEqual([job.peak_bytes for job in jobs], [100] * 4)
+        self.assertEqual(scheduler.peak_memory_bound(jobs=jobs, max_workers=2), 200)
+
+        job = max(jobs, key=len)
+        self.assertEqual(len(job), 3)
+        self.assertEqual(job.releases(job.keys[-1]), job.paths)
+
+    def test_execute(self):
+        draft = {key: self.index.get(key)['outputs'] for key in self.index.keys(name="Filer Finder")}
+        summary = self._execute(max_workers=2)
+        self.assertEqual(len(self.started), len(self.keys) - summary["skipped"])
+        self.assertEqual(summary["completed"], len(self.index.keys(name=["Holiday Finder", "Grid Data Density"])))
+        self.assertEqual(summary["failed"], len(self.index.keys(name="Flier Finder")))
+        # the checks without a runner are left unchanged
+        self.assertEqual(summary["skipped"], len(draft))
+        self.assertEqual({key: self.index.get(key)['outputs'] for key in draft}, draft)
+
+        for key in self.index.keys(name="Holiday Finder"):
+            outputs = self.index.get(key)['outputs']
+            self.assertEqual(outputs['execution']['status'], "completed")
+            self.assertEqual(outputs['count'], 1)
+            self.assertLessEqual(outputs['execution']['start'], outputs['execution']['end'])
+            self.assertGreaterEqual(outputs['execution']['metrics']['wall_time'], 0.0)
+            self.assertIn('cpu_time', outputs['execution']['metrics'])
+        self.assertTrue(QAJson.validate_qa_obj(qa=self.js, schema_path=QAJson.catalog().schema_path()))
+
+    def test_execute_serial(self):
+        summary = self._execute(max_workers=0)
+        self.assertEqual(summary["completed"], len(self.index.keys(name=["Holiday Finder", "Grid Data Density"])))
+        self.assertEqual(self.index.keys(status=["queued", "running"]), list())
+        # each grid is loaded once, even when shared by several checks
+        self.assertEqual(len(loaded_paths), 4)
+        self.assertEqual(len(set(loaded_paths)), 4)
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "the peak RSS is reset only on Linux")
+    def test_peak_rss(self):
+        # the memory of the caller is not accounted to the checks running in the workers
+        ballast = np.ones(200 * 1024 * 1024 // 8)
+        self._execute(max_workers=1)
+        for key in self.index.keys(name="Holiday Finder"):
+            peak = self.index.get(key)['outputs']['execution']['metrics']['peak_rss']
+            self.assertGreater(peak, 0)
+            self.assertLess(peak, ballast.nbytes)
+        # not measured for the checks running in the process of the caller
+        self._execute(max_workers=0)
+        for key in self.index.keys(name="Holiday Finder"):
+            self.assertIsNone(self.index.get(key)['outputs']['execution']['metrics']['peak_rss'])
+        self.assertTrue(QAJson.validate_qa_obj(qa=self.js, schema_path=QAJson.catalog().schema_path()))
+
+    def test_shared_grid(self):
+        grid = SharedGrid.create({'depth': np.arange(6, dtype=np.float64).reshape(2, 3)})
+        attached = SharedGrid.attach(grid.descriptor)
+        self.assertEqual(attached['depth'][1, 2], 5.0)
+        self.assertFalse(attached['depth'].flags.writeable)
+        grid['depth'][1, 2] = 7.0
+        self.assertEqual(attached['depth'][1, 2], 7.0)  # zero-copy
+        attached.close()
+
+        pool = SharedGridPool()
+        pool.add("grid.bag", grid.descriptor, consumers=2)
+        pool.release("grid.bag")
+        self.assertIn("grid.bag", pool)
+        pool.release("grid.bag")
+        self.assertNotIn("grid.bag", pool)
+        with self.assertRaises(FileNotFoundError):
+            SharedGrid.attach(grid.descriptor)
+        grid.close()
+
+    def test_execute_shared_memory(self):
+        tmp_folder = Path(tempfile.mkdtemp())
+        load_log = str(tmp_folder.joinpath("loads.txt"))
+        self.registry.register("Holiday Finder", _sum_depths)
+        self.registry.register("Grid Data Density", _sum_depths)
+        self.loaders.register(".bag", functools.partial(_load_shared_grid, load_log))
+
+        executor = CheckExecutor(max_workers=2, registry=self.registry, loaders=self.loaders, shared_memory=True,
+                                 poll_interval=0.05)
+        summary = executor.execute(index=self.index, keys=self.keys)
+        self.assertEqual(summary["completed"], len(self.index.keys(name=["Holiday Finder", "Grid Data Density"])))
+        for key in self.index.keys(name="Holiday Finder"):
+            self.assertEqual(self.index.get(key)['outputs']['count'], 640)
+            self.assertEqual(self.index.get(key)['outputs']['execution']['metrics']['cells'], 64)
+        loads = Path(load_log).read_text().splitlines()
+        self.assertEqual(len(loads), 4)
+        self.assertEqual(len(set(loads)), 4)
+        os.remove(load_log)
+        tmp_folder.rmdir()
+
+    def test_default_loaders(self):
+        # the BAG and CSAR inputs are loaded (once) by the default grid loaders
+        self.registry.register("Holiday Finder", _count_cells)
+        keys = self.index.keys(name="Holiday Finder")
+        for nr, key in enumerate(keys):
+            path = data_folder.joinpath("tiny_sr.bag" if nr % 2 else "tiny_sr.csar")
+            self.index.get(key)['inputs']['files'][0]['path'] = str(path)
+        executor = CheckExecutor(max_workers=1, registry=self.registry, poll_interval=0.05)
+        summary = executor.execute(index=self.index, keys=keys)
+        self.assertEqual(summary["completed"], len(keys))
+        for key in keys:
+            self.assertEqual(self.index.get(key)['outputs']['count'], 87 * 117)
+            self.assertEqual(self.index.get(key)['outputs']['execution']['metrics']['cells'], 87 * 117)
+
+    def test_shared_holidays(self):
+        # the default Holiday Finder runner consumes the grids loaded once in shared memory
+        keys = self.index.keys(name="Holiday Finder")
+        for nr, key in enumerate(keys):
+            path = data_folder.joinpath("tiny_sr.bag" if nr % 2 else "tiny_sr.csar")
+            self.index.get(key)['inputs']['files'][0]['path'] = str(path)
+        expected = len(HolidayFinder().find(str(data_folder.joinpath("tiny_sr.bag"))))
+        executor = CheckExecutor(max_workers=2, shared_memory=True, poll_interval=0.05)
+        summary = executor.execute(index=self.index, keys=keys)
+        self.assertEqual(summary["completed"], len(keys))
+        for key in keys:
+            self.assertEqual(self.index.get(key)['outputs']['count'], expected)
+            self.assertEqual(self.index.get(key)['outputs']['execution']['metrics']['cells'], 87 * 117)
+
+    def test_dispatch_error(self):
+        # the output files cannot be moved to the output folder (a file): only the checks with files fail
+        self.registry.register("Holiday Finder", _write_report)
+        tmp_folder = Path(tempfile.mkdtemp())
+        try:
+            output_folder = tmp_folder.joinpath("output")
+            output_folder.write_bytes(b"")
+            executor = CheckExecutor(max_workers=2, registry=self.registry, loaders=self.loaders, poll_interval=0.05,
+                                     staging_folder=tmp_folder.joinpath("staging"), output_folder=output_folder)
+            with self.assertLogs("hyo2.qax.lib.executor", level="WARNING") as logs:
+                summary = executor.execute(index=self.index, keys=self.keys)
+        finally:
+            shutil.rmtree(str(tmp_folder))
+        holiday_finder = self.index.keys(name="Holiday Finder")
+        self.assertEqual(self.index.keys(name="Holiday Finder", status="failed"), holiday_finder)
+        # the workers are not mistaken for crashed ones: the other checks of their jobs complete
+        self.assertEqual(summary["completed"], len(self.index.keys(name="Grid Data Density")))
+        self.assertFalse(any("worker exit code" in line for line in logs.output))
+
+    def test_worker_crash(self):
+        self.registry.register("Grid Data Density", _crash)
+        summary = self._execute(max_workers=2)
+        # the checks queued after a crashing one in the same grid job do not complete
+        self.assertEqual(summary["completed"], 3)
+        self.assertLess(len(self.started), len(self.keys))
+        self.assertEqual(self.index.keys(status=["queued", "running"]), list())
+
+    def test_timeout(self):
+        self.registry.register("Grid Data Density", _hang)
+        executor = CheckExecutor(max_workers=2, registry=self.registry, loaders=self.loaders, timeout=0.5,
+                                 grace_period=0.1, poll_interval=0.05)
+        start = time.monotonic()
+        summary = executor.execute(index=self.index, keys=self.keys)
+        self.assertLess(time.monotonic() - start, 10.0)
+        self.assertEqual(summary["aborted"], len(self.index.keys(name="Grid Data Density")))
+        # the checks sharing a job with the stuck ones are re-queued
+        self.assertEqual(summary["completed"], len(self.index.keys(name="Holiday Finder")))
+
+    def test_check_timeout(self):
+        self.registry.register("Holiday Finder", _hang_if_limited)
+        limited = self.index.keys(name="Holiday Finder")[0]
+        self.index.get(limited)['params']['timeout'] = 0.5
+        executor = CheckExecutor(max_workers=2, registry=self.registry, loaders=self.loaders, grace_period=0.1,
+                                 poll_interval=0.05)
+        self.assertEqual(executor.check_timeout(self.index.get(limited)), 0.5)
+        self.assertIsNone(executor.check_timeout(self.index.get(self.index.keys(name="Holiday Finder")[1])))
+        start = time.monotonic()
+        summary = executor.execute(index=self.index, keys=self.keys)
+        self.assertLess(time.monotonic() - start, 10.0)
+        # only the check with its own timeout is aborted, the other ones (without limit) complete
+        self.assertEqual(summary["aborted"], 1)
+        self.assertEqual(self.index.get(limited)['outputs']['execution']['status'], "aborted")
+        self.assertEqual(summary["completed"], len(self.index.keys(name=["Holiday Finder", "Grid Data Density"])) - 1)
+
+    def test_cancel(self):
+        self.registry.register("Holiday Finder", _hang)
+        token = CancellationToken()
+        timer = threading.Timer(0.5, token.cancel)
+        timer.start()
+        executor = CheckExecutor(max_workers=2, registry=self.registry, loaders=self.loaders, grace_period=0.1,
+                                 poll_interval=0.05)
+        start = time.monotonic()
+        summary = executor.execute(index=self.index, keys=self.keys, token=token)
+        timer.join()
+        self.assertLess(time.monotonic() - start, 10.0)
+        self.assertEqual(self.index.keys(status=["queued", "running"]), list())
+        self.assertEqual(self.index.keys(name="Holiday Finder", status="completed"), list())
+        self.assertGreater(summary["aborted"], 0)
+
+
+def suite():
+    s = unittest.TestSuite()
+    s.addTests(unittest.TestLoader().loadTestsFromTestCase(TestCheckExecutor))
+    return s
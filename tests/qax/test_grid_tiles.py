@@ -0,0 +1,145 @@
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from hyo2.qax.lib.grid_tiles import BagTileReader, VrRefinementReader
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+data_folder = Path(__file__).parents[2].joinpath("data", "input")
+
+
+def _count_valid_nodes(path: str, rows: tuple) -> int:
+    with VrRefinementReader(path) as reader:
+        return sum(int(np.sum(refinement['elevation'] != reader.nodata)) for refinement in reader.refinements(rows))
+
+
+@unittest.skipIf(h5py is None, "h5py is not available")
+class TestBagTileReader(unittest.TestCase):
+
+    def setUp(self):
+        self.path = str(data_folder.joinpath("tiny_sr.bag"))
+        with h5py.File(self.path, "r") as fid:
+            self.elevation = fid['BAG_root/elevation'][:]
+            self.uncertainty = fid['BAG_root/uncertainty'][:]
+
+    def test_default_tiles(self):
+        with BagTileReader(self.path) as reader:
+            self.assertEqual(reader.shape, (87, 117))
+            self.assertEqual(reader.tile_shape, (87, 87))  # the chunk shape
+            self.assertEqual(len(list(reader)), reader.nr_of_tiles)
+            self.assertEqual(reader.nr_of_tiles, 2)
+
+    def test_tiles_with_halo(self):
+        elevation = np.zeros_like(self.elevation)
+        with BagTileReader(self.path, tile_shape=(20, 30), halo=2) as reader:
+            self.assertEqual(reader.nr_of_tiles, 5 * 4)
+            for tile in reader.tiles():
+                rows, cols = tile.core_slices
+                window = (slice(tile.origin[0], tile.origin[0] + tile.window_shape[0]),
+                          slice(tile.origin[1], tile.origin[1] + tile.window_shape[1]))
+                np.testing.assert_array_equal(tile['elevation'], self.elevation[window])
+                np.testing.assert_array_equal(tile['uncertainty'], self.uncertainty[window])
+                self.assertLessEqual(rows.start, 2)
+                self.assertLessEqual(cols.start, 2)
+                elevation[tile.row:tile.row + tile.shape[0], tile.col:tile.col + tile.shape[1]] += tile.core('elevation')
+        # the cores cover each cell once
+        np.testing.assert_array_equal(elevation, self.elevation)
+
+    def test_invalid(self):
+        with self.assertRaises(RuntimeError):
+            BagTileReader(self.path, halo=-1)
+        with self.assertRaises(RuntimeError):
+            BagTileReader(self.path, layers=("missing", ))
+
+
+@unittest.skipIf(h5py is None, "h5py is not available")
+class TestVrRefinementReader(unittest.TestCase):
+
+    def setUp(self):
+        self.path = str(data_folder.joinpath("tiny_vr.bag"))
+        with h5py.File(self.path, "r") as fid:
+            self.nodes = fid['BAG_root/varres_refinements'][0, :]
+            self.metadata = fid['BAG_root/varres_metadata'][:]
+
+    def test_refinements(self):
+        with VrRefinementReader(self.path) as reader:
+            self.assertEqual(reader.shape, (2, 2))
+            self.assertEqual(reader.resolution, (32.0, 32.0))
+            refinements = list(reader)
+        self.assertEqual([(refinement.row, refinement.col) for refinement in refinements],
+                         [(0, 0), (0, 1), (1, 0), (1, 1)])
+        for refinement in refinements:
+            metadata = self.metadata[refinement.row, refinement.col]
+            start = int(metadata['index'])
+            depths = self.nodes['depth'][start:start + 64 * 64].reshape(64, 64)
+            np.testing.assert_array_equal(refinement['elevation'], depths)
+            self.assertEqual(refinement.resolution, (0.5, 0.5))
+        # the refinement nodes are within their supergrid cell, centered on the supergrid node
+        self.assertAlmostEqual(refinements[0].origin[0], 361180.61 - 16.0 + 0.25, places=2)
+        self.assertAlmostEqual(refinements[3].y[-1], 4769770.58 + 16.0 - 0.25, places=2)
+
+    def test_batches(self):
+        with VrRefinementReader(self.path) as reader:
+            self.assertEqual([len(batch) for batch in reader.batches(batch_size=3)], [3, 1])
+            self.assertEqual([len(batch) for batch in reader.batches(batch_size=3, rows=(1, 2))], [2])
+
+    def test_out_of_order(self):
+        tmp_folder = Path(tempfile.mkdtemp())
+        try:
+            # the refinements stored in a different order than the supergrids
+            path = str(tmp_folder.joinpath("tiny_vr.bag"))
+            shutil.copyfile(self.path, path)
+            order = [(1, 1), (0, 0), (0, 1), (1, 0)]
+            with h5py.File(path, "r+") as fid:
+                nodes = fid['BAG_root/varres_refinements']
+                metadata = fid['BAG_root/varres_metadata']
+                for position, (row, col) in enumerate(order):
+                    start = int(self.metadata[row, col]['index'])
+                    nodes[0, position * 64 * 64:(position + 1) * 64 * 64] = self.nodes[start:start + 64 * 64]
+                    item = metadata[row, col]
+                    item['index'] = position * 64 * 64
+                    metadata[row, col] = item
+
+            read = list()
+            with VrRefinementReader(path) as reader:
+                refinements = reader._refinements
+
+                class _Recorder:
+                    def __getitem__(self, item):
+                        values = refinements[item]
+                        read.append(values.size)
+                        return values
+
+                reader._refinements = _Recorder()
+                batch = next(reader.batches(batch_size=4, rows=(1, 2)))
+            # each refinement is read on its own (not the span between them)
+            self.assertEqual(read, [64 * 64, 64 * 64])
+            for refinement in batch:
+                start = int(self.metadata[refinement.row, refinement.col]['index'])
+                depths = self.nodes['depth'][start:start + 64 * 64].reshape(64, 64)
+                np.testing.assert_array_equal(refinement['elevation'], depths)
+        finally:
+            shutil.rmtree(str(tmp_folder))
+
+    def test_parallel(self):
+        with VrRefinementReader(self.path) as reader:
+            partitions = reader.partitions(nr_of_parts=2)
+            self.assertEqual(partitions, [(0, 1), (1, 2)])
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            counts = list(executor.map(_count_valid_nodes, [self.path] * len(partitions), partitions))
+        self.assertEqual(sum(counts), int(np.sum(self.nodes['depth'] != VrRefinementReader.nodata)))
+
+
+def suite():
+    s = unittest.TestSuite()
+    s.addTests(unittest.TestLoader().loadTestsFromTestCase(TestBagTileReader))
+    s.addTests(unittest.TestLoader().loadTestsFromTestCase(TestVrRefinementReader))
+    return s
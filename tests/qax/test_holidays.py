@@ -0,0 +1,117 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from hyo2.qax.lib.executor import check_runners
+from hyo2.qax.lib.grid_tiles import BagTileReader, GridTile
+from hyo2.qax.lib.holidays import Holiday, HolidayFinder
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+data_folder = Path(__file__).parents[2].joinpath("data", "input")
+
+
+def _tiles(grid: np.ndarray, tile_shape: tuple) -> list:
+    tiles = list()
+    for row in range(0, grid.shape[0], tile_shape[0]):
+        for col in range(0, grid.shape[1], tile_shape[1]):
+            end = (min(row + tile_shape[0], grid.shape[0]), min(col + tile_shape[1], grid.shape[1]))
+            origin = (max(row - 1, 0), max(col - 1, 0))
+            window = grid[origin[0]:end[0] + 1, origin[1]:end[1] + 1]
+            tiles.append(GridTile(row=row, col=col, shape=(end[0] - row, end[1] - col), origin=origin,
+                                  layers={'elevation': window}))
+    return tiles
+
+
+class TestHolidayFinder(unittest.TestCase):
+
+    def test_label(self):
+        empty = np.array([[1, 1, 0, 1],
+                          [0, 1, 0, 1],
+                          [1, 1, 0, 0],
+                          [0, 0, 1, 1]], dtype=bool)
+        labels = HolidayFinder.label(empty)
+        np.testing.assert_array_equal(labels, [[0, 0, -1, 3],
+                                               [-1, 0, -1, 3],
+                                               [0, 0, -1, -1],
+                                               [-1, -1, 14, 14]])
+
+    def test_holidays(self):
+        empty = np.zeros((6, 7), dtype=bool)
+        empty[1:3, 1:3] = True
+        empty[4, 4] = True
+        empty[5, 0] = True  # on the border
+        finder = HolidayFinder()
+        self.assertEqual(finder.reference(empty), [Holiday(1, 1, 4), Holiday(4, 4, 1)])
+        self.assertEqual(HolidayFinder(min_size=2).reference(empty), [Holiday(1, 1, 4)])
+
+    def test_tiles_match_reference(self):
+        rng = np.random.default_rng(7)
+        for tile_shape in [(1, 1), (3, 5), (8, 8), (64, 64)]:
+            for probability in [0.2, 0.45, 0.6]:
+                empty = rng.random((37, 53)) < probability
+                grid = np.where(empty, 1000000.0, -10.0).astype(np.float32)
+                finder = HolidayFinder(tile_shape=tile_shape)
+                components = [finder.tile_components(tile, shape=grid.shape, nodata=1000000.0)
+                              for tile in _tiles(grid, tile_shape)]
+                self.assertEqual(finder.merge(components, shape=grid.shape), finder.reference(empty))
+                self.assertEqual(finder.find_grid({'elevation': grid}, nodata=1000000.0), finder.reference(empty))
+
+    @unittest.skipIf(h5py is None, "h5py is not available")
+    def test_sample_grids(self):
+        tmp_folder = Path(tempfile.mkdtemp())
+        try:
+            path = tmp_folder.joinpath("tiny_sr.bag")
+            shutil.copyfile(str(data_folder.joinpath("tiny_sr.bag")), str(path))
+            with h5py.File(str(path), "r+") as fid:
+                elevation = fid['BAG_root/elevation']
+                empty = elevation[:] == 1000000.0
+                # holidays across the tile boundaries
+                for row, col in [(19, 29), (40, 58), (60, 88)]:
+                    empty[row:row + 2, col:col + 3] = True
+                elevation[...] = np.where(empty, 1000000.0, elevation[:])
+
+            finder = HolidayFinder(tile_shape=(20, 30), max_workers=2)
+            reference = finder.reference(empty)
+            self.assertGreaterEqual(len(reference), 3)
+            self.assertEqual(finder.find(str(path)), reference)
+            self.assertEqual(finder.find_grid(BagTileReader.load_grid(str(path))), reference)
+            # the original grid and its CSAR twin
+            with h5py.File(str(data_folder.joinpath("tiny_sr.bag")), "r") as fid:
+                empty = fid['BAG_root/elevation'][:] == 1000000.0
+            reference = finder.reference(empty)
+            self.assertEqual(finder.find(str(data_folder.joinpath("tiny_sr.bag"))), reference)
+            self.assertEqual(finder.find(str(data_folder.joinpath("tiny_sr.csar"))), reference)
+        finally:
+            shutil.rmtree(str(tmp_folder))
+
+    @unittest.skipIf(h5py is None, "h5py is not available")
+    def test_runner(self):
+        paths = [str(data_folder.joinpath("tiny_sr.bag")), str(data_folder.joinpath("tiny_sr.csar"))]
+        nr_of_holidays = len(HolidayFinder().find(paths[0]))
+        runner = check_runners.get("Holiday Finder")
+        self.assertIsNotNone(runner)
+        outputs = runner({'info': {'name': "Holiday Finder"}, 'params': {}}, {path: path for path in paths})
+        self.assertEqual(outputs['count'], 2 * nr_of_holidays)
+        # the loaded grids are not read again
+        outputs = runner({'info': {'name': "Holiday Finder"}, 'params': {}},
+                         {path: {'elevation': np.zeros((8, 8), dtype=np.float32)} for path in paths})
+        self.assertEqual(outputs['count'], 0)
+
+    def test_invalid(self):
+        with self.assertRaises(RuntimeError):
+            HolidayFinder(min_size=0)
+        with self.assertRaises(RuntimeError):
+            HolidayFinder(tile_shape=(0, 10))
+
+
+def suite():
+    s = unittest.TestSuite()
+    s.addTests(unittest.TestLoader().loadTestsFromTestCase(TestHolidayFinder))
+    return s
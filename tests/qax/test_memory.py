@@ -0,0 +1,97 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from hyo2.qax.lib.check_index import CheckIndex
+from hyo2.qax.lib.executor import CheckExecutor, CheckRunnerRegistry
+from hyo2.qax.lib.json_backend import json_backend
+from hyo2.qax.lib.memory import GridMemoryEstimator, MemoryCalibration, reset_peak_rss
+from hyo2.qax.lib.qa_json import QAJson
+from hyo2.qax.lib.scheduler import CheckScheduler, GridLoaderRegistry
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+data_folder = Path(__file__).parents[2].joinpath("data", "input")
+
+
+def _count_grids(check: dict, grids: dict) -> dict:
+    return {'count': len(grids)}
+
+
+class TestMemory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_folder = Path(tempfile.mkdtemp())
+        self.js = json_backend.loads(QAJson.catalog().schema_path().parent.joinpath("qc_tools.json").read_bytes())
+        self.index = CheckIndex(js=self.js)
+        self.keys = self.index.keys(name=["Holiday Finder", "Grid Data Density"])
+        self.registry = CheckRunnerRegistry()
+        self.registry.register("Holiday Finder", _count_grids)
+        self.registry.register("Grid Data Density", _count_grids)
+        self.loaders = GridLoaderRegistry()  # the (missing) grids are not loaded
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp_folder))
+
+    @unittest.skipIf(h5py is None, "h5py is not available")
+    def test_estimate_bag(self):
+        path = str(data_folder.joinpath("tiny_sr.bag"))
+        self.assertEqual(GridMemoryEstimator.decoded_bytes(path), 81432)
+        self.assertEqual(GridMemoryEstimator(working_factor=2.0).estimate(path), 2 * 81432)
+
+    def test_estimate_csar(self):
+        self.assertEqual(GridMemoryEstimator.decoded_bytes(str(data_folder.joinpath("tiny_sr.csar"))), 122148)
+        # no base dimensions in the header: the file size is used
+        path = data_folder.joinpath("tiny_vr.csar")
+        self.assertIsNone(GridMemoryEstimator.decoded_bytes(str(path)))
+        self.assertEqual(GridMemoryEstimator(fallback_factor=3.0).estimate(str(path)), 3 * path.stat().st_size)
+        self.assertEqual(GridMemoryEstimator().estimate(str(self.tmp_folder.joinpath("missing.bag"))), 0)
+
+    def test_calibration(self):
+        calibration = MemoryCalibration.for_folder(self.tmp_folder)
+        executor = CheckExecutor(max_workers=2, registry=self.registry, loaders=self.loaders, calibration=calibration,
+                                 poll_interval=0.05, scheduler=CheckScheduler(size_estimator=lambda path: 1000))
+        summary = executor.execute(index=self.index, keys=self.keys)
+        records = list(calibration.records())
+        self.assertLessEqual(len(records), summary["completed"])
+        self.assertEqual({record['estimated'] for record in records}, {1000} if records else set())
+        if reset_peak_rss():
+            self.assertEqual(len(records), summary["completed"])
+            self.assertEqual(calibration.summary()["Holiday Finder"][0], len(self.index.keys(name="Holiday Finder")))
+
+        # no sample without a peak of the check alone, and the records of the older versions are ignored
+        calibration.record(name="Holiday Finder", estimated=1000, peak=None)
+        with open(str(calibration.path), "ab") as fid:
+            fid.write(json_backend.dumps({"name": "Holiday Finder", "estimated": 1000, "peak_rss": 10 ** 9}) + b"\n")
+        self.assertEqual(list(calibration.records()), records)
+        executor.max_workers = 0
+        executor.execute(index=self.index, keys=self.keys)
+        self.assertEqual(list(calibration.records()), records)
+
+    def test_memory_budget(self):
+        running = set()
+        self.max_running = 0
+
+        def _started(key: int) -> None:
+            running.add(key)
+            self.max_running = max(self.max_running, len(running))
+
+        executor = CheckExecutor(max_workers=2, registry=self.registry, loaders=self.loaders, memory_budget=150,
+                                 poll_interval=0.05, scheduler=CheckScheduler(size_estimator=lambda path: 100))
+        executor.started = _started
+        executor.finished = lambda key, status: running.discard(key)
+        summary = executor.execute(index=self.index, keys=self.keys)
+        self.assertEqual(summary["completed"], len(self.keys))
+        # the jobs (100 bytes each) do not fit together in the budget
+        self.assertEqual(self.max_running, 1)
+        self.assertEqual(executor.peak_memory_bound, 150)
+
+
+def suite():
+    s = unittest.TestSuite()
+    s.addTests(unittest.TestLoader().loadTestsFromTestCase(TestMemory))
+    return s
@@ -0,0 +1,58 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from hyo2.qax.lib.json_backend import json_backend
+from hyo2.qax.lib.migration import QAJsonMigration, QAJsonMigrator
+from hyo2.qax.lib.qa_json import QAJson
+
+
+class TestMigration(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_folder = Path(tempfile.mkdtemp())
+        self.input_folder = self.tmp_folder.joinpath("input")
+        for path in QAJson.example_paths():
+            dst_path = self.input_folder.joinpath(path.parent.name, path.name)
+            dst_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(str(path), str(dst_path))
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp_folder))
+
+    def test_migrate(self):
+        js = json_backend.loads(self.input_folder.joinpath("v0.1.1", "output.json").read_bytes())
+        self.assertEqual(QAJsonMigration.chain("0.1.1", "0.1.3"), [("0.1.1", "0.1.2"), ("0.1.2", "0.1.3")])
+        self.assertEqual(QAJsonMigration.chain("0.1.3", "0.1.4"), [("0.1.3", "0.1.4")])
+        self.assertTrue(QAJsonMigration.migrate(js))
+        self.assertEqual(QAJsonMigration.detect_version(js), "0.1.4")
+        outputs = js['qa']['survey_products']['checks'][0]['outputs']
+        self.assertEqual(outputs['execution']['status'], "completed")
+        self.assertEqual(outputs['percentage'], 99.6)
+        self.assertFalse(QAJsonMigration.migrate(js))
+
+    def test_migrate_folder(self):
+        nr_of_outdated = len([path for path in QAJson.example_paths()
+                              if path.parent.name != "v%s" % QAJsonMigration.latest_version()])
+        source = self.input_folder.joinpath("v0.1.2", "output.json").read_bytes()
+        output_folder = self.tmp_folder.joinpath("output")
+        report = QAJsonMigrator(max_workers=2).migrate_folder(self.input_folder, output_folder=output_folder)
+        self.assertEqual(len(report.migrated), nr_of_outdated)
+        self.assertEqual(len(report.unchanged), len(QAJson.example_paths()) - nr_of_outdated)
+        self.assertEqual(len(report.failed), 0)
+        self.assertEqual(self.input_folder.joinpath("v0.1.2", "output.json").read_bytes(), source)
+        QAJson(path=output_folder.joinpath("v0.1.2", "output.json"))
+
+    def test_migrate_in_place(self):
+        self.input_folder.joinpath("broken.json").write_text("{")
+        report = QAJsonMigrator(max_workers=0).migrate_folder(self.input_folder, in_place=True)
+        self.assertEqual(len(report.migrated), 5)
+        self.assertEqual(len(report.failed), 1)
+        QAJson(path=self.input_folder.joinpath("v0.1.1", "output.json"))
+
+
+def suite():
+    s = unittest.TestSuite()
+    s.addTests(unittest.TestLoader().loadTestsFromTestCase(TestMigration))
+    return s
@@ -0,0 +1,240 @@
+import asyncio
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from hyo2.qax.lib.executor import check_runners, check_staging_folder
+from hyo2.qax.lib.journal import QACheckpoint, QAJournal
+from hyo2.qax.lib.json_backend import json_backend
+from hyo2.qax.lib.migration import QAJsonMigration
+from hyo2.qax.lib.project import QAXProject
+from hyo2.qax.lib.qa_json import QAJson
+from hyo2.qax.lib.scheduler import grid_loaders
+
+executed = list()
+
+
+def _count_inputs(check: dict, grids: dict) -> dict:
+    executed.append(check['info']['id'])
+    return {'count': len(grids)}
+
+
+def _write_report(check: dict, grids: dict) -> dict:
+    executed.append(check['info']['id'])
+    path = Path(check_staging_folder()).joinpath("report.txt")
+    path.write_text("%d grids" % len(grids))
+    return {'count': len(grids), 'files': [{'path': str(path)}]}
+
+
+class TestQAXProject(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_folder = Path(tempfile.mkdtemp())
+        self.json_path = self.tmp_folder.joinpath("qa.json")
+        shutil.copy(str(QAJson.example_paths()[-1]), str(self.json_path))
+        self.prj = QAXProject()
+        self.prj.outputs.output_folder = self.tmp_folder
+        self.prj.load_json(path=self.json_path)
+        self.holiday_finder = check_runners.get("Holiday Finder")
+        # the test runners only count their inputs: the (fake) grids are not loaded
+        self.bag_loader = grid_loaders.loader("grid.bag")
+        grid_loaders.unregister(".bag")
+
+    def tearDown(self):
+        grid_loaders.register(".bag", self.bag_loader)
+        shutil.rmtree(str(self.tmp_folder))
+
+    def test_save_compact(self):
+        output_path = self.tmp_folder.joinpath("compact.json")
+        self.prj.save_cur_json(path=output_path, compact=True)
+        self.assertEqual(QAJson(path=output_path).js, self.prj.inputs.qa_json.js)
+        self.assertLess(output_path.stat().st_size, self.json_path.stat().st_size)
+        self.assertEqual(list(self.tmp_folder.glob("*.tmp")), list())
+
+    def test_journal(self):
+        index = self.prj.inputs.qa_json.index
+        keys = index.keys(qa_group="survey_products")[-2:]
+        index.set_status(keys, "failed")
+        self.prj.journal_checks(keys)
+        journal = QAJournal.for_json(self.json_path, folder=self.prj.outputs.cache_folder)
+        self.assertEqual(len(journal), 2)
+
+        # kept in the cache folder, not next to the QA JSON file
+        self.assertEqual(journal.path.parent, self.prj.outputs.cache_folder)
+        self.assertEqual(sorted(self.tmp_folder.glob("qa.json*")), [self.json_path])
+
+        prj = QAXProject()
+        prj.outputs.output_folder = self.tmp_folder
+        prj.load_json(path=self.json_path)
+        self.assertEqual(len(prj.inputs.qa_json.index.keys(status="failed")), 2)
+
+        self.assertEqual(prj.compact_journal(), 2)
+        self.assertFalse(journal.path.exists())
+        self.assertEqual(QAJson(path=self.json_path).js, self.prj.inputs.qa_json.js)
+
+    def test_journal_base(self):
+        index = self.prj.inputs.qa_json.index
+        keys = index.keys(qa_group="survey_products")[-2:]
+        index.set_status(keys, "failed")
+        self.prj.journal_checks(keys)
+        journal = QAJournal.for_json(self.json_path, folder=self.prj.outputs.cache_folder)
+        self.assertEqual(journal.header()['size'], self.json_path.stat().st_size)
+        self.assertTrue(journal.is_valid())
+
+        # the QA JSON file changed after the journal was started: the journal is discarded
+        QAJson.dump(js=QAJson(path=self.json_path).js, path=self.json_path, compact=True)
+        prj = QAXProject()
+        prj.outputs.output_folder = self.tmp_folder
+        with self.assertLogs("hyo2.qax.lib.journal", level="WARNING"):
+            prj.load_json(path=self.json_path)
+        self.assertEqual(prj.inputs.qa_json.index.keys(status="failed"), list())
+        self.assertFalse(journal.path.exists())
+
+        # the journal is cleared once its changes are saved, to any path
+        self.prj.journal_checks(keys)
+        self.assertEqual(len(journal), 2)
+        self.prj.save_cur_json(path=self.tmp_folder.joinpath("copy.json"))
+        self.assertFalse(journal.path.exists())
+
+    def test_incremental(self):
+        js = json_backend.loads(QAJson.catalog().schema_path().parent.joinpath("qc_tools.json").read_bytes())
+        for check in js['qa']['survey_products']['checks']:
+            for item in check['inputs']['files']:
+                item['path'] = str(self.tmp_folder.joinpath(item['path'].split('/')[-1]))
+                Path(item['path']).write_bytes(b"grid")
+        js['qa']['version'] = "0.1.3"  # without the input fingerprints
+        json_path = self.tmp_folder.joinpath("qc_tools.json")
+        QAJson.dump(js=js, path=json_path)
+        self.prj.load_json(path=json_path)
+        self.prj.params.max_workers = 0
+        check_runners.register("Holiday Finder", _count_inputs)
+        executed.clear()
+        try:
+            self.prj.execute_all(incremental=True)
+            nr_of_checks = len(executed)
+            self.assertEqual(nr_of_checks, 4)
+            self.assertEqual(self.prj.inputs.qa_json.js['qa']['version'], QAJsonMigration.latest_version())
+            self.prj.save_cur_json(path=json_path)
+
+            self.prj.load_json(path=json_path)
+            self.prj.execute_all(incremental=True)
+            # the completed checks are not executed again (and the ones without a runner are skipped)
+            self.assertEqual(len(executed), nr_of_checks)
+
+            self.tmp_folder.joinpath("H12123_MB_VR_MLLW.bag").write_bytes(b"new grid")
+            queued = list()
+            finished = list()
+            self.prj.execute_all(incremental=True, queued=queued.extend,
+                                 finished=lambda key, status: finished.append((key, status)))
+            self.assertEqual(len(executed), nr_of_checks + 1)
+            # progress callbacks for each outdated check
+            self.assertEqual(sorted(key for key, _ in finished), sorted(queued))
+        finally:
+            check_runners.register("Holiday Finder", self.holiday_finder)
+
+    def test_run_group(self):
+        self.prj.params.max_workers = 0
+        check_runners.register("Holiday Finder", _count_inputs)
+        executed.clear()
+        try:
+            summary = asyncio.run(self.prj.run_group("survey_products"))
+            self.assertEqual(summary["completed"], len(executed))
+            index = self.prj.inputs.qa_json.index
+            # the checks without a runner are skipped
+            self.assertEqual(sum(summary.values()),
+                             len(index.keys(qa_group="survey_products", name="Holiday Finder")))
+
+            async def _first_result() -> tuple:
+                results = self.prj.iter_group("survey_products", max_pending=1)
+                result = await results.__anext__()
+                await results.aclose()
+                return result
+
+            executed.clear()
+            key, status, outputs = asyncio.run(_first_result())
+            self.assertEqual(outputs['execution']['status'], status)
+            # closing the iteration aborts the remaining checks
+            self.assertLess(len(executed), summary["completed"])
+            self.assertEqual(index.keys(status=["queued", "running"]), list())
+        finally:
+            check_runners.register("Holiday Finder", self.holiday_finder)
+
+    def test_resume(self):
+        js = json_backend.loads(QAJson.catalog().schema_path().parent.joinpath("qc_tools.json").read_bytes())
+        for check in js['qa']['survey_products']['checks']:
+            for item in check['inputs']['files']:
+                item['path'] = str(self.tmp_folder.joinpath(item['path'].split('/')[-1]))
+                Path(item['path']).write_bytes(b"grid")
+        json_path = self.tmp_folder.joinpath("qc_tools.json")
+        QAJson.dump(js=js, path=json_path)
+        self.prj.load_json(path=json_path)
+        self.prj.params.max_workers = 0
+        check_runners.register("Holiday Finder", _write_report)
+        executed.clear()
+        try:
+            self.prj.execute_all()
+            self.assertEqual(len(executed), 4)
+            journal = QAJournal.for_json(json_path, folder=self.prj.outputs.cache_folder)
+            self.assertEqual(len(journal), 4)
+            self.assertTrue(all(record['fingerprints'][0] is not None for record in journal.records()))
+            # the staged output files are moved to the output folder
+            index = self.prj.inputs.qa_json.index
+            for key in index.keys(name="Holiday Finder"):
+                path = Path(index.get(key)['outputs']['files'][0]['path'])
+                self.assertEqual(path.read_text(), "1 grids")
+                self.assertNotIn(str(self.prj.outputs.staging_folder), str(path))
+
+            # simulate a run interrupted while executing the (failing) Flier Finder check
+            QACheckpoint.for_json(json_path, folder=self.prj.outputs.cache_folder).start("survey_products")
+            flier_finder = index.get(index.keys(name="Flier Finder")[0])['info']['id']
+            partial_path = self.prj.outputs.staging_folder.joinpath(flier_finder, "partial.txt")
+            partial_path.parent.mkdir(parents=True)
+            partial_path.write_text("partial")
+
+            prj = QAXProject()
+            prj.outputs.output_folder = self.tmp_folder
+            prj.load_json(path=json_path)
+            prj.params.max_workers = 0
+            prj.execute_all()
+            # the journaled checks are not executed again, and the partial files are removed
+            self.assertEqual(len(executed), 4)
+            self.assertEqual(len(prj.inputs.qa_json.index.keys(name="Holiday Finder", status="completed")), 4)
+            self.assertFalse(partial_path.exists())
+            self.assertFalse(QACheckpoint.for_json(json_path, folder=self.prj.outputs.cache_folder).path.exists())
+        finally:
+            check_runners.register("Holiday Finder", self.holiday_finder)
+
+    def test_no_checkpoint(self):
+        # the cache folder cannot be created: the execution continues without checkpoint
+        self.prj.outputs.cache_folder.write_bytes(b"")
+        self.prj.params.max_workers = 0
+        self.prj.params.result_cache = True
+        check_runners.register("Holiday Finder", _count_inputs)
+        executed.clear()
+        try:
+            with self.assertLogs("hyo2.qax.lib.project", level="WARNING"):
+                self.prj.execute_all()
+            self.assertEqual(len(executed), len(self.prj.inputs.qa_json.index.keys(name="Holiday Finder")))
+        finally:
+            check_runners.register("Holiday Finder", self.holiday_finder)
+
+    def test_no_checkpoint_in_workers(self):
+        # the calibration is not recorded either, without failing the checks executed in the workers
+        self.prj.outputs.cache_folder.write_bytes(b"")
+        self.prj.params.max_workers = 1
+        check_runners.register("Holiday Finder", _count_inputs)
+        try:
+            with self.assertLogs("hyo2.qax.lib", level="WARNING"):
+                summary = self.prj.execute_all()
+            index = self.prj.inputs.qa_json.index
+            self.assertEqual(summary["completed"], len(index.keys(name="Holiday Finder")))
+            self.assertNotIn("failed", summary)
+        finally:
+            check_runners.register("Holiday Finder", self.holiday_finder)
+
+
+def suite():
+    s = unittest.TestSuite()
+    s.addTests(unittest.TestLoader().loadTestsFromTestCase(TestQAXProject))
+    return s
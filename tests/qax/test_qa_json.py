@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from hyo2.qax.lib.json_backend import JsonBackend
+from hyo2.qax.lib.qa_json import QAJson
+from hyo2.qax.lib.qa_json_stream import QAJsonStream
+from hyo2.qax.lib.schema_catalog import SchemaCatalog
+from hyo2.qax.lib.sidecar_cache import SidecarCache
+from hyo2.qax.lib.validator_registry import ValidatorRegistry, validator_registry
+
+
+class TestQAJson(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_folder = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(str(self.tmp_folder))
+
+    def test_schema_catalog(self):
+        catalog = QAJson.catalog()
+        self.assertIs(QAJson.catalog(), catalog)
+        self.assertEqual(catalog.versions, sorted(catalog.versions, key=SchemaCatalog.version_tuple))
+        self.assertEqual(catalog.schema_path().parent.name, "v%s" % catalog.latest_version)
+        self.assertEqual(QAJson.schema_paths()[-1], catalog.schema_path())
+        for version in catalog.versions:
+            for path in catalog.example_paths(version):
+                self.assertEqual(path.parent, catalog.schema_path(version).parent)
+        with self.assertRaises(RuntimeError):
+            catalog.schema_path("9.9.9")
+
+    def test_schema_catalog_semantic_order(self):
+        for version in ["v0.1.10", "v0.1.9", "v0.2.0"]:
+            self.tmp_folder.joinpath(version).mkdir()
+            shutil.copy(str(QAJson.schema_paths()[-1]), str(self.tmp_folder.joinpath(version, "qa.schema.json")))
+        catalog = SchemaCatalog(folder=self.tmp_folder)
+        self.assertEqual(catalog.versions, ["0.1.9", "0.1.10", "0.2.0"])
+        self.assertEqual(catalog.latest_version, "0.2.0")
+
+    def test_validator_registry_hits(self):
+        registry = ValidatorRegistry()
+        schema_path = QAJson.schema_paths()[-1]
+        validator = registry.validator(schema_path)
+        self.assertIs(registry.validator(schema_path), validator)
+        self.assertEqual(registry.misses, 1)
+        self.assertEqual(registry.hits, 1)
+
+    def test_validator_registry_invalidation(self):
+        registry = ValidatorRegistry()
+        schema_path = self.tmp_folder.joinpath("v0.1.3", "qa.schema.json")
+        schema_path.parent.mkdir()
+        shutil.copy(str(QAJson.schema_paths()[-1]), str(schema_path))
+        validator = registry.validator(schema_path)
+        stat = schema_path.stat()
+        os.utime(str(schema_path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertIsNot(registry.validator(schema_path), validator)
+        self.assertEqual(registry.misses, 2)
+        self.assertEqual(registry.hits, 0)
+
+    def test_load_uses_registry(self):
+        qa_json = QAJson(path=QAJson.example_paths()[-1])
+        hits = validator_registry.hits
+        QAJson(path=qa_json.path)
+        self.assertGreaterEqual(validator_registry.hits, hits + 2)
+
+    def test_from_bytes(self):
+        path = QAJson.example_paths()[-1]
+        qa_json = QAJson.from_bytes(path.read_bytes())
+        self.assertIsNone(qa_json.path)
+        self.assertEqual(qa_json.js, QAJson(path=path).js)
+
+    def test_from_obj_invalid(self):
+        with self.assertRaises(RuntimeError):
+            QAJson.from_obj({"qa": {"version": "0.1.3"}})
+
+    def test_json_backends(self):
+        js = QAJson(path=QAJson.example_paths()[-1]).js
+        for name in JsonBackend.available_backends():
+            backend = JsonBackend(name=name)
+            self.assertEqual(backend.loads(backend.dumps(js)), js)
+            self.assertEqual(backend.loads(backend.dumps(js, indent=4)), js)
+
+    def test_stream_checks(self):
+        for path in QAJson.example_paths():
+            qa = QAJson(path=path, check_valid=False).js['qa']
+            expected = [(qa_group, idx, check) for qa_group, value in qa.items() if isinstance(value, dict)
+                        for idx, check in enumerate(value['checks'])]
+            stream = QAJsonStream(path=path, chunk_size=7)
+            self.assertEqual(list(stream.iter_checks()), expected)
+            self.assertEqual(stream.version, qa['version'])
+
+    def test_stream_filters(self):
+        stream = QAJsonStream(path=QAJson.example_paths()[-1])
+        for qa_group, _, check in stream.iter_checks(qa_groups=["survey_products"], statuses=["completed"]):
+            self.assertEqual(qa_group, "survey_products")
+            self.assertEqual(check['outputs']['execution']['status'], "completed")
+
+    def test_stream_update_outputs(self):
+        path = self.tmp_folder.joinpath("qa.json")
+        shutil.copy(str(QAJson.example_paths()[-1]), str(path))
+        outputs = {"execution": {"status": "failed"}}
+        nr_of_updates = QAJsonStream(path=path, chunk_size=5).update_outputs({("survey_products", 1): outputs})
+        self.assertEqual(nr_of_updates, 1)
+        self.assertEqual(QAJson(path=path).js['qa']['survey_products']['checks'][1]['outputs'], outputs)
+
+    def test_validate_changes(self):
+        qa_json = QAJson(path=QAJson.example_paths()[-1])
+        index = qa_json.index
+        keys = index.keys(qa_group="survey_products")
+        index.set_status(keys[:2], "queued")
+        self.assertEqual(len(index.dirty_keys()), 2)
+        self.assertTrue(qa_json.validate_changes())
+        self.assertEqual(len(index.dirty_keys()), 0)
+
+        index.set_status(keys[:1], "unknown")
+        self.assertFalse(qa_json.validate_changes())
+        self.assertEqual(index.dirty_keys(), keys[:1])
+
+    def test_sidecar_cache(self):
+        path = self.tmp_folder.joinpath("qa.json")
+        shutil.copy(str(QAJson.example_paths()[-1]), str(path))
+        cache_folder = self.tmp_folder.joinpath("cache")
+        qa_json = QAJson(path=path, cache_folder=cache_folder)
+        cache = SidecarCache(folder=cache_folder)
+        self.assertTrue(cache.sidecar_path(path).exists())
+        self.assertEqual(cache.load(path, path.read_bytes(), qa_json.schema_version), qa_json.js)
+        self.assertEqual(QAJson(path=path, cache_folder=cache_folder).js, qa_json.js)
+
+        path.write_bytes(path.read_bytes() + b"\n")
+        self.assertIsNone(cache.load(path, path.read_bytes(), qa_json.schema_version))
+        self.assertEqual(cache.misses, 1)
+
+
+def suite():
+    s = unittest.TestSuite()
+    s.addTests(unittest.TestLoader().loadTestsFromTestCase(TestQAJson))
+    return s
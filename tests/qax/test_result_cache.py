@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from hyo2.qax.lib.check_index import CheckIndex
+from hyo2.qax.lib.executor import CheckExecutor, CheckRunnerRegistry
+from hyo2.qax.lib.fingerprint import FileFingerprint
+from hyo2.qax.lib.json_backend import json_backend
+from hyo2.qax.lib.qa_json import QAJson
+from hyo2.qax.lib.result_cache import ResultCache
+from hyo2.qax.lib.scheduler import GridLoaderRegistry
+
+executed = list()
+
+
+def _count_bytes(check: dict, grids: dict) -> dict:
+    executed.append(check['info']['id'])
+    return {'count': sum(os.path.getsize(path) for path in grids)}
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_folder = Path(tempfile.mkdtemp())
+        self.js = json_backend.loads(QAJson.catalog().schema_path().parent.joinpath("qc_tools.json").read_bytes())
+        for check in self.js['qa']['survey_products']['checks']:
+            for item in check['inputs']['files']:
+                item['path'] = str(self.tmp_folder.joinpath(item['path'].split('/')[-1]))
+                Path(item['path']).write_bytes(b"grid")
+        self.index = CheckIndex(js=self.js)
+        self.cache = ResultCache.for_folder(self.tmp_folder.joinpath("cache"))
+        executed.clear()
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(str(self.tmp_folder))
+
+    def test_fingerprint(self):
+        path = str(self.tmp_folder.joinpath("grid.bag"))
+        Path(path).write_bytes(b"a" * (FileFingerprint.block_size + 10))
+        fingerprint = FileFingerprint.of(path)
+        self.assertTrue(FileFingerprint.matches(path, fingerprint))
+        with open(path, "r+b") as fod:
+            fod.seek(-1, os.SEEK_END)
+            fod.write(b"b")
+        os.utime(path, ns=(fingerprint['mtime'], fingerprint['mtime']))
+        self.assertFalse(FileFingerprint.matches(path, fingerprint))
+        self.assertIsNone(FileFingerprint.of(str(self.tmp_folder.joinpath("missing.bag"))))
+
+    def test_key(self):
+        check = self.js['qa']['survey_products']['checks'][0]
+        key = ResultCache.make_key(check)
+        self.assertEqual(ResultCache.make_key(json_backend.loads(json_backend.dumps(check))), key)
+        check['params']['threshold'] = 1.0
+        self.assertNotEqual(ResultCache.make_key(check), key)
+        check['inputs']['files'].append({'path': str(self.tmp_folder.joinpath("missing.bag"))})
+        self.assertIsNone(ResultCache.make_key(check))
+
+    def test_lru_eviction(self):
+        self.cache.put("a", {'count': 1})
+        self.cache.put("b", {'count': 2})
+        self.assertEqual(self.cache.get("a"), {'count': 1})
+        self.cache.max_bytes = self.cache.stats().nr_of_bytes - 1
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), {'count': 1})
+        stats = self.cache.stats()
+        self.assertEqual((stats.entries, stats.hits, stats.misses, stats.evictions), (1, 2, 1, 1))
+
+    def test_execute(self):
+        registry = CheckRunnerRegistry()
+        registry.register("Holiday Finder", _count_bytes)
+        keys = self.index.keys(name="Holiday Finder")
+        # the (fake) grids are not loaded
+        executor = CheckExecutor(max_workers=0, registry=registry, loaders=GridLoaderRegistry(), cache=self.cache)
+        executor.execute(index=self.index, keys=keys)
+        self.assertEqual(len(executed), len(keys))
+
+        # only the check whose input changed is executed again
+        path = self.index.get(keys[0])['inputs']['files'][0]['path']
+        Path(path).write_bytes(b"new grid")
+        executor.execute(index=self.index, keys=keys)
+        self.assertEqual(len(executed), len(keys) + 1)
+        self.assertEqual(self.index.get(keys[0])['outputs']['count'], 8)
+        self.assertEqual(self.index.get(keys[1])['outputs']['count'], 4)
+        self.assertEqual(self.index.keys(status="completed", name="Holiday Finder"), keys)
+        self.assertEqual(self.cache.stats().hits, len(keys) - 1)
+
+
+def suite():
+    s = unittest.TestSuite()
+    s.addTests(unittest.TestLoader().loadTestsFromTestCase(TestResultCache))
+    return s